@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Compare the shared codec with module level msgpack calls for the relay message of an event.
+#
+# usage: python benchmarks/codec-benchmark.py [count] [payload-bytes]
+#
+
+import sys
+import time
+import msgpack
+
+from mercury.system import codec
+from mercury.system.models import EventEnvelope
+
+
+def msgpack_relay(event: dict):
+    payload = msgpack.packb(event, use_bin_type=True)
+    return msgpack.packb({'type': 'event', 'event': payload}, use_bin_type=True)
+
+
+def codec_relay(event: dict):
+    return codec.wrap({'type': 'event'}, 'event', codec.pack(event))
+
+
+def msgpack_decode(frame: bytes):
+    return msgpack.unpackb(msgpack.unpackb(frame, raw=False)['event'], raw=False)
+
+
+def codec_decode(frame: bytes):
+    return codec.unpack(codec.unpack(frame)['event'])
+
+
+def measure(name: str, count: int, fn, arg):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn(arg)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {count:,} in {elapsed:.3f} s, {int(count / elapsed):,} per second')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    event = EventEnvelope().set_to('hello.world').set_header('a', 'b').set_body('x' * size).to_map()
+    frame = msgpack_relay(event)
+    measure('Encode with msgpack', count, msgpack_relay, event)
+    measure('Encode with codec', count, codec_relay, event)
+    measure('Decode with msgpack', count, msgpack_decode, frame)
+    measure('Decode with codec', count, codec_decode, frame)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Measure throughput and latency of the language connector link on a single machine.
+#
+# The benchmark starts the local language connector in this process, a responder application
+# in a subprocess and sends events from this application to the responder through the connector.
+#
+# usage: python benchmarks/connector-benchmark.py [events] [requests] [payload-bytes]
+#
+
+import subprocess
+import sys
+import time
+
+from mercury.platform import Platform
+from mercury.system.local_connector import LocalConnector
+from mercury.system.po import PostOffice
+
+SINK = 'benchmark.sink'
+ECHO = 'benchmark.echo'
+
+
+class Counter:
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+
+    def sink(self, headers: dict, body: any):
+        if headers.get('type') == 'query':
+            return {'count': self.count, 'seconds': 0 if self.first is None else self.last - self.first}
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.count += 1
+
+
+def echo(headers: dict, body: any):
+    return body
+
+
+def wait_for(platform: Platform, condition, timeout: float = 30.0):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            platform.stop()
+            raise TimeoutError('benchmark setup timeout')
+        time.sleep(0.1)
+
+
+def responder():
+    platform = Platform()
+    counter = Counter()
+    platform.register(SINK, counter.sink, 1)
+    platform.register(ECHO, echo, 10)
+    platform.connect_to_cloud()
+    platform.run_forever()
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    size = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    connector = LocalConnector()
+    connector.start_in_thread()
+    peer = subprocess.Popen([sys.executable, __file__, 'responder'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    platform = Platform()
+    po = PostOffice()
+    log = platform.get_logger()
+    try:
+        platform.connect_to_cloud()
+        wait_for(platform, lambda: platform.cloud_ready() and po.exists([SINK, ECHO]))
+        payload = 'x' * size
+        # one-way throughput
+        start = time.perf_counter()
+        for _ in range(events):
+            po.send(SINK, body=payload)
+        wait_for(platform, lambda: po.request(SINK, 10.0, headers={'type': 'query'}).get_body()['count'] >= events,
+                 120.0)
+        elapsed = time.perf_counter() - start
+        log.info(f'One-way: {events:,} events of {size:,} bytes in {elapsed:.3f} s, '
+                 f'{int(events / elapsed):,} events per second')
+        # request-response latency
+        latency = list()
+        for _ in range(requests):
+            begin = time.perf_counter()
+            po.request(ECHO, 10.0, body=payload)
+            latency.append((time.perf_counter() - begin) * 1000)
+        latency.sort()
+        log.info(f'RPC: {requests:,} requests, p50 {latency[len(latency) // 2]:.3f} ms, '
+                 f'p99 {latency[int(len(latency) * 0.99)]:.3f} ms')
+        log.info(f'Network statistics: {platform.get_network_stats()}')
+        log.info(f'Connector statistics: {connector.get_stats()}')
+    finally:
+        peer.terminate()
+        platform.stop()
+        connector.stop_thread()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'responder':
+        responder()
+    else:
+        main()
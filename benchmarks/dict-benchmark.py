@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Measure flattening and normalization of large nested dictionaries.
+#
+# usage: python benchmarks/dict-benchmark.py [keys]
+#
+
+import copy
+import sys
+import time
+
+from mercury.system import codec
+from mercury.system.data_mapper import DataMapper
+from mercury.system.dict_util import MultiLevelDict
+
+
+def nested_document(keys: int):
+    # records of 10 fields including a list and a composite key
+    records = list()
+    for i in range(keys // 10):
+        records.append({'id': i, 'name': f'item-{i}', 'tags': ['a', 'b', 'c'],
+                        'price': {'amount': i * 1.5, 'currency': 'USD'}, 'stock.warehouse': 'w1', 'stock.count': i})
+    return {'catalog': {'records': records}}
+
+
+def flat_document(keys: int):
+    # composite keys such as those in a flattened configuration file
+    return {f'app.section{i // 100}.items[{i % 100}].value': i for i in range(keys)}
+
+
+def map_records(records: list):
+    rules = [('id', 'product.id'), ('name', 'product.name'), ('price.amount', 'product.price.value'),
+             ('price.currency', 'product.price.unit'), ('tags[0]', 'product.tags.first'),
+             ('stock.count', 'inventory.count'), ('stock.warehouse', 'inventory.location')]
+    mapper = DataMapper([f'{source} -> {target}' for source, target in rules])
+    measure(f'Map {len(records):,} records with DataMapper', lambda: mapper.apply_all(records))
+
+    def map_each():
+        mm = MultiLevelDict()
+        for record in records:
+            result = dict()
+            for source, target in rules:
+                mm.set_element(target, mm.get_element(source, record), result)
+
+    measure(f'Map {len(records):,} records with get_element and set_element', map_each)
+
+
+def measure(name: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f'{name}: {time.perf_counter() - start:.3f} s')
+    return result
+
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    mm = MultiLevelDict()
+    nested = nested_document(keys)
+    flat_map = measure('Flatten nested document', lambda: mm.get_flat_map(nested))
+    print(f'{len(flat_map):,} keys')
+    measure('Iterate nested document', lambda: sum(1 for _ in mm.iter_flat_items(nested)))
+    measure('Iterate one record', lambda: list(mm.iter_flat_items(nested, 'catalog.records[100]')))
+    query = MultiLevelDict.compile_query('catalog.records[*].price.amount')
+    measure('Query records[*].price.amount', lambda: query.values(nested))
+    measure('Query **.amount', lambda: mm.find_items('**.amount', nested))
+    measure('Normalize nested document', lambda: MultiLevelDict(nested).normalize_map())
+    updated = copy.deepcopy(nested)
+    for record in updated['catalog']['records'][::1000]:
+        record['price']['amount'] += 1
+    ops = measure('Diff with 10 changes', lambda: MultiLevelDict.diff(nested, updated))
+    print(f'{len(ops)} operations, patch {len(codec.pack(ops)):,} bytes, document {len(codec.pack(updated)):,} bytes')
+    measure('Apply patch', lambda: mm.apply_patch(ops, nested))
+    normalized = MultiLevelDict(nested_document(keys))
+    normalized.normalize_map()
+    map_records(normalized.get_dict()['catalog']['records'])
+    measure('Normalize flat document', lambda: MultiLevelDict(flat_document(keys)).normalize_map())
+    deep = dict()
+    current = deep
+    for i in range(keys // 10):
+        current['level'] = {'value': i}
+        current = current['level']
+    measure(f'Flatten {keys // 10:,} levels', lambda: mm.get_flat_map(deep))
+    measure(f'Normalize {keys // 10:,} levels', lambda: MultiLevelDict(deep).normalize_map())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Measure the cost of creating event envelopes and converting them to maps and bytes.
+#
+# usage: python benchmarks/envelope-benchmark.py [count]
+#
+
+import sys
+import time
+import tracemalloc
+
+from mercury.system.models import EventEnvelope
+
+
+def create(count: int):
+    for _ in range(count):
+        EventEnvelope().set_to('hello.world').set_body('hello').set_header('a', 'b')
+
+
+def to_map(events: list):
+    for event in events:
+        event.to_map()
+
+
+def to_bytes(events: list):
+    for event in events:
+        event.to_bytes()
+
+
+def tags(events: list):
+    for event in events:
+        event.add_tag('rpc', 'hello.world')
+        event.get_tag('exception')
+        event.get_tag('rpc')
+
+
+def measure(name: str, count: int, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {count:,} in {elapsed:.3f} s, {int(count / elapsed):,} per second')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    measure('Create', count, create, count)
+    tracemalloc.start()
+    events = [EventEnvelope().set_to('hello.world').set_body('hello').set_header('a', 'b') for _ in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'Memory: {size // count:,} bytes per envelope')
+    measure('Tags', count, tags, events)
+    measure('To map', count, to_map, events)
+    measure('To bytes', count, to_bytes, events)
+
+
+if __name__ == '__main__':
+    main()
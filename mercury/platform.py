@@ -28,8 +28,6 @@ from asyncio import QueueEmpty
 from queue import Queue, Empty
 
 from mercury.system.config_util import ConfigReader
-from mercury.system.connector import NetworkConnector
-from mercury.system.distributed_trace import DistributedTrace
 from mercury.system.diskqueue import ElasticQueue
 from mercury.system.logger import LoggingService
 from mercury.system.models import EventEnvelope, AppException, TraceInfo
@@ -46,7 +44,15 @@ class ServiceQueue:
         self.log = self.platform.log
         queue_dir = self.util.normalize_path(f'{self.platform.work_dir}/queues/{self.platform.get_origin()}')
 
-        self.disk_queue = ElasticQueue(queue_dir=queue_dir, queue_id=route)
+        config = self.platform.config
+        codec = config.get_property('elastic.queue.compression.codec', default_value='none')
+        self.disk_queue = ElasticQueue(queue_dir=queue_dir, queue_id=route,
+                                       compression=None if codec == 'none' else codec,
+                                       compression_level=config.get('elastic.queue.compression.level', 6),
+                                       block_records=config.get('elastic.queue.block.records', 100),
+                                       pool_segments=config.get('elastic.queue.pool.segments', 0),
+                                       pool_bytes=config.get('elastic.queue.pool.bytes', 0),
+                                       preallocate=config.get('elastic.queue.pool.preallocate', False))
         self._loop = loop
         self._executor = executor
         self.queue = queue
@@ -81,6 +87,19 @@ class ServiceQueue:
         except QueueEmpty:
             return None
 
+    def get_stats(self):
+        # this must be called from the event loop thread
+        idle = self.ready_queue.qsize() + (0 if self._peek_worker is None else 1)
+        total = len(self.worker_list)
+        result = {'route': self.route, 'workers': total, 'busy': max(0, total - idle), 'idle': idle,
+                  'buffering': self._buffering}
+        result.update(self.disk_queue.get_stats())
+        return result
+
+    def get_backlog(self):
+        # number of events waiting for a worker
+        return self.disk_queue.size() if self._buffering else 0
+
     def send_to_worker(self, item):
         worker_number = self.get_next_worker()
         if worker_number:
@@ -180,9 +199,8 @@ class WorkerQueue:
         self.manager_queue = manager_queue
         self.worker_queue = worker_queue
         self.route = route
-        # trace all routes except ws.outgoing
-        normal_service = not (interceptor and self.util.is_inbox(route))
-        self.tracing = normal_service and route != 'ws.outgoing'
+        # trace all routes except temporary inbox
+        self.tracing = not (interceptor and self.util.is_inbox(route))
         self.user_function = user_function
         self.instance = instance
         self.singleton = singleton
@@ -345,6 +363,7 @@ class Platform:
     Event system platform instance
     """
     SERVICE_QUERY = 'system.service.query'
+    ROUTE_STATS = 'system.route.stats'
 
     def __init__(self, config_file: str = None):
         if sys.version_info.major < 3:
@@ -358,35 +377,57 @@ class Platform:
         self.work_dir = self.config.get_property('work.directory')
         self.log = LoggingService(log_level).get_logger()
         self._loop = asyncio.new_event_loop()
-        # DO NOT CHANGE 'distributed.trace.processor' which is an optional user defined trace aggregator
-        my_tracer = DistributedTrace(self, 'distributed.trace.processor')
-        my_nc = self.config.get_property('network.connector')
-        self._cloud = NetworkConnector(self, my_tracer, self._loop, my_nc, self.origin)
+        # the network connector and the throttle are created when first used so that standalone
+        # applications start quickly without loading the websocket client or testing disk speed
+        self._cloud = None
+        self._throttle = None
+        self._lazy_lock = threading.Lock()
         self._function_queues = dict()
         self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_threads)
         self.log.info(f'Concurrent thread pool = {self._max_threads}')
-        #
-        # Before we figure out how to solve blocking file I/O, we will regulate event output rate.
-        #
-        my_test_dir = self.util.normalize_path(f'{self.work_dir}/safe_to_delete_when_apps_stop')
-        if not os.path.exists(my_test_dir):
-            os.makedirs(my_test_dir, exist_ok=True)
-        self._throttle = Throttle(self.util.normalize_path(f'{my_test_dir}/'+self.origin), log=self.log)
         self._seq = 0
-        self.log.info(f'Estimated performance is {format(self._throttle.get_tps(), ",d")} events per second')
         self.running = True
         self.stopped = False
         # distributed trace sessions
         self._traces = {}
         self.trace_aggregation = True
 
+        self._loop_thread = None
+
         # start event loop in a new thread to avoid blocking the main thread
         def main_event_loop():
+            self._loop_thread = threading.get_ident()
             self._loop.run_forever()
             self._loop.close()
 
         threading.Thread(target=main_event_loop).start()
 
+    def _get_connector(self):
+        if self._cloud is None:
+            with self._lazy_lock:
+                if self._cloud is None:
+                    # the websocket client is imported only when the network connector is used
+                    from mercury.system.connector import NetworkConnector
+                    from mercury.system.distributed_trace import DistributedTrace
+                    # DO NOT CHANGE 'distributed.trace.processor' which is an optional user defined trace aggregator
+                    my_tracer = DistributedTrace(self, 'distributed.trace.processor')
+                    my_nc = self.config.get_property('network.connector')
+                    self._cloud = NetworkConnector(self, my_tracer, self._loop, my_nc, self.origin)
+        return self._cloud
+
+    def _get_throttle(self):
+        if self._throttle is None:
+            with self._lazy_lock:
+                if self._throttle is None:
+                    #
+                    # Before we figure out how to solve blocking file I/O, we will regulate event output rate.
+                    #
+                    my_test_dir = self.util.normalize_path(f'{self.work_dir}/safe_to_delete_when_apps_stop')
+                    if not os.path.exists(my_test_dir):
+                        os.makedirs(my_test_dir, exist_ok=True)
+                    self._throttle = Throttle(self.util.normalize_path(f'{my_test_dir}/'+self.origin), log=self.log)
+        return self._throttle
+
     def get_origin(self):
         """
         Get the origin ID of this application instance
@@ -513,6 +554,37 @@ class Platform:
         Returns: None
 
         """
+        self._register(route, user_function, total_instances, is_private)
+        # advertise the new route to the network
+        if self.cloud_ready() and not is_private:
+            self._cloud.advertise('add', [route])
+
+    def register_many(self, functions: list) -> None:
+        """
+        Register a list of user functions and advertise the public routes to the network together
+
+        Args:
+            functions: list of tuples of (route, user_function, total_instances, is_private)
+                       where total_instances and is_private are optional
+
+        Returns: None
+
+        """
+        if not isinstance(functions, list):
+            raise ValueError(f'Expect functions to be list, actual: {type(functions)}')
+        for item in functions:
+            if not isinstance(item, tuple) or not 2 <= len(item) <= 4:
+                raise ValueError('Expect each function to be a tuple of (route, user_function, '
+                                 'total_instances, is_private)')
+        public_routes = list()
+        for item in functions:
+            self._register(*item)
+            if not (len(item) > 3 and item[3]):
+                public_routes.append(item[0])
+        if self.cloud_ready() and public_routes:
+            self._cloud.advertise('add', public_routes)
+
+    def _register(self, route: str, user_function: any, total_instances: int = 1, is_private: bool = False):
         self.util.validate_service_name(route)
         if not isinstance(total_instances, int):
             raise ValueError(f'Expect total_instances to be int, actual: {type(total_instances)}')
@@ -530,26 +602,34 @@ class Platform:
         queue = asyncio.Queue()
         if function_type == FunctionType.INTERCEPTOR:
             self._function_queues[route] = {'queue': queue, 'private': is_private, 'instances': 1}
-            ServiceQueue(self._loop, self._executor, queue, route, user_function, 0)
+            manager = ServiceQueue(self._loop, self._executor, queue, route, user_function, 0)
         elif function_type == FunctionType.REGULAR:
             self._function_queues[route] = {'queue': queue, 'private': is_private, 'instances': total_instances}
-            ServiceQueue(self._loop, self._executor, queue, route, user_function, total_instances)
+            manager = ServiceQueue(self._loop, self._executor, queue, route, user_function, total_instances)
         else:
             # function_type == FunctionType.SINGLETON
             self._function_queues[route] = {'queue': queue, 'private': is_private, 'instances': 1}
-            ServiceQueue(self._loop, self._executor, queue, route, user_function, -1)
-        # advertise the new route to the network
-        if self._cloud.is_ready() and not is_private:
-            self._cloud.send_payload({'type': 'add', 'route': route})
+            manager = ServiceQueue(self._loop, self._executor, queue, route, user_function, -1)
+        self._function_queues[route]['manager'] = manager
+
+    def get_network_stats(self) -> dict:
+        """
+        Get event byte counters of the connection with the language connector
+
+        Returns: dict of uncompressed and compressed bytes in each direction
+
+        """
+        return self._get_connector().get_stats()
 
     def cloud_ready(self):
-        return self._cloud.is_ready()
+        return self._cloud is not None and self._cloud.is_ready()
 
     def subscribe_life_cycle(self, callback: str):
-        self._cloud.subscribe_life_cycle(callback)
+        self._get_connector().subscribe_life_cycle(callback)
 
     def unsubscribe_life_cycle(self, callback: str):
-        self._cloud.unsubscribe_life_cycle(callback)
+        if self._cloud is not None:
+            self._cloud.unsubscribe_life_cycle(callback)
 
     def release(self, route: str) -> None:
         # this will un-register a route
@@ -558,8 +638,8 @@ class Platform:
         if route not in self._function_queues:
             raise ValueError(f'route {route} not found')
         # advertise the deleted route to the network
-        if self._cloud.is_ready() and self.route_is_private(route):
-            self._cloud.send_payload({'type': 'remove', 'route': route})
+        if self.cloud_ready() and not self.route_is_private(route):
+            self._cloud.advertise('remove', [route])
         self._remove_route(route)
 
     def has_route(self, route: str) -> bool:
@@ -598,6 +678,46 @@ class Platform:
         else:
             return 0
 
+    def get_route_stats(self, route: str = None) -> dict:
+        """
+        Get backlog statistics of a route or all routes
+
+        Args:
+            route: route name or None for all routes
+
+        Returns: dict of in-memory and spilled events, oldest event age and worker busy/idle counts.
+                 For all routes, the result is a dict of route name to statistics.
+
+        """
+        if route is not None:
+            if not isinstance(route, str):
+                raise ValueError(f'Expect route to be str, actual: {type(route)}')
+            if route not in self._function_queues:
+                raise ValueError(f'route {route} not found')
+
+        def collect():
+            result = dict()
+            for r in ([route] if route else list(self._function_queues)):
+                config = self._function_queues.get(r)
+                if config and 'manager' in config:
+                    stats = config['manager'].get_stats()
+                    stats['private'] = config['private']
+                    result[r] = stats
+            return result
+
+        async def async_collect():
+            return collect()
+
+        # service queues are updated in the event loop so the snapshot is taken there
+        if self._loop_thread == threading.get_ident():
+            stats = collect()
+        else:
+            stats = asyncio.run_coroutine_threadsafe(async_collect(), self._loop).result(5.0)
+        return stats.get(route, dict()) if route else stats
+
+    def _route_stats(self, headers: dict, body: any):
+        return self.get_route_stats(headers.get('route'))
+
     def send_parallel_requests(self, events: list, timeout_seconds: float):
         timeout_value = self.util.get_float(timeout_seconds)
         if timeout_value <= 0:
@@ -634,9 +754,7 @@ class Platform:
                 if route in self._function_queues:
                     self._loop.call_soon_threadsafe(self._send, route, evt.to_map())
                 else:
-                    if self._cloud.is_connected():
-                        self._cloud.send_payload({'type': 'event', 'event': evt.to_map()})
-                    else:
+                    if not self._send_remote(evt):
                         raise ValueError(f'route {route} not found')
 
             total_requests = len(events)
@@ -676,9 +794,7 @@ class Platform:
             if route in self._function_queues:
                 self._loop.call_soon_threadsafe(self._send, route, event.to_map())
             else:
-                if self._cloud.is_connected():
-                    self._cloud.send_payload({'type': 'event', 'event': event.to_map()})
-                else:
+                if not self._send_remote(event):
                     raise ValueError(f'route {route} not found')
             # wait until response event is delivered to the inbox
             return inbox_queue.get(True, timeout_value)
@@ -699,7 +815,7 @@ class Platform:
                 event.set_trace(trace_info.get_id(), trace_info.get_path())
         # regulate rate for best performance
         self._seq += 1
-        self._throttle.regulate_rate(self._seq)
+        self._get_throttle().regulate_rate(self._seq)
         route = event.get_to()
         if broadcast:
             event.set_broadcast(True)
@@ -709,16 +825,18 @@ class Platform:
             if route == target:
                 raise ValueError('route and reply_to must not be the same')
         if route in self._function_queues:
-            if event.is_broadcast() and self._cloud.is_connected():
+            if event.is_broadcast() and self._cloud is not None and self._cloud.is_connected():
                 self._cloud.send_payload({'type': 'event', 'event': event.to_map()})
             else:
                 self._loop.call_soon_threadsafe(self._send, route, event.to_map())
         else:
-            if self._cloud.is_connected():
-                self._cloud.send_payload({'type': 'event', 'event': event.to_map()})
-            else:
+            if not self._send_remote(event):
                 raise ValueError(f'route {route} not found')
 
+    def _send_remote(self, event: EventEnvelope) -> bool:
+        # events to remote routes are not deliverable before the network connector is used
+        return self._cloud is not None and self._cloud.send_event(event.to_map())
+
     def send_event_later(self, event: EventEnvelope, delay_in_seconds: float) -> None:
         self._loop.call_later(delay_in_seconds, self.send_event, event)
 
@@ -728,11 +846,17 @@ class Platform:
             if self.has_route(single_route):
                 return True
             if self.cloud_ready():
+                # the route directory answers locally unless the route is not known yet
+                found = self._cloud.directory.lookup(single_route)
+                if found is not None:
+                    return found
                 event = EventEnvelope()
                 event.set_to(self.SERVICE_QUERY).set_header('type', 'find').set_header('route', single_route)
                 result = self.send_request(event, 8.0)
                 if isinstance(result, EventEnvelope):
                     if result.get_body() is not None:
+                        if isinstance(result.get_body(), bool):
+                            self._cloud.directory.update(single_route, result.get_body())
                         return result.get_body()
         if isinstance(routes, list):
             if len(routes) > 0:
@@ -743,15 +867,60 @@ class Platform:
                 if len(remote_routes) == 0:
                     return True
                 if self.cloud_ready():
+                    unknown = list()
+                    for r in remote_routes:
+                        found = self._cloud.directory.lookup(r)
+                        if found is False:
+                            return False
+                        if found is None:
+                            unknown.append(r)
+                    if len(unknown) == 0:
+                        return True
                     # tell service query to use the route list in body
                     event = EventEnvelope()
                     event.set_to(self.SERVICE_QUERY).set_header('type', 'find')
-                    event.set_header('route', '*').set_body(routes)
+                    event.set_header('route', '*').set_body(unknown)
                     result = self.send_request(event, 8.0)
                     if isinstance(result, EventEnvelope) and result.get_body() is not None:
+                        if result.get_body() is True:
+                            for r in unknown:
+                                self._cloud.directory.update(r, True)
                         return result.get_body()
         return False
 
+    def get_max_backlog(self) -> int:
+        """
+        This method is reserved for system use. DO NOT call this from a user application.
+        It must be called from the event loop thread.
+
+        Returns: the largest number of events waiting for a worker among all routes
+
+        """
+        result = 0
+        # take a snapshot because inboxes are registered and released by other threads
+        for config in list(self._function_queues.values()):
+            manager = config.get('manager')
+            if manager is not None:
+                result = max(result, manager.get_backlog())
+        return result
+
+    def dispatch_network_event(self, event: dict) -> bool:
+        """
+        This method is reserved for system use. DO NOT call this from a user application.
+        It must be called from the event loop thread.
+
+        Args:
+            event: incoming event from the network in map format
+
+        Returns: True if the target route exists in this application instance
+
+        """
+        route = event.get('to')
+        if route in self._function_queues:
+            self._send(route, event)
+            return True
+        return False
+
     def _remove_route(self, route):
         if route in self._function_queues:
             self._send(route, None)
@@ -764,7 +933,12 @@ class Platform:
                 config['queue'].put_nowait(event)
 
     def connect_to_cloud(self):
-        self._loop.run_in_executor(self._executor, self._cloud.start_connection)
+        # backlog statistics query for monitoring tools. The route is specific to this application instance
+        # because the language connector load balances a public route among instances.
+        stats_route = f'{self.ROUTE_STATS}.{self.origin}'
+        if not self.has_route(stats_route):
+            self.register(stats_route, self._route_stats, 1)
+        self._loop.run_in_executor(self._executor, self._get_connector().start_connection)
 
     def stop(self):
         #
@@ -797,5 +971,6 @@ class Platform:
             self.util.cleanup_dir(queue_dir)
             self._loop.stop()
 
-        self._cloud.close_connection(1000, f'Application {self.get_origin()} is stopping', stop_engine=True)
+        if self._cloud is not None:
+            self._cloud.close_connection(1000, f'Application {self.get_origin()} is stopping', stop_engine=True)
         self._loop.call_soon_threadsafe(stopping)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import datetime
+import decimal
+import functools
+import struct
+import sys
+import threading
+import uuid
+
+#
+# Msgpack serialization shared by the event envelope, the network connector and the elastic queue.
+#
+# Besides the msgpack primitives, datetime, Decimal, UUID and NumPy arrays (when NumPy is installed)
+# are encoded as msgpack extension types. Extension types are understood by Python applications only.
+# The portable encoding converts these values to strings and lists for other language connectors.
+#
+
+EXT_DATETIME = 1
+EXT_DECIMAL = 2
+EXT_UUID = 3
+EXT_NDARRAY = 4
+ARRAY_ALIGNMENT = 16
+ARRAY_HEADER_PEEK = 1024
+
+_local = threading.local()
+# msgpack is imported when the first value is serialized so that it does not add to the startup time
+msgpack = None
+_BIN8 = struct.Struct('>BB')
+_BIN16 = struct.Struct('>BH')
+_BIN32 = struct.Struct('>BI')
+
+
+def _encode_ext(value: any):
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    if isinstance(value, uuid.UUID):
+        return msgpack.ExtType(EXT_UUID, value.bytes)
+    if is_array(value):
+        return msgpack.ExtType(EXT_NDARRAY, _encode_array(value))
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _encode_portable(value: any):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if is_array(value):
+        if value.dtype.hasobject:
+            raise TypeError('NumPy array of objects is not supported')
+        return value.tolist()
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _decode_ext(code: int, data: bytes):
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    if code == EXT_UUID:
+        return uuid.UUID(bytes=data)
+    if code == EXT_NDARRAY and _load_numpy() is not None:
+        return _decode_array(data)
+    return msgpack.ExtType(code, data)
+
+
+def _load_numpy():
+    # NumPy takes a while to import so it is loaded when an array is received
+    numpy = sys.modules.get('numpy')
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+    return numpy
+
+
+def _encode_array(value) -> bytes:
+    # dtype and shape are followed by padding so that the raw buffer is aligned
+    if value.dtype.hasobject:
+        raise TypeError('NumPy array of objects is not supported')
+    numpy = sys.modules['numpy']
+    header = msgpack.packb([value.dtype.str, list(value.shape)])
+    padding = b'\0' * (-len(header) % ARRAY_ALIGNMENT)
+    raw = numpy.ascontiguousarray(value).reshape(-1).view(numpy.uint8)
+    return b''.join((header, padding, raw))
+
+
+def _decode_array(data: bytes):
+    numpy = sys.modules['numpy']
+    unpacker = msgpack.Unpacker(raw=False)
+    # the header is usually found in the first bytes so the raw buffer is not copied into the unpacker
+    unpacker.feed(data[0: ARRAY_HEADER_PEEK])
+    try:
+        try:
+            header = unpacker.unpack()
+        except msgpack.OutOfData:
+            unpacker.feed(data[ARRAY_HEADER_PEEK:])
+            header = unpacker.unpack()
+    except msgpack.OutOfData:
+        raise ValueError('Invalid NumPy array header')
+    if not (isinstance(header, list) and len(header) == 2 and isinstance(header[0], str)
+            and isinstance(header[1], list) and all(isinstance(n, int) and n >= 0 for n in header[1])):
+        raise ValueError('Invalid NumPy array header')
+    try:
+        dtype, shape = numpy.dtype(header[0]), header[1]
+    except TypeError:
+        raise ValueError(f'Invalid NumPy dtype {header[0]}')
+    offset = unpacker.tell()
+    offset += -offset % ARRAY_ALIGNMENT
+    count = 1
+    for n in shape:
+        count *= n
+    if len(data) != offset + count * dtype.itemsize:
+        raise ValueError(f'NumPy array of {len(data) - offset} bytes does not match shape {shape} of {dtype}')
+    # the array is a read-only view of the extension data
+    return numpy.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+
+def is_array(value: any) -> bool:
+    # an array exists only when NumPy has been imported
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _load_msgpack():
+    global msgpack
+    if msgpack is None:
+        import msgpack
+    return msgpack
+
+
+def _get_packer():
+    # a packer keeps its buffer between calls and it is not thread safe
+    packer = getattr(_local, 'packer', None)
+    if packer is None:
+        _load_msgpack()
+        packer = msgpack.Packer(default=_encode_ext, use_bin_type=True)
+        _local.packer = packer
+    return packer
+
+
+def _get_portable_packer():
+    packer = getattr(_local, 'portable_packer', None)
+    if packer is None:
+        _load_msgpack()
+        packer = msgpack.Packer(default=_encode_portable, use_bin_type=True)
+        _local.portable_packer = packer
+    return packer
+
+
+def pack(data: any, portable: bool = False) -> bytes:
+    """
+    Serialize a value
+
+    Args:
+        data: value
+        portable: encode datetime, Decimal, UUID and NumPy arrays as strings and lists instead of
+                  extension types so that the value can be decoded outside Python
+
+    Returns: packed value
+
+    """
+    return _get_portable_packer().pack(data) if portable else _get_packer().pack(data)
+
+
+def unpack(data: any) -> any:
+    return _load_msgpack().unpackb(data, raw=False, ext_hook=_decode_ext)
+
+
+def unpack_all(data: any) -> list:
+    """
+    Decode a buffer of concatenated msgpack values
+
+    Args:
+        data: packed values
+
+    Returns: list of values
+
+    """
+    unpacker = _load_msgpack().Unpacker(raw=False, ext_hook=_decode_ext, max_buffer_size=max(len(data), 1))
+    unpacker.feed(data)
+    return list(unpacker)
+
+
+def _bin_header(size: int) -> bytes:
+    if size < 0x100:
+        return _BIN8.pack(0xc4, size)
+    if size < 0x10000:
+        return _BIN16.pack(0xc5, size)
+    return _BIN32.pack(0xc6, size)
+
+
+@functools.lru_cache(maxsize=64)
+def _map_prefix(fields: tuple, key: str) -> bytes:
+    # the relay messages use a few distinct headers so the packed prefix is reused
+    packer = _get_packer()
+    parts = [packer.pack_map_header(len(fields) + 1)]
+    for k, v in fields:
+        parts.append(packer.pack(k))
+        parts.append(packer.pack(v))
+    parts.append(packer.pack(key))
+    return b''.join(parts)
+
+
+def wrap(header: dict, key: str, payload: any) -> bytes:
+    """
+    Pack a map of the header fields and a field holding payload that is already packed.
+    The payload is copied into the result once instead of being serialized again.
+
+    Args:
+        header: fields of the map with str values
+        key: name of the field for the payload
+        payload: bytes, or a list of bytes that is packed as an array of binary values
+
+    Returns: packed map
+
+    """
+    prefix = _map_prefix(tuple(header.items()), key)
+    if isinstance(payload, list):
+        parts = [prefix, _get_packer().pack_array_header(len(payload))]
+        for item in payload:
+            parts.append(_bin_header(len(item)))
+            parts.append(item)
+        return b''.join(parts)
+    return b''.join((prefix, _bin_header(len(payload)), payload))
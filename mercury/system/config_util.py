@@ -17,14 +17,62 @@
 #
 
 import json
+import logging
 import os
-import yaml
+import re
+import threading
 from mercury.system.dict_util import MultiLevelDict
 
+_MISSING = object()
+_ENV_NAME = re.compile(r'[^A-Za-z0-9]+')
+
+
+def _to_bool(value: any):
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ('true', 'yes', 'on', '1'):
+            return True
+        if text in ('false', 'no', 'off', '0', ''):
+            return False
+        raise ValueError(f'{value} is not a boolean')
+    return bool(value)
+
+
+def _to_list(value: any):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    return [value]
+
+
+class _ConfigState:
+    """
+    Loaded configuration. A reload replaces the whole state so that readers never see a partial update.
+    """
+
+    __slots__ = ('data', 'table', 'converted')
+
+    def __init__(self, data: MultiLevelDict, table: dict):
+        self.data = data
+        # composite path -> element, including the dictionaries and lists on the way to the leaves
+        self.table = table
+        # (type, composite path) -> converted value
+        self.converted = dict()
+
 
 class ConfigReader:
+    """
+    Read application configuration from a YAML or JSON file.
+
+    Every composite path is resolved once when the file is loaded, so that reading a value is a dictionary lookup.
+    When env_prefix is given, an environment variable named by the prefix and the composite path in upper case
+    with underscores (e.g. MERCURY_LOG_LEVEL for "log.level") overrides the value from the file.
+    """
 
-    def __init__(self, filename=None):
+    CONVERTERS = {'str': str, 'int': int, 'float': float, 'bool': _to_bool, 'list': _to_list}
+
+    def __init__(self, filename=None, env_prefix: str = None):
         if filename is None:
             script_dir = os.path.dirname(os.path.realpath(__file__))
             parent = os.path.abspath(os.path.join(script_dir, os.pardir))
@@ -35,30 +83,204 @@ class ConfigReader:
             raise ValueError(f'Invalid filename - Expect: str, Actual: {type(filename)}')
         if not os.path.exists(filename):
             raise ValueError(f'File {filename} does not exist')
+        if not (filename.endswith('.yml') or filename.endswith('.yaml') or filename.endswith('.json')):
+            raise ValueError('Filename must end with .yml, .yaml or .json')
+        if env_prefix is not None and not isinstance(env_prefix, str):
+            raise ValueError(f'Invalid env_prefix - Expect: str, Actual: {type(env_prefix)}')
+        self.filename = filename
+        self.env_prefix = env_prefix
+        self._modified = self._get_modified()
+        self._state = self._load()
+        self._subscribers = list()
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
 
-        with open(filename, 'r') as f:
-            if filename.endswith('.yml') or filename.endswith('.yaml'):
-                data = yaml.safe_load(f)
-            elif filename.endswith('.json'):
+    def _get_modified(self):
+        try:
+            stat = os.stat(self.filename)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load(self) -> _ConfigState:
+        with open(self.filename, 'r') as f:
+            if self.filename.endswith('.json'):
                 data = json.loads(f.read())
             else:
-                raise ValueError('Filename must end with .yml, .yaml or .json')
-            self._data = MultiLevelDict(data)
-            # normalize key-values such that these 2 cases are the same
-            # Case 1 -
-            # hello:
-            #   world: some_value
-            # Case 2 -
-            # hello.world: some_value
-            self._data.normalize_map()
+                # PyYAML is imported when a YAML file is loaded
+                import yaml
+                data = yaml.safe_load(f)
+        data = MultiLevelDict(data if data is not None else dict())
+        # normalize key-values such that these 2 cases are the same
+        # Case 1 -
+        # hello:
+        #   world: some_value
+        # Case 2 -
+        # hello.world: some_value
+        data.normalize_map()
+        if self.env_prefix is not None:
+            self._override(data)
+        return _ConfigState(data, self._get_table(data.get_dict()))
+
+    def _override(self, data: MultiLevelDict):
+        for k, v in data.get_flat_map(data.get_dict()).items():
+            name = self.env_prefix + _ENV_NAME.sub('_', k).strip('_').upper()
+            if name in os.environ:
+                value = os.environ[name]
+                # keep the type of the value in the file when possible
+                if isinstance(v, (bool, int, float)):
+                    try:
+                        value = _to_bool(value) if isinstance(v, bool) else type(v)(value)
+                    except ValueError:
+                        pass
+                data.set_element(k, value)
+
+    @staticmethod
+    def _get_table(data: dict) -> dict:
+        table = dict()
+        stack = [(None, data)]
+        while stack:
+            path, element = stack.pop()
+            if path is not None:
+                table[path] = element
+            if isinstance(element, dict):
+                for k, v in element.items():
+                    stack.append((k if path is None else f'{path}.{k}', v))
+            elif isinstance(element, list):
+                for i, v in enumerate(element):
+                    stack.append((f'{path}[{i}]', v))
+        return table
 
     def get_dict(self):
-        return self._data.get_dict()
+        return self._state.data.get_dict()
 
     def get(self, key, default_value: any = None):
-        result = self._data.get_element(key)
+        state = self._state
+        # only canonical paths are in the table so that lookups of other keys do not grow it
+        result = state.table.get(key, _MISSING) if isinstance(key, str) else _MISSING
+        if result is _MISSING:
+            result = state.data.get_element(key)
         return result if result is not None else default_value
 
     def get_property(self, key, default_value: any = None):
-        result = self.get(key, default_value)
+        result = self._get_converted('str', key, _MISSING)
+        if result is _MISSING:
+            result = default_value
         return result if isinstance(result, str) else str(result)
+
+    def _get_converted(self, data_type: str, key: str, default_value: any):
+        state = self._state
+        result = state.converted.get((data_type, key), _MISSING)
+        if result is _MISSING:
+            value = self.get(key)
+            if value is None:
+                return default_value
+            try:
+                result = self.CONVERTERS[data_type](value)
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {data_type} value for {key} - {value}')
+            if key in state.table:
+                state.converted[(data_type, key)] = result
+        return result
+
+    def get_int(self, key: str, default_value: int = None) -> int:
+        return self._get_converted('int', key, default_value)
+
+    def get_float(self, key: str, default_value: float = None) -> float:
+        return self._get_converted('float', key, default_value)
+
+    def get_bool(self, key: str, default_value: bool = None) -> bool:
+        return self._get_converted('bool', key, default_value)
+
+    def get_list(self, key: str, default_value: list = None) -> list:
+        """
+        Get a list. A comma separated string is split into a list of strings and any other value
+        is a list of one element.
+
+        Args:
+            key: composite path
+            default_value: value when the key does not exist
+
+        Returns: list
+
+        """
+        return self._get_converted('list', key, default_value)
+
+    def subscribe(self, callback):
+        """
+        Register a function that is called with the list of changed composite paths after the file is reloaded
+
+        Args:
+            callback: function(changed_keys: list)
+
+        Returns: None
+
+        """
+        if not callable(callback):
+            raise ValueError('callback must be callable')
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def reload(self) -> list:
+        """
+        Load the file again and notify the subscribers when any value is changed.
+        The current configuration is kept when the file cannot be loaded.
+
+        Returns: list of changed composite paths
+        """
+        with self._lock:
+            self._modified = self._get_modified()
+            state = self._load()
+            old = self._state.data
+            changed = [op['path'] if 'key' not in op else '.'.join(str(p) for p in (op['path'], op['key']) if p)
+                       for op in MultiLevelDict.diff(old.get_dict(), state.data.get_dict())]
+            if not changed:
+                return changed
+            self._state = state
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(changed)
+            except Exception as e:
+                logging.getLogger().error(f'Unable to notify config subscriber {callback} - {e}')
+        return changed
+
+    def watch(self, interval: float = 1.0):
+        """
+        Check the modification time of the file periodically in a background thread and reload
+        the file when it is changed
+
+        Args:
+            interval: seconds between checks
+
+        Returns: None
+
+        """
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError('interval must be a positive number')
+        if self._watcher is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                if self._get_modified() != self._modified:
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        logging.getLogger().error(f'Unable to reload {self.filename} - {e}')
+
+        self._stop.clear()
+        self._watcher = threading.Thread(target=run, daemon=True)
+        self._watcher.start()
+
+    def stop_watch(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join(5.0)
+            self._watcher = None
@@ -16,35 +16,131 @@
 # limitations under the License.
 #
 
-import io
 import uuid
 import os
 import time
+import random
+import threading
+import zlib
 import asyncio
 import aiohttp
-import msgpack
 
+from mercury.system import codec
+from mercury.system.diskqueue import ElasticQueue
+from mercury.system.directory import RouteDirectory
 from mercury.system.models import EventEnvelope
 from mercury.system.utility import Utility
-from mercury.system.cache import SimpleCache
+from mercury.system.reassembly import PayloadAssembler
 from mercury.system.singleton import Singleton
 
 
+class ConnectorSession:
+    """
+    State of one websocket connection to the language connector
+    """
+
+    def __init__(self, index: int, urls: list):
+        self.index = index
+        self.urls = urls
+        # sessions of a pool start from different URLs so that they are spread across language connectors
+        self.next_url = index % len(urls) + 1
+        self.ws = None
+        self.url = None
+        self.ready = False
+        self.batch_enabled = False
+        self.compression_enabled = False
+        self.bulk_enabled = False
+        self.ext_enabled = False
+        # outgoing credit is granted by the language connector and None means unlimited
+        self.send_credit = None
+        # created in the event loop of the connector when the session connects
+        self.credit_available = None
+        # incoming bytes consumed since the last credit grant
+        self.consumed = 0
+        self.grant_pending = False
+        self.withheld = 0
+        self.max_ws_payload = 32768
+        self.close_code = 1000
+        self.close_message = 'OK'
+        self.last_active = time.time()
+        # outgoing frames are written by a single coroutine per connection
+        self.send_queue = None
+        self.outstanding = 0
+        self.frames = 0
+        self.connects = 0
+        self.failures = 0
+        # consecutive connection attempts since the session was last ready
+        self.attempts = 0
+        self.connected_since = None
+
+    def get_next_url(self):
+        # index starts from 1
+        return self.urls[self.next_url - 1]
+
+    def skip_url(self):
+        self.next_url += 1
+        if self.next_url > len(self.urls):
+            self.next_url = 1
+
+    def is_connected(self):
+        return self.ws is not None
+
+    def get_health(self) -> dict:
+        now = time.time()
+        return {'session': self.index, 'url': self.url, 'connected': self.is_connected(), 'ready': self.ready,
+                'outstanding': self.outstanding, 'frames': self.frames, 'connects': self.connects,
+                'send_credit': self.send_credit, 'credit_withheld': self.withheld,
+                'failures': self.failures,
+                'uptime': 0 if self.connected_since is None else round(now - self.connected_since, 3),
+                'idle': round(now - self.last_active, 3)}
+
+
 @Singleton
 class NetworkConnector:
 
-    INCOMING_WS_PATH = "ws.incoming"
-    OUTGOING_WS_PATH = "ws.outgoing"
     SYSTEM_ALERT = "system.alerts"
     SERVER_CONFIG = "system.config"
     MAX_PAYLOAD = "max.payload"
     TRACE_AGGREGATION = "trace.aggregation"
     DISTRIBUTED_TRACING = "distributed.tracing"
     CONNECTOR_LIFECYCLE = 'cloud.connector.lifecycle'
+    # optional protocol features are offered at login and accepted by the language connector in system.config
+    FEATURES = 'features'
+    BATCH = 'batch'
+    # the language connector sends the route list on ready and notifies route changes
+    ROUTES = 'routes'
+    # route advertisements carry a list of routes in one message
+    BULK = 'bulk'
+    # bytes in flight are bounded by credits granted by the receiver in each direction
+    CREDIT = 'credit'
+    # msgpack extension types of the codec are sent only to a language connector that relays them to Python
+    EXT = 'ext'
+    CREDIT_RETRY = 0.05
+    # maximum delay in seconds before a partially filled batch is sent
+    BATCH_INTERVAL = 0.0005
+    # a batch frame adds a map and array header to the frame and a binary header to each item
+    BATCH_HEADER_BYTES = 32
+    BATCH_ITEM_BYTES = 5
+    # maximum number of outgoing frames waiting for the websocket writer
+    SEND_QUEUE_SIZE = 1000
+    # payload compression is zlib on negotiation or websocket permessage-deflate
+    ZLIB = 'zlib'
+    DEFLATE = 'deflate'
+    COMPRESSION = ('none', ZLIB, DEFLATE)
+    ZIP = 'zip'
+    # events are spread over a pool of connections by route hash or least outstanding frames
+    HASH = 'hash'
+    LEAST = 'least'
+    # events to remote routes are buffered in the outbox while the connection is down
+    OUTBOX = 'outbox'
+    DRAIN_INTERVAL = 0.01
+    # incomplete segmented payloads are checked for timeout at this interval
+    EXPIRY_INTERVAL = 1.0
     # payload segmentation reserved tags (from v1.13.0 onwards)
     MSG_ID = '_id_'
     COUNT = '_blk_'
     TOTAL = '_max_'
+    ZIP_TAG = '_zip_'
 
     def __init__(self, platform, distributed_trace, loop, url_list, origin):
         self.platform = platform
@@ -55,17 +151,41 @@ class NetworkConnector:
         self.config = platform.config
         self.normal = True
         self.started = False
-        self.ready = False
-        self.ws = None
-        self.close_code = 1000
-        self.close_message = 'OK'
-        self.last_active = time.time()
-        self.max_ws_payload = 32768
+        self._codec = self.config.get_property('network.compression.codec', default_value=self.ZLIB)
+        if self._codec not in self.COMPRESSION:
+            raise ValueError(f'network.compression.codec must be one of {self.COMPRESSION}')
+        self._threshold = self.config.get('network.compression.threshold', 1024)
+        self._stats = {'out_bytes': 0, 'out_compressed_bytes': 0, 'in_bytes': 0, 'in_compressed_bytes': 0,
+                       'compressed_events': 0}
+        self._stats_lock = threading.Lock()
+        self._send_lock = threading.Condition()
         self.util = Utility()
         self.urls = self.util.multi_split(url_list, ', ')
-        self.next_url = 1
         self.origin = origin
-        self.cache = SimpleCache(loop, self.log, timeout_seconds=30)
+        pool_size = self.config.get('network.pool.size', 1)
+        if not isinstance(pool_size, int):
+            raise ValueError('network.pool.size must be int')
+        self._balance = self.config.get_property('network.pool.balance', default_value=self.HASH)
+        if self._balance not in (self.HASH, self.LEAST):
+            raise ValueError(f'network.pool.balance must be {self.HASH} or {self.LEAST}')
+        self.sessions = [ConnectorSession(i, self.urls) for i in range(max(1, pool_size))]
+        self._active = list()
+        self.directory = RouteDirectory(self.util.get_float(self.config.get('network.directory.ttl', 5)))
+        self._outbox = None
+        self._outbox_lock = threading.Lock()
+        self._outbox_pending = 0
+        self._outbox_bytes = 0
+        self._outbox_stats = {'buffered': 0, 'replayed': 0, 'expired': 0, 'rejected': 0}
+        self._draining = False
+        self._outbox_max_bytes = self.config.get('network.outbox.max.bytes', 0)
+        self._outbox_max_age = self.util.get_float(self.config.get('network.outbox.max.age', 60))
+        self._drain_rate = self.config.get('network.outbox.drain.rate', 5000)
+        self._credit_window = self.config.get('network.credit.window', 0)
+        self._credit_backlog = self.config.get('network.credit.backlog', ElasticQueue.MEMORY_BUFFER)
+        self._backoff_initial = self.util.get_float(self.config.get('network.reconnect.initial', 0.5))
+        self._backoff_max = self.util.get_float(self.config.get('network.reconnect.max', 30))
+        self.assembler = PayloadAssembler(self.log, timeout_seconds=30.0)
+        self._expiry = None
         self.api_key = self._get_api_key()
 
     def _get_api_key(self):
@@ -90,82 +210,338 @@ class NetworkConnector:
                 f.write(value + '\n')
                 return value
 
-    def _get_next_url(self):
-        # index starts from 1
-        return self.urls[self.next_url - 1]
+    def send_keep_alive(self, session: ConnectorSession):
+        self._enqueue(session, "Keep-Alive "+self.util.get_iso_8601(time.time(), show_ms=True))
 
-    def _skip_url(self):
-        self.next_url += 1
-        if self.next_url > len(self.urls):
-            self.next_url = 1
+    def get_stats(self):
+        """
+        Get event byte counters and health of the connections to the language connector
+
+        Returns: dict of uncompressed and compressed bytes in each direction and a list of connections
+
+        """
+        with self._stats_lock:
+            result = dict(self._stats)
+        result['connections'] = [s.get_health() for s in self.sessions]
+        outbox = dict(self._outbox_stats)
+        outbox['pending'] = self._outbox_pending
+        outbox['bytes'] = self._outbox_bytes
+        result[self.OUTBOX] = outbox
+        result['directory'] = self.directory.get_stats()
+        return result
+
+    def _rebalance(self):
+        # events are spread over the sessions that are ready
+        active = [s for s in self.sessions if s.ready and s.is_connected()]
+        if len(active) != len(self._active) and len(self.sessions) > 1:
+            self.log.info(f'Connection pool rebalanced to {len(active)} of {len(self.sessions)} sessions')
+        self._active = active
+        if not active:
+            # route notifications are not received until a session is ready again
+            self.directory.reset()
+        if active and self._outbox_pending > 0 and not self._draining:
+            self._draining = True
+            self._loop.create_task(self._drain())
+
+    def send_event(self, event: dict) -> bool:
+        """
+        Send an event to a remote route.
+        While the connection is down or the outbox is draining, the event is buffered in the outbox.
+
+        Args:
+            event: event in map format
+
+        Returns: True if the event is sent or buffered
+
+        """
+        if self._outbox_max_bytes > 0 and self.started and self.normal:
+            with self._outbox_lock:
+                if self._outbox_pending > 0 or not self.is_ready():
+                    if self._outbox_bytes >= self._outbox_max_bytes:
+                        self._outbox_stats['rejected'] += 1
+                        return False
+                    if self._outbox is None:
+                        # created before the first event is counted so that the drain task finds it
+                        queue_dir = self.util.normalize_path(f'{self.platform.work_dir}/queues/{self.origin}')
+                        self._outbox = ElasticQueue(queue_dir=queue_dir, queue_id=self.OUTBOX)
+                    # the encoded size is counted whether the event is held in memory or on disk
+                    size = len(codec.pack(event))
+                    self._outbox_pending += 1
+                    self._outbox_bytes += size
+                    asyncio.run_coroutine_threadsafe(self._buffer(event, time.time(), size), self._loop)
+                    return True
+        if self.is_connected():
+            self.send_payload({'type': 'event', 'event': event})
+            return True
+        return False
+
+    async def _buffer(self, event: dict, created: float, size: int):
+        await self._outbox.write({'time': created, 'event': event, 'size': size})
+        self._outbox_stats['buffered'] += 1
+        if self._active and not self._draining:
+            self._draining = True
+            self._loop.create_task(self._drain())
+
+    async def _drain(self):
+        # replay buffered events at a controlled rate after the connection is ready
+        quota = max(1, int(self._drain_rate * self.DRAIN_INTERVAL))
+        try:
+            while self._active and self._outbox_pending > 0 and self._outbox is not None:
+                if all(s.outstanding >= self.SEND_QUEUE_SIZE for s in self._active):
+                    await asyncio.sleep(self.DRAIN_INTERVAL)
+                    continue
+                now = time.time()
+                for _ in range(quota):
+                    item = self._outbox.read()
+                    if item is None:
+                        break
+                    with self._outbox_lock:
+                        self._outbox_pending -= 1
+                        self._outbox_bytes -= item['size']
+                    if now - item['time'] > self._outbox_max_age:
+                        self._outbox_stats['expired'] += 1
+                    else:
+                        self.send_payload({'type': 'event', 'event': item['event']})
+                        self._outbox_stats['replayed'] += 1
+                await asyncio.sleep(self.DRAIN_INTERVAL)
+        finally:
+            self._draining = False
+        expired = self._outbox_stats['expired']
+        if expired > 0 and self._outbox_pending == 0:
+            self.log.warn(f'{expired} buffered events expired after {self._outbox_max_age} seconds')
+
+    def _backoff(self, attempts: int):
+        # exponential backoff with jitter so that applications do not reconnect in lockstep
+        delay = min(self._backoff_max, self._backoff_initial * (2 ** min(attempts, 16)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _select(self, route: str):
+        active = self._active
+        if not active:
+            # during handshake, events go to any connected session
+            active = [s for s in self.sessions if s.is_connected()]
+            if not active:
+                return None
+        if len(active) == 1:
+            return active[0]
+        if self._balance == self.HASH:
+            # events to the same route keep their order on the same connection unless it is saturated
+            session = active[zlib.crc32(route.encode()) % len(active)] if isinstance(route, str) else active[0]
+            if session.outstanding < self.SEND_QUEUE_SIZE:
+                return session
+        return min(active, key=lambda x: x.outstanding)
+
+    def _features(self):
+        features = [self.BATCH, self.ROUTES, self.BULK, self.EXT]
+        if self._credit_window > 0:
+            features.append(self.CREDIT)
+        if self._codec == self.ZLIB:
+            features.append(self.ZLIB)
+        return features
+
+    def advertise(self, change: str, routes: list, session: ConnectorSession = None):
+        """
+        Tell the language connector about added or removed routes
+
+        Args:
+            change: add or remove
+            routes: list of route names
+            session: a specific session or None for all connected sessions
 
-    def send_keep_alive(self):
-        message = "Keep-Alive "+self.util.get_iso_8601(time.time(), show_ms=True)
-        envelope = EventEnvelope()
-        envelope.set_to(self.OUTGOING_WS_PATH).set_header('type', 'text').set_body(message)
-        self.platform.send_event(envelope)
+        Returns: None
 
-    def send_payload(self, data: dict):
+        """
+        for s in [session] if session is not None else self.sessions:
+            if not s.is_connected():
+                continue
+            if s.bulk_enabled:
+                # keep each message within the payload limit of the language connector
+                chunk = list()
+                size = 0
+                for route in routes:
+                    if chunk and size + len(route) + 8 > s.max_ws_payload // 2:
+                        self.send_payload({'type': change, 'routes': chunk}, s)
+                        chunk = list()
+                        size = 0
+                    chunk.append(route)
+                    size += len(route) + 8
+                if chunk:
+                    self.send_payload({'type': change, 'routes': chunk}, s)
+            else:
+                for route in routes:
+                    self.send_payload({'type': change, 'route': route}, s)
+
+    def send_payload(self, data: dict, session: ConnectorSession = None):
         if 'type' in data and data['type'] == 'event' and 'event' in data:
             evt = data['event']
-            payload = msgpack.packb(evt, use_bin_type=True)
+            if session is None:
+                session = self._select(evt.get('to'))
+                if session is None:
+                    return
+            # datetime, Decimal, UUID and NumPy arrays are converted to portable values for other languages
+            payload = codec.pack(evt, portable=not session.ext_enabled)
+            raw_size = len(payload)
+            zipped = False
+            # numeric arrays seldom compress well and are sent as they are
+            compressible = session.compression_enabled and not (session.ext_enabled and codec.is_array(evt.get('body')))
+            if compressible and len(payload) >= self._threshold:
+                compressed = zlib.compress(payload)
+                # skip payload that is not compressible
+                if len(compressed) < len(payload):
+                    payload = compressed
+                    zipped = True
             payload_len = len(payload)
-            if payload_len > self.max_ws_payload:
+            # events are sent from any thread
+            with self._stats_lock:
+                self._stats['out_bytes'] += raw_size
+                self._stats['out_compressed_bytes'] += payload_len
+                if zipped:
+                    self._stats['compressed_events'] += 1
+            if payload_len > session.max_ws_payload:
                 msg_id = evt['id']
-                total = int(payload_len / self.max_ws_payload)
-                if payload_len > total:
-                    total += 1
-                buffer = io.BytesIO(payload)
-                count = 0
+                block_size = session.max_ws_payload
+                total = (payload_len + block_size - 1) // block_size
+                # each block is a slice of the packed event without intermediate copies
+                view = memoryview(payload)
                 for i in range(total):
-                    count += 1
-                    block = EventEnvelope()
-                    block.set_header(self.MSG_ID, msg_id)
-                    block.set_header(self.COUNT, count)
-                    block.set_header(self.TOTAL, total)
-                    block.set_body(buffer.read(self.max_ws_payload))
-                    block_map = dict()
-                    block_map['type'] = 'block'
-                    block_map['block'] = block.to_map()
-                    block_payload = msgpack.packb(block_map, use_bin_type=True)
-                    envelope = EventEnvelope()
-                    envelope.set_to(self.OUTGOING_WS_PATH).set_header('type', 'bytes').set_body(block_payload)
-                    self.platform.send_event(envelope)
+                    block = {'id': msg_id, 'body': view[i * block_size: (i + 1) * block_size],
+                             'headers': {self.MSG_ID: msg_id, self.COUNT: str(i + 1), self.TOTAL: str(total)}}
+                    if zipped:
+                        block['headers'][self.ZIP_TAG] = self.ZLIB
+                    self._enqueue(session, codec.pack({'type': 'block', 'block': block}))
             else:
-                relay_map = dict()
-                relay_map['type'] = 'event'
-                relay_map['event'] = payload
-                envelope = EventEnvelope()
-                envelope_payload = msgpack.packb(relay_map, use_bin_type=True)
-                envelope.set_to(self.OUTGOING_WS_PATH).set_header('type', 'bytes').set_body(envelope_payload)
-                self.platform.send_event(envelope)
+                # the packed event is wrapped in the relay message without packing it again
+                relay_map = {'type': 'event', self.ZIP: self.ZLIB} if zipped else {'type': 'event'}
+                self._enqueue(session, codec.wrap(relay_map, 'event', payload))
         else:
-            envelope = EventEnvelope()
-            envelope_payload = msgpack.packb(data, use_bin_type=True)
-            envelope.set_to(self.OUTGOING_WS_PATH).set_header('type', 'bytes').set_body(envelope_payload)
-            self.platform.send_event(envelope)
+            payload = codec.pack(data)
+            # control messages such as route changes go to every connected session unless one is given
+            for s in [session] if session is not None else self.sessions:
+                self._enqueue(s, payload)
 
-    def _get_server_config(self, headers: dict, body: any):
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _enqueue(self, session: ConnectorSession, payload: any):
+        # frames are dropped when the connection is down
+        if not self.started or not session.is_connected():
+            return
+        if self._in_loop():
+            # the event loop must not be blocked
+            with self._send_lock:
+                session.outstanding += 1
+            self._put(session, payload)
+        else:
+            # apply back pressure to the calling thread when the websocket cannot keep up
+            with self._send_lock:
+                while session.outstanding >= self.SEND_QUEUE_SIZE and session.is_connected():
+                    self._send_lock.wait(1.0)
+                session.outstanding += 1
+            self._loop.call_soon_threadsafe(self._put, session, payload)
+
+    def _put(self, session: ConnectorSession, payload: any):
+        # runs in the event loop
+        if session.send_queue is None:
+            self._release(session, 1)
+        else:
+            session.send_queue.put_nowait(payload)
+
+    def _release(self, session: ConnectorSession, n: int):
+        with self._send_lock:
+            session.outstanding = max(0, session.outstanding - n)
+            self._send_lock.notify_all()
+
+    async def _writer(self, session: ConnectorSession, ws, queue: asyncio.Queue):
+        carry = None
+        while True:
+            if carry is None:
+                payload = await queue.get()
+            else:
+                payload = carry
+                carry = None
+            frame = payload
+            count = 1
+            if session.batch_enabled and isinstance(payload, bytes):
+                batch = [payload]
+                size = self.BATCH_HEADER_BYTES + self.BATCH_ITEM_BYTES + len(payload)
+                if size < session.max_ws_payload and queue.empty():
+                    # give concurrent senders a moment to fill up the batch
+                    await asyncio.sleep(self.BATCH_INTERVAL)
+                while size < session.max_ws_payload and not queue.empty():
+                    item = queue.get_nowait()
+                    item_size = self.BATCH_ITEM_BYTES + len(item) if isinstance(item, bytes) else None
+                    if item_size is None or size + item_size > session.max_ws_payload:
+                        carry = item
+                        break
+                    batch.append(item)
+                    size += item_size
+                count = len(batch)
+                if count > 1:
+                    frame = codec.wrap({'type': self.BATCH}, self.BATCH, batch)
+            try:
+                if isinstance(frame, str):
+                    await ws.send_str(frame)
+                else:
+                    if session.send_credit is not None:
+                        # wait for credit from the language connector. A frame may overdraw the remaining credit.
+                        while session.send_credit <= 0:
+                            session.credit_available.clear()
+                            await session.credit_available.wait()
+                        session.send_credit -= len(frame)
+                    await ws.send_bytes(frame)
+                session.frames += 1
+            except ConnectionError as e:
+                self.log.debug(f'Outgoing frame dropped - {e}')
+            except Exception as e:
+                # drop the frame so that the writer keeps draining the queue
+                self.log.error(f'Unable to send outgoing frame - {e}')
+            finally:
+                self._release(session, count)
+
+    def _get_server_config(self, session: ConnectorSession, headers: dict, body: any):
+        # runs in the event loop because configuration is specific to the connection that receives it
         if 'type' in headers:
             # at this point, login is successful
             if headers['type'] == 'system.config' and isinstance(body, dict):
                 if self.MAX_PAYLOAD in body:
-                    self.max_ws_payload = body[self.MAX_PAYLOAD]
+                    session.max_ws_payload = body[self.MAX_PAYLOAD]
                     self.log.info('Authenticated')
-                    self._send_life_cycle_event({'type': 'authenticated'})
-                    self.log.info(f'Automatic payload segmentation at {format(self.max_ws_payload, ",d")} bytes')
+                    self._send_life_cycle_event(session, {'type': 'authenticated'})
+                    self.log.info(f'Automatic payload segmentation at {format(session.max_ws_payload, ",d")} bytes')
                 if self.TRACE_AGGREGATION in body:
                     self.platform.set_trace_support(body[self.TRACE_AGGREGATION])
+                features = body.get(self.FEATURES)
+                if isinstance(features, list) and self.BATCH in features:
+                    session.batch_enabled = True
+                    self.log.info('Outgoing events are coalesced into batches')
+                if isinstance(features, list) and self.ZLIB in features:
+                    session.compression_enabled = True
+                    self.log.info(f'Events of at least {format(self._threshold, ",d")} bytes are compressed')
+                if isinstance(features, list) and self.BULK in features:
+                    session.bulk_enabled = True
+                if isinstance(features, list) and self.EXT in features:
+                    session.ext_enabled = True
+                if isinstance(features, list) and self.CREDIT in features:
+                    # the initial outgoing credit is given in the server config
+                    session.send_credit = body.get(self.CREDIT, self._credit_window)
+                    session.credit_available.set()
+                    self._send_credit(session, self._credit_window)
+                    self.log.info(f'Flow control with {format(self._credit_window, ",d")} bytes of credit')
                 # advertise public routes to language connector
-                for r in self.platform.get_routes('public'):
-                    self.send_payload({'type': 'add', 'route': r})
+                self.advertise('add', self.platform.get_routes('public'), session)
                 # tell server that I am ready
-                self.send_payload({'type': 'ready'})
+                self.send_payload({'type': 'ready'}, session)
             # server acknowledges my ready signal
             if headers['type'] == 'ready':
-                self.ready = True
-                self.log.info('Ready')
-                self._send_life_cycle_event({'type': 'ready'})
+                session.ready = True
+                session.attempts = 0
+                self._rebalance()
+                elapsed = 0 if session.connected_since is None else time.time() - session.connected_since
+                self.log.info(f'Ready in {round(elapsed * 1000, 3)} ms')
+                self._send_life_cycle_event(session, {'type': 'ready'})
 
     def subscribe_life_cycle(self, callback: str):
         if not isinstance(callback, str):
@@ -179,7 +555,8 @@ class NetworkConnector:
         if callback in self._subscription:
             self._subscription.remove(callback)
 
-    def _send_life_cycle_event(self, headers: dict):
+    def _send_life_cycle_event(self, session: ConnectorSession, headers: dict):
+        headers['session'] = str(session.index)
         event = EventEnvelope()
         event.set_to(self.CONNECTOR_LIFECYCLE).set_headers(headers)
         self.platform.send_event(event)
@@ -200,229 +577,269 @@ class NetworkConnector:
             else:
                 self.log.warn(str(body)+", status="+headers['status'])
 
-    def _incoming(self, headers: dict, body: any):
+    def _on_open(self, session: ConnectorSession, url: str):
+        # runs in the event loop
+        session.ready = False
+        session.batch_enabled = False
+        session.compression_enabled = False
+        session.bulk_enabled = False
+        session.ext_enabled = False
+        session.send_credit = None
+        session.consumed = 0
+        self.log.info("Login to language connector")
+        self.send_payload({'type': 'login', 'api_key': self.api_key, self.FEATURES: self._features()}, session)
+        self._send_life_cycle_event(session, {'type': 'open', 'url': url})
+
+    def _on_close(self, session: ConnectorSession, status: int, message: str):
+        # runs in the event loop
+        session.ready = False
+        self._rebalance()
+        self.log.info("Closed")
+        self._send_life_cycle_event(session, {'type': 'close', 'status': status, 'message': message})
+
+    def _on_bytes(self, session: ConnectorSession, body: bytes):
         """
-        This function handles incoming messages from the websocket connection with the Mercury language connector.
-        It must be invoked using events. It should not be called directly to guarantee proper event sequencing.
+        This function handles incoming binary frames from the language connector.
+        It runs in the event loop so that incoming events are decoded and dispatched in order.
 
         Args:
-            headers: type is open, close, text or bytes
-            body: string or bytes
+            session: the connection that receives the frame
+            body: frame payload
 
         Returns: None
 
         """
-        if self.ws and 'type' in headers:
-            if headers['type'] == 'open':
-                self.ready = False
-                self.log.info("Login to language connector")
-                self.send_payload({'type': 'login', 'api_key': self.api_key})
-                self._send_life_cycle_event(headers)
-            if headers['type'] == 'close':
-                self.ready = False
-                self.log.info("Closed")
-                self._send_life_cycle_event(headers)
-            if headers['type'] == 'text':
-                self.log.debug(body)
-            if headers['type'] == 'bytes':
-                event = msgpack.unpackb(body, raw=False)
-                if 'type' in event:
-                    event_type = event['type']
-                    if event_type == 'block' and 'block' in event:
-                        envelope = EventEnvelope()
-                        inner_event = envelope.from_map(event['block'])
-                        inner_headers = inner_event.get_headers()
-                        if self.MSG_ID in inner_headers and self.COUNT in inner_headers and self.TOTAL in inner_headers:
-                            msg_id = inner_headers[self.MSG_ID]
-                            msg_count = inner_headers[self.COUNT]
-                            msg_total = inner_headers[self.TOTAL]
-                            data = inner_event.get_body()
-                            if isinstance(data, bytes):
-                                buffer = self.cache.get(msg_id)
-                                if buffer is None:
-                                    buffer = io.BytesIO()
-                                buffer.write(data)
-                                if msg_count == msg_total:
-                                    self.cache.remove(msg_id)
-                                    # reconstruct event for processing
-                                    buffer.seek(0)
-                                    envelope = EventEnvelope()
-                                    unpacked = msgpack.unpackb(buffer.read(), raw=False)
-                                    restored = envelope.from_map(unpacked)
-                                    target = restored.get_to()
-                                    if self.platform.has_route(target):
-                                        self.platform.send_event(restored)
-                                    else:
-                                        self.log.warn(f'Incoming event dropped because {target} not found')
-                                else:
-                                    self.cache.put(msg_id, buffer)
-                    if event_type == 'event' and 'event' in event:
-                        unpacked = msgpack.unpackb(event['event'], raw=False)
-                        envelope = EventEnvelope()
-                        inner_event = envelope.from_map(unpacked)
-                        if self.platform.has_route(inner_event.get_to()):
-                            self.platform.send_event(inner_event)
-                        else:
-                            self.log.warn(f'Incoming event dropped because {inner_event.get_to()} not found')
-
-    def _outgoing(self, headers: dict, body: any):
-        """
-        This function handles sending outgoing messages to the websocket connection with the Mercury language connector.
-        It must be invoked using events. It should not be called directly to guarantee proper event sequencing.
-
-        Args:
-            headers: type is close, text or bytes
-            body: string or bytes
-
-        Returns: None
+        try:
+            # the frame is consumed even when it cannot be processed so that the remote sender does not stall
+            if self._credit_window > 0:
+                session.consumed += len(body)
+            self._incoming_bytes(session, body)
+            if self._credit_window > 0 and session.consumed >= self._credit_window // 4 and not session.grant_pending:
+                self._grant(session)
+        except Exception as e:
+            self.log.error(f'Unable to process incoming frame - {e}')
+
+    def _grant(self, session: ConnectorSession):
+        # credits are withheld while local functions are backlogged so that remote producers slow down
+        session.grant_pending = False
+        if not session.is_connected() or session.consumed == 0:
+            return
+        if self.platform.get_max_backlog() >= self._credit_backlog:
+            session.grant_pending = True
+            session.withheld += 1
+            self._loop.call_later(self.CREDIT_RETRY, self._grant, session)
+        else:
+            self._send_credit(session, session.consumed)
+            session.consumed = 0
 
-        """
-        if 'type' in headers:
-            if headers['type'] == 'close':
-                code = 1000 if 'code' not in headers else headers['code']
-                reason = 'OK' if 'reason' not in headers else headers['reason']
-                self.close_connection(code, reason)
-            if headers['type'] == 'text':
-                self._send_text(body)
-            if headers['type'] == 'bytes':
-                self._send_bytes(body)
-
-    def _send_text(self, body: str):
-        def send(data: str):
-            async def async_send(d: str):
-                await self.ws.send_str(d)
-            self._loop.create_task(async_send(data))
-        if self.is_connected():
-            self._loop.call_soon_threadsafe(send, body)
+    def _send_credit(self, session: ConnectorSession, credit: int):
+        # a credit grant bypasses the send queue because the queue may be waiting for credit itself
+        payload = codec.pack({'type': self.CREDIT, self.CREDIT: credit})
+        self._loop.create_task(self._send_now(session.ws, payload))
 
-    def _send_bytes(self, body: bytes):
-        def send(data: bytes):
-            async def async_send(d: bytes):
-                await self.ws.send_bytes(d)
-            self._loop.create_task(async_send(data))
-        if self.is_connected():
-            self._loop.call_soon_threadsafe(send, body)
+    async def _send_now(self, ws, payload: bytes):
+        try:
+            await ws.send_bytes(payload)
+        except ConnectionError as e:
+            self.log.debug(f'Credit grant dropped - {e}')
+
+    def _incoming_bytes(self, session: ConnectorSession, body: bytes):
+        event = codec.unpack(body)
+        if 'type' in event:
+            event_type = event['type']
+            if event_type == self.BATCH and self.BATCH in event:
+                for item in event[self.BATCH]:
+                    # an event that cannot be processed does not discard the rest of the batch
+                    try:
+                        self._incoming_bytes(session, item)
+                    except Exception as e:
+                        self.log.error(f'Unable to process batched event - {e}')
+            if event_type == 'block' and 'block' in event:
+                block = event['block']
+                inner_headers = block.get('headers', dict())
+                if self.MSG_ID in inner_headers and self.COUNT in inner_headers and self.TOTAL in inner_headers:
+                    data = block.get('body')
+                    if isinstance(data, bytes):
+                        payload = self.assembler.add(inner_headers[self.MSG_ID], int(inner_headers[self.COUNT]),
+                                                     int(inner_headers[self.TOTAL]), session.max_ws_payload, data)
+                        if payload is not None:
+                            # reconstruct event for processing
+                            self._dispatch(session, self._unpack_event(payload, self.ZIP_TAG in inner_headers))
+                        else:
+                            self._schedule_expiry()
+            if event_type == 'event' and 'event' in event:
+                self._dispatch(session, self._unpack_event(event['event'], self.ZIP in event))
+            if event_type == self.CREDIT and session.send_credit is not None:
+                session.send_credit += event.get(self.CREDIT, 0)
+                if session.send_credit > 0:
+                    session.credit_available.set()
+            if event_type == self.ROUTES and isinstance(event.get(self.ROUTES), list):
+                self.directory.load(event[self.ROUTES])
+            if event_type == 'add' and 'route' in event:
+                self.directory.add(event['route'])
+            if event_type == 'remove' and 'route' in event:
+                self.directory.remove(event['route'])
+
+    def _schedule_expiry(self):
+        # runs in the event loop while there are incomplete or rejected payloads
+        if self._expiry is None and (self.assembler.pending() > 0 or self.assembler.rejected() > 0):
+            self._expiry = self._loop.call_later(self.EXPIRY_INTERVAL, self._expire_payloads)
+
+    def _expire_payloads(self):
+        self._expiry = None
+        self.assembler.expire()
+        self._schedule_expiry()
+
+    def _unpack_event(self, payload: any, zipped: bool):
+        compressed_size = len(payload)
+        if zipped:
+            # guard against a payload that expands beyond the reassembly limit
+            decompressor = zlib.decompressobj()
+            payload = decompressor.decompress(payload, self.assembler.max_message_bytes)
+            if decompressor.unconsumed_tail:
+                raise ValueError(f'Decompressed event exceeds {self.assembler.max_message_bytes} bytes')
+        with self._stats_lock:
+            self._stats['in_compressed_bytes'] += compressed_size
+            self._stats['in_bytes'] += len(payload)
+        return codec.unpack(payload)
+
+    def _dispatch(self, session: ConnectorSession, event: dict):
+        if event.get('to') == self.SERVER_CONFIG:
+            config = EventEnvelope().from_map(event)
+            self._get_server_config(session, config.get_headers(), config.get_body())
+        elif not self.platform.dispatch_network_event(event):
+            self.log.warn(f'Incoming event dropped because {event.get("to")} not found')
 
     def is_connected(self):
-        return self.started and self.ws
+        # replies are accepted on any connection of the pool
+        return self.started and any(s.is_connected() for s in self.sessions)
 
     def is_ready(self):
-        return self.is_connected() and self.ready
+        return self.started and len(self._active) > 0
 
     def start_connection(self):
-        async def worker():
+        async def worker(session: ConnectorSession):
             while self.normal:
-                await self._loop.create_task(self.connection_handler(self._get_next_url()))
+                await self._loop.create_task(self.connection_handler(session, session.get_next_url()))
                 # check again because the handler may have run for a while
                 if self.normal:
-                    # retry connection in 5 seconds
-                    for _ in range(10):
-                        await asyncio.sleep(0.5)
-                        if not self.normal:
-                            break
+                    remaining = self._backoff(session.attempts)
+                    session.attempts += 1
+                    while remaining > 0 and self.normal:
+                        await asyncio.sleep(min(0.5, remaining))
+                        remaining -= 0.5
                 else:
                     break
         if not self.started:
             self.started = True
             self.platform.register(self.DISTRIBUTED_TRACING, self._distributed_trace.logger, 1, is_private=True)
-            self.platform.register(self.INCOMING_WS_PATH, self._incoming, 1, is_private=True)
-            self.platform.register(self.OUTGOING_WS_PATH, self._outgoing, 1, is_private=True)
             self.platform.register(self.SYSTEM_ALERT, self._alert, 1, is_private=True)
-            self.platform.register(self.SERVER_CONFIG, self._get_server_config, 1, is_private=True)
             self.platform.register(self.CONNECTOR_LIFECYCLE, self._life_cycle, 1, is_private=True)
-            self._loop.create_task(worker())
+            for session in self.sessions:
+                self._loop.create_task(worker(session))
 
     def close_connection(self, code, reason, stop_engine=False):
         async def async_close(rc, msg):
-            if self.is_connected():
-                # this only send a "closing signal" to the handler - it does not actually close the connection.
-                self.close_code = rc
-                self.close_message = msg
-                await self.ws.close()
+            for session in self.sessions:
+                if session.is_connected():
+                    # this only send a "closing signal" to the handler - it does not actually close the connection.
+                    session.close_code = rc
+                    session.close_message = msg
+                    await session.ws.close()
 
         def closing(rc, msg):
             self._loop.create_task(async_close(rc, msg))
 
+        def discard_outbox():
+            with self._outbox_lock:
+                if self._outbox is not None:
+                    self._outbox.destroy()
+                    self._outbox = None
+
         if stop_engine:
             self.normal = False
-            self.cache.stop()
+            self.assembler.clear()
+            self._loop.call_soon_threadsafe(discard_outbox)
         self._loop.call_soon_threadsafe(closing, code, reason)
 
-    async def connection_handler(self, url):
+    async def connection_handler(self, session: ConnectorSession, url):
         try:
-            async with aiohttp.ClientSession(loop=self._loop, timeout=aiohttp.ClientTimeout(total=10)) as session:
+            async with aiohttp.ClientSession(loop=self._loop, timeout=aiohttp.ClientTimeout(total=10)) as http:
                 full_path = f'{url}/{self.origin}'
-                self.ws = await session.ws_connect(full_path)
-                envelope = EventEnvelope()
-                envelope.set_to(self.INCOMING_WS_PATH).set_header('type', 'open').set_header('url', full_path)
-                self.platform.send_event(envelope)
-                self.log.info(f'Connected to {full_path}')
-                closed = False
-                self.last_active = time.time()
-
-                while self.normal:
-                    try:
-                        msg = await self.ws.receive(timeout=1)
-                    except asyncio.TimeoutError:
-                        if not self.normal:
-                            break
-                        else:
-                            # idle - send keep-alive
-                            now = time.time()
-                            if self.is_connected() and now - self.last_active > 30:
-                                self.last_active = now
-                                self.send_keep_alive()
-                            continue
-
-                    # receive incoming event
-                    self.last_active = time.time()
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        if self.platform.has_route(self.INCOMING_WS_PATH):
-                            envelope = EventEnvelope()
-                            envelope.set_to(self.INCOMING_WS_PATH).set_header('type', 'text').set_body(msg.data)
-                            self.platform.send_event(envelope)
-                        else:
-                            break
-                    elif msg.type == aiohttp.WSMsgType.BINARY:
-                        if self.platform.has_route(self.INCOMING_WS_PATH):
-                            envelope = EventEnvelope()
-                            envelope.set_to(self.INCOMING_WS_PATH).set_header('type', 'bytes').set_body(msg.data)
-                            self.platform.send_event(envelope)
-                        else:
-                            break
-                    else:
-                        if msg.type == aiohttp.WSMsgType.ERROR:
-                            self.log.error('Unexpected connection error')
-                        if msg.type == aiohttp.WSMsgType.CLOSING:
-                            # closing signal received - close the connection now
-                            self.log.info(f'Disconnected, status={self.close_code}, message={self.close_message}')
-                            await self.ws.close(code=self.close_code, message=bytes(self.close_message, 'utf-8'))
-                            if self.platform.has_route(self.INCOMING_WS_PATH):
-                                envelope = EventEnvelope()
-                                envelope.set_to(self.INCOMING_WS_PATH).set_body(self.close_message)\
-                                        .set_header('type', 'close').set_header('status', self.close_code)
-                                self.platform.send_event(envelope)
-                            closed = True
-                        if msg.type == aiohttp.WSMsgType.CLOSE or msg.type == aiohttp.WSMsgType.CLOSED:
-                            self.close_code = 1001 if msg.data is None else msg.data
-                            self.close_message = 'OK' if msg.extra is None else str(msg.extra)
-                            self.log.info(f'Disconnected, status={self.close_code}, message={self.close_message}')
-                            if self.platform.has_route(self.INCOMING_WS_PATH):
-                                envelope = EventEnvelope()
-                                envelope.set_to(self.INCOMING_WS_PATH).set_header('message', self.close_message) \
-                                        .set_header('type', 'close').set_header('status', self.close_code)
-                                self.platform.send_event(envelope)
-                            closed = True
-                        break
-                if not closed:
-                    await self.ws.close(code=1000, message=b'OK')
-                    self.ws = None
-                    if self.platform.has_route(self.INCOMING_WS_PATH):
-                        envelope = EventEnvelope()
-                        envelope.set_to(self.INCOMING_WS_PATH).set_body('OK')\
-                            .set_header('type', 'close').set_header('status', 1000)
-                        self.platform.send_event(envelope)
-
-        except aiohttp.ClientConnectorError:
-            self._skip_url()
-            self.log.warn(f'Unreachable {url}')
+                # permessage-deflate is used only when the language connector accepts it
+                ws = await http.ws_connect(full_path, compress=15 if self._codec == self.DEFLATE else 0)
+                if ws.compress:
+                    self.log.info('Websocket permessage-deflate enabled')
+                session.send_queue = asyncio.Queue()
+                session.credit_available = asyncio.Event()
+                session.ws = ws
+                session.url = url
+                session.connects += 1
+                session.connected_since = time.time()
+                writer = self._loop.create_task(self._writer(session, ws, session.send_queue))
+                try:
+                    self.log.info(f'Connected to {full_path}')
+                    self._on_open(session, full_path)
+                    await self._receive(session)
+                finally:
+                    writer.cancel()
+                    session.send_queue = None
+                    session.ws = None
+                    session.ready = False
+                    session.connected_since = None
+                    self._rebalance()
+                    with self._send_lock:
+                        session.outstanding = 0
+                        self._send_lock.notify_all()
+
+        except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+            session.failures += 1
+            session.skip_url()
+            self.log.warn(f'Unreachable {url} - {e}')
+        except Exception as e:
+            # the session worker reconnects with backoff
+            session.failures += 1
+            self.log.error(f'Connection to {url} failed - {e}')
+
+    async def _receive(self, session: ConnectorSession):
+        closed = False
+        session.last_active = time.time()
+        while self.normal:
+            try:
+                msg = await session.ws.receive(timeout=1)
+            except asyncio.TimeoutError:
+                if not self.normal:
+                    break
+                else:
+                    # idle - send keep-alive
+                    now = time.time()
+                    if session.is_connected() and now - session.last_active > 30:
+                        session.last_active = now
+                        self.send_keep_alive(session)
+                    continue
+
+            # receive incoming event
+            session.last_active = time.time()
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self.log.debug(msg.data)
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                self._on_bytes(session, msg.data)
+            else:
+                if msg.type == aiohttp.WSMsgType.ERROR:
+                    self.log.error('Unexpected connection error')
+                if msg.type == aiohttp.WSMsgType.CLOSING:
+                    # closing signal received - close the connection now
+                    self.log.info(f'Disconnected, status={session.close_code}, message={session.close_message}')
+                    await session.ws.close(code=session.close_code, message=bytes(session.close_message, 'utf-8'))
+                    self._on_close(session, session.close_code, session.close_message)
+                    closed = True
+                if msg.type == aiohttp.WSMsgType.CLOSE or msg.type == aiohttp.WSMsgType.CLOSED:
+                    session.close_code = 1001 if msg.data is None else msg.data
+                    session.close_message = 'OK' if msg.extra is None else str(msg.extra)
+                    self.log.info(f'Disconnected, status={session.close_code}, message={session.close_message}')
+                    self._on_close(session, session.close_code, session.close_message)
+                    closed = True
+                break
+        if not closed:
+            await session.ws.close(code=1000, message=b'OK')
+            self._on_close(session, 1000, 'OK')
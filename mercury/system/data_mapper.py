@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from mercury.system.dict_util import MultiLevelDict
+
+
+def _to_bool(value: any):
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ('true', 'yes', '1'):
+            return True
+        if text in ('false', 'no', '0', ''):
+            return False
+        raise ValueError(f'{value} is not a boolean')
+    return bool(value)
+
+
+class DataMapper:
+    """
+    Map a document to a new dictionary using a list of rules. The rules are compiled once into
+    a plan that reads and writes shared path prefixes only once for each document.
+
+    A rule is a string "source.path -> target.path" or a dict with "source", "target" and optionally
+    "default" and "type" (str, int, float or bool). Paths use the composite path syntax of MultiLevelDict.
+    A rule is skipped when the source element does not exist and there is no default value.
+    """
+
+    TYPES = {'str': str, 'int': int, 'float': float, 'bool': _to_bool}
+
+    def __init__(self, rules: list):
+        if not isinstance(rules, list) or len(rules) == 0:
+            raise ValueError('Mapping rules must be a non-empty list')
+        self._rules = list()
+        # the plan is a list of lookups for source prefixes and a list of writes for targets.
+        # Each distinct path prefix has a register that holds the element or the container for a document.
+        self._lookups = list()
+        self._containers = list()
+        self._writes = list()
+        source_registers = {(): 0}
+        target_registers = {(): 0}
+        # each target node is a tuple of keys and indexes that is a leaf, a dict or a list
+        leaves = set()
+        node_types = {(): dict}
+        for rule in rules:
+            source, target, default, data_type = self._parse_rule(rule)
+            self._rules.append((source, default, data_type, None if data_type is None else self.TYPES[data_type]))
+            source_segments = self._compile(source)
+            for n in range(1, len(source_segments) + 1):
+                if source_segments[0: n] not in source_registers:
+                    source_registers[source_segments[0: n]] = len(source_registers)
+                    self._lookups.append((source_registers[source_segments[0: n - 1]], source_segments[n - 1]))
+            target_segments = self._compile(target)
+            nodes = tuple(x for key, indexes, _ in target_segments for x in (key, *(indexes or ())))
+            conflict = nodes in leaves or nodes in node_types or \
+                any(nodes[0: n] in leaves for n in range(1, len(nodes)))
+            for n in range(len(nodes)):
+                # the next key or index tells whether a node is a dict or a list
+                node_type = list if isinstance(nodes[n], int) else dict
+                conflict = conflict or node_types.setdefault(nodes[0: n], node_type) is not node_type
+            if conflict:
+                raise ValueError(f'Invalid mapping rule - {target} conflicts with another target')
+            leaves.add(nodes)
+            for n in range(1, len(target_segments)):
+                if target_segments[0: n] not in target_registers:
+                    target_registers[target_segments[0: n]] = len(target_registers)
+                    self._containers.append((target_registers[target_segments[0: n - 1]],
+                                             self._segment_path(target_segments[n - 1])))
+            self._writes.append((source_registers[source_segments], target_registers[target_segments[0: -1]],
+                                 self._segment_path(target_segments[-1])))
+
+    def _parse_rule(self, rule: any):
+        if isinstance(rule, str):
+            if '->' not in rule:
+                raise ValueError(f'Invalid mapping rule - {rule}')
+            sep = rule.index('->')
+            source, target, default, data_type = rule[0: sep].strip(), rule[sep+2:].strip(), None, None
+        elif isinstance(rule, dict) and 'source' in rule and 'target' in rule:
+            source, target = rule['source'], rule['target']
+            default, data_type = rule.get('default'), rule.get('type')
+        else:
+            raise ValueError(f'Invalid mapping rule - {rule}')
+        if data_type is not None and data_type not in self.TYPES:
+            raise ValueError(f'Invalid mapping rule - type must be one of {list(self.TYPES.keys())}')
+        return source, target, default, data_type
+
+    @staticmethod
+    def _segment_path(segment: tuple):
+        # a plain key is set directly and a list element is set with a composite path of one segment
+        key, indexes, _ = segment
+        return key if indexes is None else MultiLevelDict.compile(key + ''.join(f'[{i}]' for i in indexes))
+
+    @staticmethod
+    def _compile(path: str):
+        compiled = MultiLevelDict.compile(path)
+        if compiled.error is not None:
+            raise ValueError(f'{compiled.error} - {path}')
+        return compiled.segments
+
+    def apply(self, document: any) -> dict:
+        """
+        Map one document
+
+        Args:
+            document: dict or an object with a to_map() method such as EventEnvelope or AsyncHttpRequest
+
+        Returns: new dictionary
+
+        """
+        data = document.to_map() if hasattr(document, 'to_map') else document
+        if not isinstance(data, dict):
+            raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
+        values = self._read(data)
+        return self._write(values)
+
+    def apply_all(self, documents: list) -> list:
+        """
+        Map a batch of documents using the same plan
+
+        Args:
+            documents: list of documents
+
+        Returns: list of new dictionaries
+
+        """
+        return [self.apply(document) for document in documents]
+
+    def _read(self, data: dict) -> list:
+        registers = [data]
+        for parent, (key, indexes, _) in self._lookups:
+            value = registers[parent]
+            if isinstance(value, dict):
+                value = value.get(key)
+                for i in indexes or ():
+                    value = value[i] if isinstance(value, list) and 0 <= i < len(value) else None
+            else:
+                value = None
+            registers.append(value)
+        values = list()
+        for register, (source, default, data_type, coerce) in zip((w[0] for w in self._writes), self._rules):
+            value = registers[register]
+            if value is None:
+                value = default
+            if value is not None and coerce is not None:
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f'Unable to convert {source} to {data_type}')
+            values.append(value)
+        return values
+
+    def _write(self, values: list) -> dict:
+        result = dict()
+        # containers are created when the first value is written into them
+        registers = [result] + [None] * len(self._containers)
+        for value, (_, parent, path) in zip(values, self._writes):
+            if value is None:
+                continue
+            container = registers[parent]
+            if container is None:
+                container = self._create(registers, parent)
+            if isinstance(path, str):
+                container[path] = value
+            else:
+                path.set(container, value)
+        return result
+
+    def _create(self, registers: list, register: int) -> dict:
+        pending = list()
+        while registers[register] is None:
+            pending.append(register)
+            register = self._containers[register - 1][0]
+        for register in reversed(pending):
+            parent, path = self._containers[register - 1]
+            container = registers[parent]
+            node = container.get(path) if isinstance(path, str) else path.get(container)
+            if not isinstance(node, dict):
+                node = dict()
+                if isinstance(path, str):
+                    container[path] = node
+                else:
+                    path.set(container, node)
+            registers[register] = node
+        return registers[pending[0]]
@@ -16,10 +16,19 @@
 # limitations under the License.
 #
 
+import functools
+import re
+from mercury.system import codec
 from mercury.system.utility import Utility
 
 
+_SEPARATORS = re.compile('[./]')
+_SEGMENT = re.compile(r'([^\[\]]+)((?:\[[0-9]+\])*)')
+_QUERY_SEGMENT = re.compile(r'([^\[\]]*)((?:\[(?:[0-9]+|\*)\])*)')
+
+
 class MultiLevelDict:
+    PATH_CACHE_SIZE = 4096
 
     def __init__(self, data=None):
         self.util = Utility()
@@ -42,65 +51,31 @@ class MultiLevelDict:
     def is_list_element(item: str):
         return '[' in item and item.endswith(']') and (not item.startswith('['))
 
-    def set_element(self, composite_path: str, value: any, source_data: dict = None):
+    def set_element(self, composite_path: any, value: any, source_data: dict = None):
         if composite_path is None:
             raise ValueError('Missing composite_path')
-        self.validate_composite_path_syntax(composite_path)
+        path = composite_path if isinstance(composite_path, CompositePath) else self.compile(composite_path)
         data = self.dataset if source_data is None else source_data
         if not isinstance(data, dict):
             raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
-        segments = self.util.multi_split(composite_path, './')
-        if len(segments) == 0:
-            return
-        current = data
-        size = len(segments)
-        n = 0
-        composite = ''
-        for p in segments:
-            n += 1
-            if self.is_list_element(p):
-                sep = p.index('[')
-                indexes = self._get_indexes(p[sep:])
-                element = p[0:sep]
-                parent = self.get_element(composite+element, source_data)
-                if n == size:
-                    if isinstance(parent, list):
-                        self._set_list_element(indexes, parent, value)
-                    else:
-                        new_list = list()
-                        self._set_list_element(indexes, new_list, value)
-                        current[element] = new_list
-                    break
-                else:
-                    if isinstance(parent, list):
-                        next_dict = self.get_element(composite+p, source_data)
-                        if isinstance(next_dict, dict):
-                            current = next_dict
-                        else:
-                            m = dict()
-                            self._set_list_element(indexes, parent, m)
-                            current = m
-                    else:
-                        next_map = dict()
-                        new_list = list()
-                        self._set_list_element(indexes, new_list, next_map)
-                        current[element] = new_list
-                        current = next_map
-            else:
-                if n == size:
-                    current[p] = value
-                    break
-                else:
-                    if p in current and isinstance(current[p], dict):
-                        current = current[p]
-                    else:
-                        next_map = dict()
-                        current[p] = next_map
-                        current = next_map
-            composite = composite + p + '.'
+        path.set(data, value)
+
+    @staticmethod
+    def compile(composite_path: str):
+        """
+        Parse a composite path once. Parsed paths are kept in a LRU cache.
+
+        Args:
+            composite_path: e.g. "a.b[2].c"
+
+        Returns: CompositePath
 
-    def _set_list_element(self, indexes: list, source_data: list, value: any):
-        current = self._expand_list(indexes, source_data)
+        """
+        return _compile_path(composite_path)
+
+    @staticmethod
+    def _set_list_element(indexes: list, source_data: list, value: any):
+        current = MultiLevelDict._expand_list(indexes, source_data)
         size = len(indexes)
         for i in range(0, size):
             idx = indexes[i]
@@ -170,7 +145,7 @@ class MultiLevelDict:
                 break
         return None
 
-    def get_element(self, composite_path: str, source_data: dict = None):
+    def get_element(self, composite_path: any, source_data: dict = None):
         if composite_path is None:
             return None
         data = self.dataset if source_data is None else source_data
@@ -178,90 +153,267 @@ class MultiLevelDict:
             raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
         if len(data) == 0:
             return None
+        if isinstance(composite_path, CompositePath):
+            return composite_path.get(data)
         # special case for top level element that is using composite itself
         if composite_path in data:
             return data[composite_path]
         if not self._is_composite(composite_path):
             return None
-        parts = self.util.multi_split(composite_path, './')
-        current = dict(data)
-        size = len(parts)
-        n = 0
-        for p in parts:
-            n += 1
-            if self.is_list_element(p):
-                start = p.index('[')
-                end = p.index(']', start)
-                if end == -1:
-                    break
-                key = p[0: start]
-                index = p[start+1: end].strip()
-                if len(index) == 0 or not self.is_digits(index):
-                    break
-                if key in current:
-                    next_list = current[key]
-                    if isinstance(next_list, list):
-                        indexes = self._get_indexes(p[start:])
-                        next_result = self._get_list_element(indexes, next_list)
-                        if n == size:
-                            return next_result
-                        if isinstance(next_result, dict):
-                            current = next_result
-                            continue
-            else:
-                if p in current:
-                    next_dict = current[p]
-                    if n == size:
-                        return next_dict
-                    elif isinstance(next_dict, dict):
-                        current = next_dict
-                        continue
-            # item not found
-            break
-        return None
+        return self.compile(composite_path).get(data)
 
     def normalize_map(self):
         if not self.normalized:
             # do only once
             self.normalized = True
-            flat_map = self.get_flat_map(self.dataset)
-            result = dict()
-            for k in flat_map:
-                self.set_element(k, flat_map[k], result)
-            self.dataset = result
+            self.dataset = self._normalize(self.dataset)
+
+    def _normalize(self, data: dict):
+        # Expand composite keys in one pass. This is the same as setting each element of the flat map
+        # into a new dictionary without walking from the root for every element.
+        result = dict()
+        root = _Target(None, (), result)
+        # each entry is a target dictionary, the segments of a list relative to it and the source iterator
+        stack = [(root, None, iter(data.items()))]
+        while stack:
+            target, base, items = stack[-1]
+            for k, v in items:
+                if base is None:
+                    segments = self._parse_key(k)
+                else:
+                    # k is the index of a list element
+                    key, indexes, _ = base[-1]
+                    segments = base[:-1] + ((key, (k,) if indexes is None else indexes + (k,), True),)
+                if isinstance(v, dict):
+                    stack.append((_Target(target, segments), None, iter(v.items())))
+                    break
+                if isinstance(v, list):
+                    stack.append((target, segments, iter(enumerate(v))))
+                    break
+                container = target.materialize()
+                if len(segments) == 1 and segments[0][1] is None:
+                    container[segments[0][0]] = v
+                else:
+                    _set_segments(container, segments, v)
+            else:
+                stack.pop()
+        return result
+
+    def _parse_key(self, key: str):
+        if not self._is_composite(key):
+            if len(key) == 0:
+                raise ValueError('Missing composite path')
+            return (key, None, True),
+        path = self.compile(key)
+        if path.error is not None:
+            raise ValueError(path.error)
+        return path.segments
+
+    @staticmethod
+    def compile_query(pattern: str):
+        """
+        Parse a query pattern once. Parsed queries are kept in a LRU cache.
+        A pattern is a composite path where "*" matches any key, "[*]" matches any list element
+        and "**" matches any number of levels. e.g. "order.items[*].price" or "**.price"
+
+        Args:
+            pattern: query pattern
+
+        Returns: CompositeQuery
+
+        """
+        return _compile_query(pattern)
+
+    def find(self, pattern: any, source_data: dict = None):
+        """
+        Find the values that match a query pattern
+
+        Args:
+            pattern: query pattern or CompositeQuery
+            source_data: optional dictionary instead of the dataset of this object
+
+        Returns: list of values in document order
+
+        """
+        query = pattern if isinstance(pattern, CompositeQuery) else self.compile_query(pattern)
+        return query.values(self.dataset if source_data is None else source_data)
+
+    def find_items(self, pattern: any, source_data: dict = None):
+        """
+        Find the elements that match a query pattern
+
+        Args:
+            pattern: query pattern or CompositeQuery
+            source_data: optional dictionary instead of the dataset of this object
+
+        Returns: list of (composite path, value) in document order
+
+        """
+        query = pattern if isinstance(pattern, CompositeQuery) else self.compile_query(pattern)
+        return query.items(self.dataset if source_data is None else source_data)
+
+    def remove_element(self, composite_path: any, source_data: dict = None):
+        if composite_path is None:
+            raise ValueError('Missing composite_path')
+        path = composite_path if isinstance(composite_path, CompositePath) else self.compile(composite_path)
+        if path.error is not None:
+            raise ValueError(path.error)
+        data = self.dataset if source_data is None else source_data
+        if not isinstance(data, dict):
+            raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
+        return path.delete(data)
+
+    @staticmethod
+    def diff(old: dict, new: dict):
+        """
+        Compare two dictionaries and return the operations that change the old one into the new one.
+        A subtree that is added or replaced is a single "set" operation. Values are not copied.
+
+        Args:
+            old: original dictionary
+            new: updated dictionary
+
+        Returns: list of {"op": "set", "path": composite path, "value": value} and {"op": "delete", "path": path}.
+                 When a key is not a valid composite path, "path" is the parent and the key is given in "key".
+
+        """
+        if not isinstance(old, dict) or not isinstance(new, dict):
+            raise ValueError('Invalid input - Expect: dict')
+        result = list()
+        # each entry is the composite path of a pair of dictionaries or lists that are compared
+        stack = [('', old, new)]
+        while stack:
+            path, a, b = stack.pop()
+            if isinstance(b, dict):
+                for k in a:
+                    if k not in b:
+                        result.append(_patch_op('delete', path, k))
+                items = [(path, k, a[k] if k in a else _MISSING, v) for k, v in b.items()]
+            else:
+                common = min(len(a), len(b))
+                for i in range(len(a) - 1, common - 1, -1):
+                    result.append({'op': 'delete', 'path': f'{path}[{i}]'})
+                items = [(f'{path}[{i}]', None, a[i] if i < common else _MISSING, b[i]) for i in range(len(b))]
+            nested = list()
+            for item_path, key, x, y in items:
+                if x is y:
+                    continue
+                if key is not None and not _is_path_key(key):
+                    # a key that cannot be written as a composite path is updated as a whole
+                    if x is _MISSING or not _is_same(x, y):
+                        result.append(_patch_op('set', item_path, key, y))
+                elif (isinstance(x, dict) and isinstance(y, dict)) or (isinstance(x, list) and isinstance(y, list)):
+                    nested.append((_join(item_path, key), x, y))
+                elif x is _MISSING or not _is_same(x, y):
+                    result.append(_patch_op('set', item_path, key, y))
+            stack.extend(reversed(nested))
+        return result
+
+    def apply_patch(self, ops: list, source_data: dict = None):
+        """
+        Apply the operations from diff() in place
+
+        Args:
+            ops: list of operations
+            source_data: optional dictionary instead of the dataset of this object
+
+        Returns: the updated dictionary
+
+        """
+        data = self.dataset if source_data is None else source_data
+        if not isinstance(data, dict):
+            raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
+        for op in ops:
+            path = op.get('path')
+            if 'key' in op:
+                # the key of the element is not a valid composite path
+                parent = self.compile(path).get(data) if path else data
+                if not isinstance(parent, dict):
+                    parent = dict()
+                    self.compile(path).set(data, parent)
+            if op.get('op') == 'set':
+                if 'key' in op:
+                    parent[op['key']] = op.get('value')
+                else:
+                    self.set_element(path, op.get('value'), data)
+            elif op.get('op') == 'delete':
+                if 'key' in op:
+                    parent.pop(op['key'], None)
+                else:
+                    self.remove_element(path, data)
+            else:
+                raise ValueError(f'Invalid patch operation - {op}')
+        return data
 
     def get_flat_map(self, data: dict = None):
         if not isinstance(data, dict):
             raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
         result = dict()
-        self._get_flat_map(None, data, result)
+        # same traversal as _flatten without the overhead of a generator
+        stack = [('', False, iter(data.items()))]
+        push = stack.append
+        while stack:
+            prefix, is_list, items = stack[-1]
+            for k, v in items:
+                key = f'{prefix}[{k}]' if is_list else prefix + k if prefix else k
+                if isinstance(v, dict):
+                    push((key + '.', False, iter(v.items())))
+                    break
+                if isinstance(v, list):
+                    push((key, True, enumerate(v)))
+                    break
+                result[key] = v
+            else:
+                stack.pop()
         return result
 
-    def _get_flat_map(self, prefix: any, src: dict, target: dict):
-        for k in src:
-            v = src[k]
-            key = k if prefix is None else prefix + "." + k
-            if isinstance(v, dict):
-                self._get_flat_map(key, v, target)
-            elif isinstance(v, list):
-                self._get_flat_list(key, v, target)
-            else:
-                target[key] = v
+    def iter_flat_items(self, data: dict = None, prefix: str = None):
+        """
+        Generate the (composite path, value) pairs of the flat map lazily
 
-    def _get_flat_list(self, prefix: str, src: list, target: dict):
-        n = 0
-        for v in src:
-            key = prefix + "[" + str(n) + "]"
-            n += 1
-            if isinstance(v, dict):
-                self._get_flat_map(key, v, target)
-            elif isinstance(v, list):
-                self._get_flat_list(key, v, target)
+        Args:
+            data: dictionary or None for the dataset of this object
+            prefix: optional composite path. e.g. "order.items[2]". Only the subtree under it is visited.
+
+        Returns: generator of (path, value)
+
+        """
+        data = self.dataset if data is None else data
+        if not isinstance(data, dict):
+            raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
+        if prefix is None:
+            return self._flatten(data, None)
+        path = self.compile(prefix)
+        if path.error is not None:
+            raise ValueError(path.error)
+        # canonical form of the prefix as it appears in flat map keys
+        target = '.'.join(key + ''.join(f'[{i}]' for i in indexes or ()) for key, indexes, _ in path.segments)
+        return self._flatten(data, target)
+
+    @staticmethod
+    def _flatten(data: dict, target: any):
+        # depth first without recursion so that the nesting depth is not limited
+        stack = [('', False, iter(data.items()))]
+        push = stack.append
+        while stack:
+            prefix, is_list, items = stack[-1]
+            for k, v in items:
+                key = f'{prefix}[{k}]' if is_list else prefix + k if prefix else k
+                if target is not None and not _is_related(key, target):
+                    continue
+                if isinstance(v, dict):
+                    push((key + '.', False, iter(v.items())))
+                    break
+                if isinstance(v, list):
+                    push((key, True, enumerate(v)))
+                    break
+                yield key, v
             else:
-                target[key] = v
+                stack.pop()
 
-    def validate_composite_path_syntax(self, path: str):
-        segments = self.util.multi_split(path, './')
+    @staticmethod
+    def validate_composite_path_syntax(path: str):
+        segments = Utility().multi_split(path, './')
         if len(segments) == 0:
             raise ValueError('Missing composite path')
         for s in segments:
@@ -292,3 +444,367 @@ class MultiLevelDict:
                                 raise ValueError('Invalid composite path - indexes must be digits')
                         else:
                             raise ValueError('Invalid composite path - invalid indexes')
+
+
+class CompositePath:
+    """
+    Parsed composite path. Each segment is a key, optional list indexes and a flag for a valid lookup.
+    e.g. "a.b[2][0].c" is ('a', None, True), ('b', (2, 0), True), ('c', None, True)
+    """
+
+    __slots__ = ('path', 'segments', 'error')
+
+    def __init__(self, path: str):
+        self.path = path
+        # syntax error is raised when the path is used to set an element
+        self.error = None
+        self.segments = self._parse_simple(path) if isinstance(path, str) else None
+        if self.segments is None:
+            self.segments = self._parse(path)
+
+    @staticmethod
+    def _parse_simple(path: str):
+        # most paths are keys with optional numeric indexes and do not need the full syntax check
+        if '[' not in path and ']' not in path:
+            segments = tuple((p, None, True) for p in _SEPARATORS.split(path) if p)
+            return segments if segments else None
+        segments = list()
+        for p in _SEPARATORS.split(path):
+            if p:
+                matched = _SEGMENT.fullmatch(p)
+                if matched is None:
+                    return None
+                key, indexes = matched.groups()
+                if indexes:
+                    segments.append((key, tuple(int(i) for i in indexes[1:-1].split('][')), True))
+                else:
+                    segments.append((key, None, True))
+        return tuple(segments)
+
+    def _parse(self, path: str):
+        segments = list()
+        util = Utility()
+        try:
+            MultiLevelDict.validate_composite_path_syntax(path)
+        except ValueError as e:
+            self.error = str(e)
+        for p in util.multi_split(path, './'):
+            if MultiLevelDict.is_list_element(p):
+                start = p.index('[')
+                end = p.index(']', start)
+                first = p[start+1: end].strip()
+                indexes = tuple(int(i) if MultiLevelDict.is_digits(i) else -1
+                                for i in util.multi_split(p[start:], '[]'))
+                # a lookup does not match any element when the first index is not a number
+                segments.append((p[0: start], indexes, len(first) > 0 and MultiLevelDict.is_digits(first)))
+            else:
+                segments.append((p, None, True))
+        return tuple(segments)
+
+    def get(self, data: dict):
+        return _get_segments(data, self.segments)
+
+    def set(self, data: dict, value: any):
+        if self.error is not None:
+            raise ValueError(self.error)
+        _set_segments(data, self.segments, value)
+
+    def delete(self, data: dict):
+        """
+        Remove the element of this path. A list element is removed and the elements after it are shifted.
+
+        Args:
+            data: dictionary
+
+        Returns: True if the element is found
+
+        """
+        key, indexes, valid = self.segments[-1]
+        parent = _get_segments(data, self.segments[0: -1]) if len(self.segments) > 1 else data
+        if not valid or not isinstance(parent, dict) or key not in parent:
+            return False
+        if indexes is None:
+            del parent[key]
+            return True
+        current = parent[key]
+        for i in indexes[0: -1]:
+            if not isinstance(current, list) or i < 0 or i >= len(current):
+                return False
+            current = current[i]
+        if not isinstance(current, list) or indexes[-1] < 0 or indexes[-1] >= len(current):
+            return False
+        current.pop(indexes[-1])
+        return True
+
+
+def _get_segments(data: dict, segments: tuple):
+    current = data
+    last = len(segments) - 1
+    for n, (key, indexes, valid) in enumerate(segments):
+        if not valid or key not in current:
+            return None
+        value = current[key]
+        if indexes is not None:
+            for i in indexes:
+                if not isinstance(value, list) or i < 0 or i >= len(value):
+                    return None
+                value = value[i]
+        if n == last:
+            return value
+        if not isinstance(value, dict):
+            return None
+        current = value
+    return None
+
+
+def _set_segments(data: dict, segments: tuple, value: any):
+    current = data
+    last = len(segments) - 1
+    for n, (key, indexes, _) in enumerate(segments):
+        if indexes is None:
+            if n == last:
+                current[key] = value
+                return
+            next_map = current.get(key)
+            if not isinstance(next_map, dict):
+                next_map = dict()
+                current[key] = next_map
+            current = next_map
+            continue
+        indexes = list(indexes)
+        parent = current.get(key)
+        if n == last:
+            if not isinstance(parent, list):
+                parent = list()
+                current[key] = parent
+            MultiLevelDict._set_list_element(indexes, parent, value)
+            return
+        if isinstance(parent, list):
+            next_map = MultiLevelDict._get_list_element(indexes, parent)
+            if not isinstance(next_map, dict):
+                next_map = dict()
+                MultiLevelDict._set_list_element(indexes, parent, next_map)
+        else:
+            next_map = dict()
+            new_list = list()
+            MultiLevelDict._set_list_element(indexes, new_list, next_map)
+            current[key] = new_list
+        current = next_map
+
+
+def _is_related(key: str, target: str):
+    # the key is the target, inside the target or on the way to the target
+    if len(key) <= len(target):
+        return target.startswith(key) and (len(key) == len(target) or target[len(key)] in '.[')
+    return key.startswith(target) and key[len(target)] in '.['
+
+
+_MISSING = object()
+
+
+def _is_path_key(key: any):
+    return isinstance(key, str) and len(key) > 0 and not MultiLevelDict._is_composite(key)
+
+
+def _join(path: str, key: str):
+    if key is None:
+        return path
+    return path + '.' + key if path else key
+
+
+def _patch_op(op: str, path: str, key: str, value: any = _MISSING):
+    # a key that is not a valid composite path is given separately from the path of its parent
+    if key is None or _is_path_key(key):
+        result = {'op': op, 'path': _join(path, key)}
+    else:
+        result = {'op': op, 'path': path, 'key': key}
+    if value is not _MISSING:
+        result['value'] = value
+    return result
+
+
+def _is_same(a: any, b: any):
+    # type sensitive comparison so that 1, 1.0 and True are different values
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if x is y:
+            continue
+        if type(x) is not type(y):
+            return False
+        if isinstance(x, dict):
+            if x.keys() != y.keys():
+                return False
+            stack.extend((v, y[k]) for k, v in x.items())
+        elif isinstance(x, list):
+            if len(x) != len(y):
+                return False
+            stack.extend(zip(x, y))
+        elif codec.is_array(x):
+            if x.shape != y.shape or x.dtype != y.dtype or not bool((x == y).all()):
+                return False
+        elif x != y:
+            return False
+    return True
+
+
+class _Target:
+    """
+    Dictionary in a normalized result that is created when the first element is set into it
+    """
+
+    __slots__ = ('parent', 'segments', 'container')
+
+    def __init__(self, parent, segments: tuple, container: dict = None):
+        self.parent = parent
+        self.segments = segments
+        self.container = container
+
+    def materialize(self) -> dict:
+        pending = list()
+        target = self
+        while target.container is None:
+            pending.append(target)
+            target = target.parent
+        for t in reversed(pending):
+            node = _get_segments(t.parent.container, t.segments)
+            if not isinstance(node, dict):
+                node = dict()
+                _set_segments(t.parent.container, t.segments, node)
+            t.container = node
+        return self.container
+
+
+class CompositeQuery:
+    """
+    Parsed query pattern. Each node is visited once in a depth first traversal in document order
+    with the set of steps that it may match.
+    """
+
+    __slots__ = ('pattern', 'steps', 'closures')
+
+    KEY = 0
+    ANY_KEY = 1
+    INDEX = 2
+    ANY_INDEX = 3
+    DESCEND = 4
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        steps = list()
+        segments = Utility().multi_split(pattern, './')
+        if len(segments) == 0:
+            raise ValueError('Missing query pattern')
+        for p in segments:
+            if p == '**':
+                steps.append((self.DESCEND, None))
+                continue
+            matched = _QUERY_SEGMENT.fullmatch(p)
+            if matched is None:
+                raise ValueError(f'Invalid query pattern - {p}')
+            key, indexes = matched.groups()
+            if key == '*':
+                steps.append((self.ANY_KEY, None))
+            elif key:
+                steps.append((self.KEY, key))
+            for i in indexes[1:-1].split('][') if indexes else ():
+                steps.append((self.ANY_INDEX, None) if i == '*' else (self.INDEX, int(i)))
+        self.steps = tuple(steps)
+        # "**" matches zero levels so a node at a "**" step also matches the steps after it
+        closures = list()
+        for n in range(len(steps) + 1):
+            m = n
+            while m < len(steps) and steps[m][0] == self.DESCEND:
+                m += 1
+            closures.append(tuple(range(n, m + 1)))
+        self.closures = tuple(closures)
+
+    def values(self, data: dict):
+        return [v for _, v in self._run(data, False)]
+
+    def items(self, data: dict):
+        return list(self._run(data, True))
+
+    def _run(self, data: dict, with_path: bool):
+        if not isinstance(data, dict):
+            raise ValueError(f'Invalid input - Expect: dict, Actual: {type(data)}')
+        steps = self.steps
+        size = len(steps)
+        transitions = dict()
+        # each state is a node, its composite path and the steps that the node may match next
+        stack = [(data, '', self.closures[0])]
+        while stack:
+            node, path, states = stack.pop()
+            if states[-1] == size:
+                yield path, node
+            if len(states) == 1 and states[0] < size:
+                # a single key or index is looked up directly
+                op, arg = steps[states[0]]
+                if op == self.KEY:
+                    if isinstance(node, dict) and arg in node:
+                        stack.append((node[arg], _key_path(path, arg) if with_path else None,
+                                      self.closures[states[0] + 1]))
+                    continue
+                if op == self.INDEX:
+                    if isinstance(node, list) and 0 <= arg < len(node):
+                        stack.append((node[arg], f'{path}[{arg}]' if with_path else None,
+                                      self.closures[states[0] + 1]))
+                    continue
+            is_dict = isinstance(node, dict)
+            if not is_dict and not isinstance(node, list):
+                continue
+            entry = (states, is_dict)
+            if entry not in transitions:
+                transitions[entry] = self._follow(states, is_dict)
+            following, keyed = transitions[entry]
+            children = list()
+            for key, value, child_path in _children(node, path, with_path):
+                matched = keyed.get(key, following) if keyed else following
+                if matched:
+                    children.append((value, child_path, matched))
+            stack.extend(reversed(children))
+
+    def _follow(self, states: tuple, is_dict: bool) -> tuple:
+        """
+        Steps that the children of a dict or a list may match. A step reached in more than one way is kept once.
+
+        Returns: steps for any child and the steps for the children with a specific key or index
+
+        """
+        following = set()
+        specific = dict()
+        for n in states:
+            if n == len(self.steps):
+                continue
+            op, arg = self.steps[n]
+            if op == self.DESCEND:
+                following.update(self.closures[n])
+            elif (op == self.ANY_KEY and is_dict) or (op == self.ANY_INDEX and not is_dict):
+                following.update(self.closures[n + 1])
+            elif (op == self.KEY and is_dict) or (op == self.INDEX and not is_dict):
+                specific.setdefault(arg, set()).update(self.closures[n + 1])
+        keyed = {k: tuple(sorted(following | v)) for k, v in specific.items()}
+        return tuple(sorted(following)), keyed
+
+
+def _key_path(path: str, key: str):
+    return path + '.' + key if path else key
+
+
+def _children(node: any, path: str, with_path: bool):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            yield k, v, _key_path(path, k) if with_path else None
+    elif isinstance(node, list):
+        for i, v in enumerate(node):
+            yield i, v, f'{path}[{i}]' if with_path else None
+
+
+@functools.lru_cache(maxsize=MultiLevelDict.PATH_CACHE_SIZE)
+def _compile_query(pattern: str) -> CompositeQuery:
+    return CompositeQuery(pattern)
+
+
+@functools.lru_cache(maxsize=MultiLevelDict.PATH_CACHE_SIZE)
+def _compile_path(path: str) -> CompositePath:
+    return CompositePath(path)
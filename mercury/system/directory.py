@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+import time
+
+
+class RouteDirectory:
+    """
+    Local cache of remote routes.
+
+    When the language connector sends the route list and add/remove notifications, the directory is
+    authoritative and answers every lookup. Otherwise, results of service queries are cached for a
+    limited time so that a missing route is not queried again and again.
+    """
+
+    def __init__(self, ttl: float = 5.0):
+        if not isinstance(ttl, (int, float)) or ttl < 0:
+            raise ValueError('ttl must be a non-negative number')
+        self.ttl = ttl
+        self._routes = set()
+        self._authoritative = False
+        # route -> (found, expiry time) for results of service queries
+        self._cache = dict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def is_authoritative(self):
+        return self._authoritative
+
+    def load(self, routes: list):
+        with self._lock:
+            self._routes = set(routes)
+            self._authoritative = True
+            self._cache = dict()
+
+    def add(self, route: str):
+        with self._lock:
+            self._routes.add(route)
+            self._cache.pop(route, None)
+
+    def remove(self, route: str):
+        with self._lock:
+            self._routes.discard(route)
+            self._cache.pop(route, None)
+
+    def reset(self):
+        with self._lock:
+            self._routes = set()
+            self._authoritative = False
+            self._cache = dict()
+
+    def lookup(self, route: str):
+        """
+        Check if a remote route exists without a network round trip
+
+        Args:
+            route: route name
+
+        Returns: True or False when known, None when a service query is required
+
+        """
+        if self._authoritative:
+            self._hits += 1
+            return route in self._routes
+        entry = self._cache.get(route)
+        if entry is not None and entry[1] > time.time():
+            self._hits += 1
+            return entry[0]
+        self._misses += 1
+        return None
+
+    def update(self, route: str, found: bool):
+        # remember the result of a service query for the TTL period
+        if self.ttl > 0:
+            with self._lock:
+                now = time.time()
+                if len(self._cache) > 10000:
+                    self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+                self._cache[route] = (found, now + self.ttl)
+
+    def get_stats(self):
+        return {'authoritative': self._authoritative, 'routes': len(self._routes), 'cached': len(self._cache),
+                'hits': self._hits, 'misses': self._misses}
@@ -17,38 +17,163 @@
 #
 
 import io
+import lzma
 import os
-import msgpack
+import time
+import zlib
+from collections import deque
 
+from mercury.system import codec
 from mercury.system.utility import Utility
 
 
+class SegmentPool:
+    """
+    Keep consumed segment files of an elastic queue for reuse so that a queue under sustained
+    overload does not create and delete a file for every segment.
+    """
+    POOL = 'pool-'
+
+    def __init__(self, pool_dir: str, max_segments: int = 0, max_bytes: int = 0, preallocate: bool = False,
+                 segment_size: int = 0):
+        if not isinstance(max_segments, int) or max_segments < 0:
+            raise ValueError('max_segments must be int and not negative')
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise ValueError('max_bytes must be int and not negative')
+        self.util = Utility()
+        self._dir = pool_dir
+        self._max_segments = max_segments
+        self._max_bytes = max_bytes
+        # posix_fallocate is not available on some platforms
+        self._preallocate = preallocate and hasattr(os, 'posix_fallocate')
+        self._segment_size = segment_size
+        self._segments = list()
+        self._pool_bytes = 0
+        self._seq = 0
+        self._created = 0
+        self._recycled = 0
+
+    def acquire(self, filename: str):
+        """
+        Provide a segment file, recycling a pooled one if available.
+        The content of a recycled segment is stale and must be overwritten from the beginning.
+
+        Args:
+            filename: path of the new segment
+
+        Returns: None
+
+        """
+        if self._segments:
+            pooled, size = self._segments.pop(0)
+            self._pool_bytes -= size
+            os.rename(pooled, filename)
+            self._recycled += 1
+        else:
+            with open(filename, 'wb') as f:
+                if self._preallocate:
+                    os.posix_fallocate(f.fileno(), 0, self._segment_size)
+            self._created += 1
+
+    def release(self, filename: str):
+        """
+        Return a consumed segment file to the pool or delete it when the pool is full
+
+        Args:
+            filename: path of the consumed segment
+
+        Returns: None
+
+        """
+        size = os.path.getsize(filename)
+        if len(self._segments) < self._max_segments and self._pool_bytes + size <= self._max_bytes:
+            self._seq += 1
+            pooled = self.util.normalize_path(f'{self._dir}/{self.POOL}{self._seq}')
+            os.rename(filename, pooled)
+            self._segments.append((pooled, size))
+            self._pool_bytes += size
+        else:
+            os.remove(filename)
+
+    def clear(self):
+        for pooled, _ in self._segments:
+            if os.path.exists(pooled):
+                os.remove(pooled)
+        self._segments = list()
+        self._pool_bytes = 0
+
+    def get_stats(self):
+        return {'pooled': len(self._segments), 'pooled_bytes': self._pool_bytes,
+                'created': self._created, 'recycled': self._recycled}
+
+
 class ElasticQueue:
 
     DATA = b'\x01'
+    BLOCK = b'\x02'
     EOF = b'\x00'
     QUEUE = "data-"
     MEMORY_BUFFER = 10
     MAX_FILE_SIZE = 10 * 1024 * 1024
+    # a compressed block is flushed when it reaches either limit
+    BLOCK_RECORDS = 100
+    BLOCK_BYTES = 64 * 1024
+    READ_AHEAD = 64 * 1024
+    COMPRESSION = ('zlib', 'lzma')
 
-    def __init__(self, queue_dir: str = None, queue_id: str = None):
+    def __init__(self, queue_dir: str = None, queue_id: str = None,
+                 compression: str = None, compression_level: int = 6, block_records: int = BLOCK_RECORDS,
+                 pool_segments: int = 0, pool_bytes: int = 0, preallocate: bool = False):
         # automatically create queue directory
         if queue_dir is None or queue_id is None:
             raise ValueError('Missing queue_dir or queue_id')
+        if compression is not None and compression not in self.COMPRESSION:
+            raise ValueError(f'compression must be one of {self.COMPRESSION}')
+        if not isinstance(compression_level, int) or not 0 <= compression_level <= 9:
+            raise ValueError('compression_level must be int from 0 to 9')
+        if not isinstance(block_records, int) or block_records < 1:
+            raise ValueError('block_records must be a positive int')
         self.queue_id = queue_id
         if not os.path.exists(queue_dir):
             os.makedirs(queue_dir, exist_ok=True)
         self.util = Utility()
         self._dir = self.util.normalize_path(f'{queue_dir}/{queue_id}')
+        self._compression = compression
+        self._level = compression_level
+        self._block_records = block_records
         self._empty = False
         self._create_dir = False
         self._memory = list()
+        self._memory_time = list()
         self._read_file_no = 1
         self._write_file_no = 1
         self._read_counter = 0
         self._write_counter = 0
+        # first write time and bytes written for each segment - file_no -> value
+        self._segment_time = dict()
+        self._segment_size = dict()
         self._file = None
+        # read-ahead buffer of the current segment and the file position at the end of the buffer
+        self._read_buffer = b''
+        self._read_pos = 0
+        self._read_offset = 0
+        self._writer = None
+        self._write_size = 0
         self._peeked = None
+        self._pool = SegmentPool(self._dir, pool_segments, pool_bytes, preallocate, self.MAX_FILE_SIZE)
+        # records waiting to be compressed into the next block
+        self._pending = list()
+        self._pending_bytes = 0
+        # records decompressed from the current block
+        self._unpacked = deque()
+        self._raw_bytes = 0
+        self._disk_bytes = 0
+        self._spilled_records = 0
+        self._blocks = 0
+        self._write_seconds = 0.0
+        # remove segments left behind by a previous run
+        if os.path.exists(self._dir):
+            self.util.cleanup_dir(self._dir, clear_dir=False)
         self.initialize()
 
     def get_id(self):
@@ -58,20 +183,32 @@ class ElasticQueue:
         if not self._empty:
             self._empty = True
             if os.path.exists(self._dir):
-                self.util.cleanup_dir(self._dir, clear_dir=False)
+                # recycle segments instead of deleting them
+                for f in os.listdir(self._dir):
+                    if f.startswith(self.QUEUE):
+                        self._pool.release(self.util.normalize_path(f'{self._dir}/{f}'))
                 self._create_dir = False
             else:
                 self._create_dir = True
             self._memory = list()
+            self._memory_time = list()
             self._read_file_no = 1
             self._write_file_no = 1
             self._read_counter = 0
             self._write_counter = 0
+            self._segment_time = dict()
+            self._segment_size = dict()
+            self._pending = list()
+            self._pending_bytes = 0
+            self._unpacked = deque()
 
     def close(self):
         if self._file is not None:
             self._file.close()
             self._file = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
         self.initialize()
 
     def is_closed(self):
@@ -80,35 +217,125 @@ class ElasticQueue:
     def destroy(self):
         self.close()
         if self.is_closed():
+            self._pool.clear()
             self.util.cleanup_dir(self._dir)
 
+    def size(self):
+        # number of events waiting to be read
+        return self._write_counter - self._read_counter + (0 if self._peeked is None else 1)
+
+    def get_stats(self):
+        """
+        Get a snapshot of the backlog in this queue.
+        Age of an event on disk is estimated from the time its segment received the first event.
+
+        Returns: dict of in-memory count, spilled count and bytes, number of segments and oldest event age
+
+        """
+        spilled = max(0, self._write_counter - self.MEMORY_BUFFER) - max(0, self._read_counter - self.MEMORY_BUFFER)
+        spilled_bytes = sum(self._segment_size.values()) + self._pending_bytes
+        if self._file is not None:
+            spilled_bytes -= self._read_offset - (len(self._read_buffer) - self._read_pos)
+        if self._memory_time:
+            oldest = self._memory_time[0]
+        elif self._segment_time and spilled > 0:
+            oldest = self._segment_time[min(self._segment_time)]
+        else:
+            oldest = None
+        return {'memory': len(self._memory) + (0 if self._peeked is None else 1),
+                'spilled': spilled, 'spilled_bytes': max(0, spilled_bytes),
+                'segments': len(self._segment_size),
+                'oldest_age': 0.0 if oldest is None else round(time.time() - oldest, 3)}
+
+    def get_pool_stats(self):
+        return self._pool.get_stats()
+
+    def get_spill_metrics(self):
+        """
+        Get cumulative statistics of events spilled to disk
+
+        Returns: dict of compression ratio and spill bandwidth in bytes per second
+
+        """
+        return {'compression': 'none' if self._compression is None else self._compression,
+                'records': self._spilled_records, 'blocks': self._blocks,
+                'raw_bytes': self._raw_bytes, 'disk_bytes': self._disk_bytes,
+                'ratio': round(self._raw_bytes / self._disk_bytes, 3) if self._disk_bytes > 0 else 1.0,
+                'bandwidth': int(self._raw_bytes / self._write_seconds) if self._write_seconds > 0 else 0}
+
+    def _get_filename(self, file_no: int):
+        return self.util.normalize_path(f'{self._dir}/{self.QUEUE}{file_no}')
+
+    def _spill(self, ctl: bytes, header: bytes, block: bytes):
+        if self._writer is None:
+            if self._create_dir:
+                self._create_dir = False
+                os.makedirs(self._dir)
+            filename = self._get_filename(self._write_file_no)
+            self._pool.acquire(filename)
+            # a segment may be preallocated or recycled so data is written from the beginning
+            self._writer = open(filename, 'r+b')
+            self._write_size = 0
+        buffer = io.BytesIO()
+        buffer.write(ctl)
+        buffer.write(header)
+        buffer.write(block)
+        self._write_size += buffer.tell()
+        rollover = self._write_size > self.MAX_FILE_SIZE
+        if rollover:
+            buffer.write(self.EOF)
+            self._write_size += 1
+        # the reader must not go beyond this size because a preallocated or recycled segment has stale content
+        self._segment_size[self._write_file_no] = self._write_size
+        self._writer.write(buffer.getvalue())
+        if rollover:
+            self._writer.close()
+            self._writer = None
+            self._write_file_no += 1
+        else:
+            # make the data visible to the reader
+            self._writer.flush()
+        self._disk_bytes += len(block)
+
+    def _flush_block(self):
+        begin = time.perf_counter()
+        raw = b''.join(self._pending)
+        if self._compression == 'zlib':
+            block = zlib.compress(raw, self._level)
+        else:
+            block = lzma.compress(raw, preset=self._level)
+        header = self.util.int_to_bytes(len(block)) + self.util.int_to_bytes(len(self._pending))
+        self._spill(self.BLOCK, header, block)
+        self._blocks += 1
+        self._pending = list()
+        self._pending_bytes = 0
+        self._write_seconds += time.perf_counter() - begin
+
     async def write(self, data: dict):
         if self._write_counter < self.MEMORY_BUFFER:
             self._memory.append(data)
+            self._memory_time.append(time.time())
             self._write_counter += 1
             self._empty = False
         else:
-            if self._create_dir:
-                self._create_dir = False
-                os.makedirs(self._dir)
-            filename = self.util.normalize_path(f'{self._dir}/{self.QUEUE}{self._write_file_no}')
-            if not os.path.exists(filename):
-                open(filename, 'w').close()
+            if self._write_file_no not in self._segment_time:
+                self._segment_time[self._write_file_no] = time.time()
+            begin = time.perf_counter()
             # pack data as bytes
-            block = msgpack.packb(data, use_bin_type=True)
-            file_size = os.path.getsize(filename)
-            with open(filename, 'ab') as f:
-                buffer = io.BytesIO()
-                buffer.write(self.DATA)
-                buffer.write(self.util.int_to_bytes(len(block)))
-                buffer.write(block)
-                file_size += len(block)
-                if file_size > self.MAX_FILE_SIZE:
-                    buffer.write(self.EOF)
-                    self._write_file_no += 1
-                f.write(buffer.getvalue())
-                self._write_counter += 1
-                self._empty = False
+            block = codec.pack(data)
+            self._raw_bytes += len(block)
+            self._spilled_records += 1
+            if self._compression is None:
+                self._spill(self.DATA, self.util.int_to_bytes(len(block)), block)
+                self._write_seconds += time.perf_counter() - begin
+            else:
+                self._pending.append(block)
+                self._pending_bytes += len(block)
+                self._write_seconds += time.perf_counter() - begin
+                if len(self._pending) >= self._block_records or self._pending_bytes >= self.BLOCK_BYTES:
+                    self._flush_block()
+            self._write_counter += 1
+            self._empty = False
 
     def peek(self):
         if self._peeked is not None:
@@ -127,35 +354,127 @@ class ElasticQueue:
             return None
         if self._read_counter < self.MEMORY_BUFFER:
             data = self._memory.pop(0)
+            self._memory_time.pop(0)
             if data is not None:
                 self._read_counter += 1
             return data
-        filename = self.util.normalize_path(f'{self._dir}/{self.QUEUE}{self._read_file_no}')
+        if self._unpacked:
+            self._read_counter += 1
+            return self._unpacked.popleft()
+        if self._pending:
+            # make records of the incomplete block visible to the reader
+            self._flush_block()
+        ctl = self._next_control()
+        if ctl is None:
+            return None
+        if ctl == self.BLOCK:
+            block_size, records = self._read_block_header()
+            self._unpacked.extend(self._decode_block(self._read_bytes(block_size), records))
+            self._read_counter += 1
+            return self._unpacked.popleft()
+        block = self._read_bytes(self.util.bytes_to_int(self._read_bytes(4)))
+        self._read_counter += 1
+        # unpack from bytes into the original data
+        return codec.unpack(block)
+
+    def skip(self, count: int):
+        """
+        Discard the oldest events without deserializing them.
+        A compressed block is skipped as a whole using the record count in its header.
+
+        Args:
+            count: maximum number of events to discard
+
+        Returns: number of events discarded
+
+        """
+        skipped = 0
+        if self._peeked is not None and count > 0:
+            self._peeked = None
+            skipped += 1
+        while skipped < count and self._read_counter < self._write_counter:
+            if self._read_counter < self.MEMORY_BUFFER or self._unpacked:
+                self.read()
+                skipped += 1
+                continue
+            if self._pending:
+                self._flush_block()
+            ctl = self._next_control()
+            if ctl is None:
+                break
+            if ctl == self.BLOCK:
+                block_size, records = self._read_block_header()
+                if records <= count - skipped:
+                    self._skip_bytes(block_size)
+                    self._read_counter += records
+                    skipped += records
+                else:
+                    self._unpacked.extend(self._decode_block(self._read_bytes(block_size), records))
+            else:
+                self._skip_bytes(self.util.bytes_to_int(self._read_bytes(4)))
+                self._read_counter += 1
+                skipped += 1
+        if self._read_counter >= self._write_counter and self._peeked is None:
+            self.close()
+        return skipped
+
+    def _next_control(self):
+        filename = self._get_filename(self._read_file_no)
         if self._file is None:
             if not os.path.exists(filename):
                 return None
-            self._file = open(filename, 'rb')
+            self._file = open(filename, 'rb', buffering=0)
+            self._read_buffer = b''
+            self._read_pos = 0
+            self._read_offset = 0
         # read control indicator
-        ctl = self._file.read(1)
-        if ctl is None:
-            return None
+        ctl = self._read_bytes(1)
         if ctl == self.EOF:
             # EOF - drop file and increment read sequence
             self._file.close()
             self._file = None
-            os.remove(filename)
+            self._pool.release(filename)
+            self._segment_time.pop(self._read_file_no, None)
+            self._segment_size.pop(self._read_file_no, None)
             self._read_file_no += 1
-            return self.read()
-        if ctl != self.DATA:
+            return self._next_control()
+        if ctl != self.DATA and ctl != self.BLOCK:
             raise ValueError(f'Corrupted queue for {self.queue_id}')
-        # read data block size
-        size = self._file.read(4)
-        if size is None or len(size) != 4:
-            raise ValueError(f'Corrupted queue for {self.queue_id}')
-        block_size = self.util.bytes_to_int(size)
-        block = self._file.read(block_size)
-        if block is None or len(block) != block_size:
+        return ctl
+
+    def _read_bytes(self, size: int):
+        available = len(self._read_buffer) - self._read_pos
+        if available < size:
+            # read ahead but never beyond the data written to this segment
+            limit = self._segment_size.get(self._read_file_no, 0) - self._read_offset
+            data = self._file.read(min(max(size - available, self.READ_AHEAD), limit)) if limit > 0 else b''
+            self._read_buffer = self._read_buffer[self._read_pos:] + data
+            self._read_pos = 0
+            self._read_offset += len(data)
+            if len(self._read_buffer) < size:
+                raise ValueError(f'Corrupted queue for {self.queue_id}')
+        result = self._read_buffer[self._read_pos: self._read_pos + size]
+        self._read_pos += size
+        return result
+
+    def _skip_bytes(self, size: int):
+        available = len(self._read_buffer) - self._read_pos
+        if size <= available:
+            self._read_pos += size
+        else:
+            self._read_offset += size - available
+            self._file.seek(self._read_offset)
+            self._read_buffer = b''
+            self._read_pos = 0
+
+    def _read_block_header(self):
+        # block header is compressed size followed by number of records
+        header = self._read_bytes(8)
+        return self.util.bytes_to_int(header[0:4]), self.util.bytes_to_int(header[4:8])
+
+    def _decode_block(self, block: bytes, records: int):
+        raw = zlib.decompress(block) if self._compression == 'zlib' else lzma.decompress(block)
+        result = codec.unpack_all(raw)
+        if len(result) != records:
             raise ValueError(f'Corrupted queue for {self.queue_id}')
-        self._read_counter += 1
-        # unpack from bytes into the original data
-        return msgpack.unpackb(block, raw=False)
+        return result
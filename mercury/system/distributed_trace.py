@@ -23,25 +23,34 @@ from mercury.system.models import EventEnvelope
 
 class DistributedTrace:
 
+    # a remote trace processor is looked up at most once in this interval
+    CHECK_INTERVAL = 5.0
+
     def __init__(self, platform, dt_processor):
         self.platform = platform
         self.log = platform.log
         self._dt_processor = dt_processor
-        self._dt_last_check = None
-        self._dt_found = False
+        self._found = False
+        self._checked = None
 
     def logger(self, event: EventEnvelope):
         if isinstance(event, EventEnvelope):
             self.log.info(f'trace={event.get_headers()}, annotations={event.get_body()}')
             if self.platform.is_trace_supported():
                 # forward to user provided distributed trace logger if any
-                current_time = time.time()
-                if self._dt_last_check is None or current_time - self._dt_last_check > 5.0:
-                    self._dt_last_check = current_time
-                    self._dt_found = self.platform.exists(self._dt_processor)
-                if self._dt_found:
+                if self._processor_exists():
                     trace_event = EventEnvelope()
                     trace_event.set_to(self._dt_processor).set_body({'annotations': event.get_body()})
                     for h in event.get_headers():
                         trace_event.set_header(h, event.get_header(h))
                     self.platform.send_event(trace_event)
+
+    def _processor_exists(self):
+        if self.platform.has_route(self._dt_processor):
+            return True
+        # the result is kept because the lookup may be a network round trip when the route is not known
+        now = time.time()
+        if self._checked is None or now - self._checked >= self.CHECK_INTERVAL:
+            self._checked = now
+            self._found = self.platform.exists(self._dt_processor)
+        return self._found
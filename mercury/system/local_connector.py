@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import zlib
+import msgpack
+from collections import deque
+from aiohttp import web, WSMsgType
+
+from mercury.system.reassembly import PayloadAssembler
+
+
+class LanguageConnection:
+    """
+    A websocket session from a language pack application
+    """
+
+    def __init__(self, ws, origin: str):
+        self.ws = ws
+        self.origin = origin
+        self.routes = set()
+        self.features = list()
+        self.authenticated = False
+        self.ready = False
+        self.queue = asyncio.Queue()
+        # credit granted by the application and None means unlimited
+        self.send_credit = None
+        self.credit_available = asyncio.Event()
+        self.consumed = 0
+        self.grant_pending = False
+
+
+class LocalConnector:
+    """
+    Stand-in language connector for testing and benchmarking without the Java sidecar.
+
+    It speaks the websocket/msgpack protocol of the language connector: login, system.config and ready,
+    route add/remove, event relay with block segmentation, batch frames and zlib compression.
+    Events are relayed without decoding their msgpack extension types, so it accepts the ext feature.
+    It also provides in-memory versions of system.service.query, pub.sub.controller and object.streams.io.
+    """
+
+    SERVICE_QUERY = 'system.service.query'
+    PUB_SUB = 'pub.sub.controller'
+    STREAM_IO = 'object.streams.io'
+    SERVER_CONFIG = 'system.config'
+    FEATURES = ('batch', 'zlib', 'routes', 'bulk', 'credit', 'ext')
+    MSG_ID = '_id_'
+    COUNT = '_blk_'
+    TOTAL = '_max_'
+    ZIP_TAG = '_zip_'
+    COMPRESSION_THRESHOLD = 1024
+    # a batch frame adds a map and array header to the frame and a binary header to each item
+    BATCH_HEADER_BYTES = 32
+    BATCH_ITEM_BYTES = 5
+    # credits are withheld from a sender while a receiving session has more frames than this waiting
+    MAX_QUEUE = 1000
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8090, path: str = '/ws/lang',
+                 max_payload: int = 32768, features: tuple = FEATURES, api_key: str = None,
+                 credit_window: int = 1024 * 1024):
+        if not isinstance(port, int):
+            raise ValueError('port must be int')
+        if not isinstance(max_payload, int) or max_payload < 1024:
+            raise ValueError('max_payload must be int of at least 1024')
+        self.log = logging.getLogger()
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_payload = max_payload
+        self.features = list(features)
+        self.api_key = api_key
+        self.credit_window = credit_window
+        self.assembler = PayloadAssembler(self.log)
+        self.connections = list()
+        # private reply routes (e.g. RPC inbox) are delivered to the session that made the request
+        self._reply_routes = dict()
+        self._next = dict()
+        self._topics = dict()
+        self._streams = dict()
+        self._stats = {'frames_in': 0, 'frames_out': 0, 'events': 0, 'blocks': 0, 'dropped': 0}
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    def get_url(self):
+        return f'ws://{self.host}:{self.port}{self.path}'
+
+    def get_stats(self):
+        result = dict(self._stats)
+        result['connections'] = len(self.connections)
+        result['routes'] = len(self._route_table())
+        return result
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(self.path + '/{origin}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.log.info(f'Local language connector started at {self.get_url()}')
+
+    async def stop(self):
+        for conn in list(self.connections):
+            await conn.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self):
+        """
+        Run the stand-in in a background thread with its own event loop
+
+        Returns: None
+
+        """
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not ready.wait(10.0):
+            raise RuntimeError('Unable to start local language connector')
+
+    def stop_thread(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10.0)
+            self._thread = None
+
+    def disconnect(self, origin: str, limit: int = None):
+        """
+        Close the websocket sessions of an application. This can be called from any thread.
+
+        Args:
+            origin: origin ID of the application
+            limit: maximum number of sessions to close or None for all
+
+        Returns: number of sessions closed
+
+        """
+        async def close():
+            targets = [c for c in self.connections if c.origin == origin][:limit]
+            for conn in targets:
+                await conn.ws.close()
+            return len(targets)
+
+        return asyncio.run_coroutine_threadsafe(close(), self._loop).result(10.0)
+
+    def _route_table(self):
+        result = dict()
+        for conn in self.connections:
+            if conn.ready:
+                for r in conn.routes:
+                    result.setdefault(r, []).append(conn)
+        return result
+
+    def _find(self, route: str):
+        return [c for c in self.connections if c.ready and route in c.routes]
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        conn = LanguageConnection(ws, request.match_info['origin'])
+        self.connections.append(conn)
+        writer = asyncio.get_running_loop().create_task(self._writer(conn))
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.BINARY:
+                    self._stats['frames_in'] += 1
+                    try:
+                        self._incoming(conn, msg.data)
+                    except Exception as e:
+                        self.log.error(f'Unable to process frame from {conn.origin} - {e}')
+                    if 'credit' in conn.features:
+                        conn.consumed += len(msg.data)
+                        if conn.consumed >= self.credit_window // 4 and not conn.grant_pending:
+                            self._grant(conn)
+        finally:
+            writer.cancel()
+            self.connections.remove(conn)
+            if conn.ready:
+                for route in conn.routes:
+                    if not self._find(route):
+                        self._notify('remove', route)
+            for route in [k for k, v in self._reply_routes.items() if v is conn]:
+                self._reply_routes.pop(route)
+            for topic in self._topics.values():
+                topic['subscribers'] = [s for s in topic['subscribers'] if s[1] is not conn]
+        return ws
+
+    async def _writer(self, conn: LanguageConnection):
+        carry = None
+        while True:
+            frame = await conn.queue.get() if carry is None else carry
+            carry = None
+            if 'batch' in conn.features:
+                batch = [frame]
+                size = self.BATCH_HEADER_BYTES + self.BATCH_ITEM_BYTES + len(frame)
+                while not conn.queue.empty():
+                    item = conn.queue.get_nowait()
+                    if size + self.BATCH_ITEM_BYTES + len(item) > self.max_payload:
+                        carry = item
+                        break
+                    batch.append(item)
+                    size += self.BATCH_ITEM_BYTES + len(item)
+                if len(batch) > 1:
+                    frame = msgpack.packb({'type': 'batch', 'batch': batch}, use_bin_type=True)
+            try:
+                if conn.send_credit is not None:
+                    while conn.send_credit <= 0:
+                        conn.credit_available.clear()
+                        await conn.credit_available.wait()
+                    conn.send_credit -= len(frame)
+                await conn.ws.send_bytes(frame)
+                self._stats['frames_out'] += 1
+            except ConnectionError:
+                self._stats['dropped'] += 1
+
+    def _incoming(self, conn: LanguageConnection, data: bytes):
+        message = msgpack.unpackb(data, raw=False)
+        msg_type = message.get('type')
+        if msg_type == 'batch':
+            for item in message.get('batch', []):
+                self._incoming(conn, item)
+        elif msg_type == 'login':
+            self._login(conn, message)
+        elif msg_type == 'credit' and 'credit' in conn.features:
+            conn.send_credit = message['credit'] + (0 if conn.send_credit is None else conn.send_credit)
+            if conn.send_credit > 0:
+                conn.credit_available.set()
+        elif not conn.authenticated:
+            self.log.warn(f'Message from {conn.origin} ignored because it is not authenticated')
+        elif msg_type == 'add':
+            # a bulk advertisement carries a list of routes
+            for route in message['routes'] if 'routes' in message else [message['route']]:
+                if conn.ready and not self._find(route):
+                    self._notify('add', route)
+                conn.routes.add(route)
+        elif msg_type == 'remove':
+            for route in message['routes'] if 'routes' in message else [message['route']]:
+                conn.routes.discard(route)
+                self._reply_routes.pop(route, None)
+                if conn.ready and not self._find(route):
+                    self._notify('remove', route)
+        elif msg_type == 'ready':
+            added = [r for r in conn.routes if not self._find(r)]
+            conn.ready = True
+            self._deliver(conn, {'to': self.SERVER_CONFIG, 'headers': {'type': 'ready'}, 'id': self._new_id()})
+            if 'routes' in conn.features:
+                self._control(conn, {'type': 'routes', 'routes': list(self._route_table().keys())})
+            for route in added:
+                self._notify('add', route, conn)
+        elif msg_type == 'block':
+            block = message['block']
+            headers = block['headers']
+            self._stats['blocks'] += 1
+            self.assembler.expire()
+            payload = self.assembler.add(headers[self.MSG_ID], int(headers[self.COUNT]), int(headers[self.TOTAL]),
+                                         self.max_payload, block['body'])
+            if payload is not None:
+                self._relay(conn, self._unpack(payload, self.ZIP_TAG in headers))
+        elif msg_type == 'event':
+            self._relay(conn, self._unpack(message['event'], 'zip' in message))
+
+    def _login(self, conn: LanguageConnection, message: dict):
+        if self.api_key is not None and message.get('api_key') != self.api_key:
+            self.log.warn(f'Login from {conn.origin} rejected')
+            asyncio.get_running_loop().create_task(conn.ws.close(code=1008, message=b'Unauthorized'))
+            return
+        conn.authenticated = True
+        offered = message.get('features', [])
+        conn.features = [f for f in offered if f in self.features] if isinstance(offered, list) else []
+        config = {'max.payload': self.max_payload, 'trace.aggregation': False, 'features': conn.features}
+        if 'credit' in conn.features:
+            config['credit'] = self.credit_window
+        self._deliver(conn, {'to': self.SERVER_CONFIG, 'headers': {'type': 'system.config'}, 'body': config,
+                             'id': self._new_id()})
+
+    def _grant(self, conn: LanguageConnection):
+        # return credit to a sender unless the receiving sessions are falling behind
+        conn.grant_pending = False
+        if conn not in self.connections or conn.consumed == 0:
+            return
+        if any(c.queue.qsize() > self.MAX_QUEUE for c in self.connections):
+            conn.grant_pending = True
+            asyncio.get_running_loop().call_later(0.05, self._grant, conn)
+        else:
+            payload = msgpack.packb({'type': 'credit', 'credit': conn.consumed}, use_bin_type=True)
+            conn.consumed = 0
+            asyncio.get_running_loop().create_task(conn.ws.send_bytes(payload))
+
+    def _control(self, conn: LanguageConnection, message: dict):
+        conn.queue.put_nowait(msgpack.packb(message, use_bin_type=True))
+
+    def _notify(self, change: str, route: str, exclude: LanguageConnection = None):
+        # tell applications that keep a route directory about a route change
+        for conn in self.connections:
+            if conn.ready and conn is not exclude and 'routes' in conn.features:
+                self._control(conn, {'type': change, 'route': route})
+
+    @staticmethod
+    def _unpack(payload: any, zipped: bool):
+        return msgpack.unpackb(zlib.decompress(payload) if zipped else payload, raw=False)
+
+    @staticmethod
+    def _new_id():
+        return ''.join(str(uuid.uuid4()).split('-'))
+
+    def _relay(self, conn: LanguageConnection, event: dict):
+        self._stats['events'] += 1
+        route = event.get('to')
+        reply_to = event.get('reply_to')
+        if isinstance(reply_to, str) and reply_to.startswith('->'):
+            self._reply_routes[reply_to[2:]] = conn
+        if route == self.SERVICE_QUERY:
+            self._reply(event, self._service_query(event))
+        elif route == self.PUB_SUB:
+            self._reply(event, self._pub_sub(conn, event))
+        elif route == self.STREAM_IO:
+            self._reply(event, self._create_stream(event))
+        elif route in self._streams:
+            self._stream_io(event)
+        elif route in self._reply_routes:
+            self._deliver(self._reply_routes[route], event)
+        else:
+            targets = self._find(route)
+            if not targets:
+                self._stats['dropped'] += 1
+                self._reply(event, (404, f'Route {route} not found'))
+            elif event.get('broadcast'):
+                for target in targets:
+                    self._deliver(target, event)
+            else:
+                # round robin among application instances with the route
+                n = self._next.get(route, 0)
+                self._next[route] = n + 1
+                self._deliver(targets[n % len(targets)], event)
+
+    def _reply(self, request: dict, result: any):
+        """
+        Send a response to the caller of a built-in service
+
+        Args:
+            request: the request event
+            result: response body or a tuple of (status, body) or (status, headers, body)
+
+        Returns: None
+
+        """
+        reply_to = request.get('reply_to')
+        if not isinstance(reply_to, str):
+            return
+        status, headers, body = 200, dict(), result
+        if isinstance(result, tuple):
+            status, headers, body = (result[0], dict(), result[1]) if len(result) == 2 else result
+        route = reply_to[2:] if reply_to.startswith('->') else reply_to
+        response = {'to': route, 'headers': headers, 'body': body, 'status': status, 'id': self._new_id()}
+        if 'cid' in request:
+            response['cid'] = request['cid']
+        if 'extra' in request:
+            response['extra'] = request['extra']
+        if status >= 400:
+            response['extra'] = 'exception'
+        target = self._reply_routes.get(route)
+        if target is not None:
+            self._deliver(target, response)
+
+    def _deliver(self, conn: LanguageConnection, event: dict):
+        payload = msgpack.packb(event, use_bin_type=True)
+        zipped = False
+        if 'zlib' in conn.features and len(payload) >= self.COMPRESSION_THRESHOLD:
+            compressed = zlib.compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                zipped = True
+        if len(payload) > self.max_payload:
+            msg_id = event.get('id', self._new_id())
+            total = (len(payload) + self.max_payload - 1) // self.max_payload
+            for i in range(total):
+                headers = {self.MSG_ID: msg_id, self.COUNT: str(i + 1), self.TOTAL: str(total)}
+                if zipped:
+                    headers[self.ZIP_TAG] = 'zlib'
+                block = {'id': msg_id, 'headers': headers,
+                         'body': payload[i * self.max_payload: (i + 1) * self.max_payload]}
+                conn.queue.put_nowait(msgpack.packb({'type': 'block', 'block': block}, use_bin_type=True))
+        else:
+            relay = {'type': 'event', 'event': payload}
+            if zipped:
+                relay['zip'] = 'zlib'
+            conn.queue.put_nowait(msgpack.packb(relay, use_bin_type=True))
+
+    def _service_query(self, event: dict):
+        headers = event.get('headers', dict())
+        if headers.get('type') == 'find':
+            route = headers.get('route')
+            table = self._route_table()
+            if route == '*' and isinstance(event.get('body'), list):
+                return all(r in table for r in event['body'])
+            return route in table
+        return 400, f'Unsupported query {headers.get("type")}'
+
+    def _pub_sub(self, conn: LanguageConnection, event: dict):
+        headers = event.get('headers', dict())
+        request = headers.get('type')
+        topic = headers.get('topic')
+        if request == 'feature':
+            return True
+        if request == 'list':
+            return list(self._topics.keys())
+        if not isinstance(topic, str):
+            return 400, 'Missing topic'
+        if request == 'exists':
+            return topic in self._topics
+        if request == 'create':
+            partition = int(headers.get('partition', -1))
+            if topic not in self._topics:
+                self._topics[topic] = {'partitions': max(1, partition), 'subscribers': []}
+            return True
+        if topic not in self._topics:
+            return 404, f'Topic {topic} not found'
+        if request == 'partition_count':
+            return self._topics[topic]['partitions']
+        if request == 'delete':
+            self._topics.pop(topic)
+            return True
+        if request == 'subscribe':
+            partition = int(headers.get('partition', -1))
+            self._topics[topic]['subscribers'].append((headers.get('route'), conn, partition))
+            return True
+        if request == 'unsubscribe':
+            route = headers.get('route')
+            subscribers = self._topics[topic]['subscribers']
+            self._topics[topic]['subscribers'] = [s for s in subscribers if not (s[0] == route and s[1] is conn)]
+            return True
+        if request == 'publish':
+            payload = event.get('body') if isinstance(event.get('body'), dict) else dict()
+            partition = int(headers.get('partition', -1))
+            for route, subscriber, p in self._topics[topic]['subscribers']:
+                if partition < 0 or p < 0 or p == partition:
+                    self._deliver(subscriber, {'to': route, 'headers': payload.get('headers') or dict(),
+                                               'body': payload.get('body'), 'id': self._new_id()})
+            return True
+        return 400, f'Unsupported request {request}'
+
+    def _create_stream(self, event: dict):
+        headers = event.get('headers', dict())
+        if headers.get('type') != 'create_stream':
+            return 400, f'Unsupported request {headers.get("type")}'
+        # headers from a language pack are str
+        expiry = int(headers.get('expiry', 1800))
+        stream_id = self._new_id()
+        stream = {'data': deque(), 'readers': deque(), 'eof': False, 'expiry': expiry, 'last': time.time(),
+                  'in': f'stream.{stream_id}.in', 'out': f'stream.{stream_id}.out'}
+        self._expire_streams()
+        self._streams[stream['in']] = stream
+        self._streams[stream['out']] = stream
+        return {'in': stream['in'], 'out': stream['out']}
+
+    def _expire_streams(self):
+        now = time.time()
+        for route in [k for k, v in self._streams.items() if now - v['last'] > v['expiry']]:
+            self._streams.pop(route)
+
+    def _stream_io(self, event: dict):
+        stream = self._streams[event['to']]
+        stream['last'] = time.time()
+        request = event.get('headers', dict()).get('type')
+        if request == 'data':
+            stream['data'].append(event.get('body'))
+        elif request == 'eof':
+            stream['eof'] = True
+        elif request == 'read':
+            stream['readers'].append(event)
+        elif request == 'close':
+            self._streams.pop(stream['in'], None)
+            self._streams.pop(stream['out'], None)
+            self._reply(event, True)
+            return
+        # pending reads are served as data arrives
+        while stream['readers'] and (stream['data'] or stream['eof']):
+            reader = stream['readers'].popleft()
+            if stream['data']:
+                self._reply(reader, (200, {'type': 'data'}, stream['data'].popleft()))
+            else:
+                self._reply(reader, (200, {'type': 'eof'}, None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local language connector for testing and benchmarking')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--max-payload', type=int, default=32768)
+    parser.add_argument('--features', default=','.join(LocalConnector.FEATURES),
+                        help='comma separated protocol features to accept, or none')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    features = () if args.features == 'none' else tuple(args.features.split(','))
+    connector = LocalConnector(host=args.host, port=args.port, max_payload=args.max_payload, features=features)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(connector.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(connector.stop())
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,9 +16,35 @@
 # limitations under the License.
 #
 
+import itertools
+import os
 import uuid
-import msgpack
 import time
+from mercury.system import codec
+
+
+class _EventIdGenerator:
+    """
+    Event IDs are a random prefix for the process and a monotonic counter
+    """
+
+    def __init__(self):
+        self.prefix = None
+        self.counter = None
+        self.reset()
+
+    def reset(self):
+        self.prefix = 'py' + uuid.uuid4().hex[0:20]
+        self.counter = itertools.count(1)
+
+    def next_id(self):
+        return self.prefix + format(next(self.counter), 'x')
+
+
+_event_ids = _EventIdGenerator()
+if hasattr(os, 'register_at_fork'):
+    # a child process must not repeat the event IDs of its parent
+    os.register_at_fork(after_in_child=_event_ids.reset)
 
 
 class AppException(Exception):
@@ -41,6 +67,10 @@ class AsyncHttpRequest:
     May also be used to create HTTP events for unit tests.
     """
 
+    __slots__ = ('method', 'query_string', 'url', 'ip', 'upload', 'headers', 'query_params', 'path_params',
+                 'cookies', 'session', 'body', 'stream_route', 'file_name', 'target_host', 'trust_all_cert',
+                 'https', 'size', 'timeout_seconds')
+
     def __init__(self, data: dict = None):
         self.method = None
         self.query_string = None
@@ -324,9 +354,12 @@ class AsyncHttpRequest:
 
 class TraceInfo:
 
+    __slots__ = ('_route', '_start_time', '_annotations', '_id', '_path')
+
     def __init__(self, route: str, trace_id: str, path: str):
         self._route = str(route)
-        self._start_time = self._get_timestamp()
+        # the timestamp is formatted when it is read
+        self._start_time = time.time()
         self._annotations = {}
         if trace_id is None:
             self._id = None
@@ -345,6 +378,8 @@ class TraceInfo:
         return self._path
 
     def get_start_time(self):
+        if isinstance(self._start_time, float):
+            self._start_time = self._get_timestamp(self._start_time)
         return self._start_time
 
     def get_annotations(self):
@@ -354,8 +389,7 @@ class TraceInfo:
         self._annotations[str(key)] = str(value)
 
     @staticmethod
-    def _get_timestamp():
-        seconds = time.time()
+    def _get_timestamp(seconds: float):
         utc = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
         ms = (str(round(seconds - int(seconds), 3)) + '000')[1:5]
         return utc + ms + 'Z'
@@ -363,15 +397,21 @@ class TraceInfo:
 
 class EventEnvelope:
 
+    __slots__ = ('event_id', 'headers', 'body', 'status', 'to', 'sender', 'reply_to', 'extra', 'tags',
+                 'correlation_id', 'trace_id', 'trace_path', 'broadcast', 'exec_time', 'round_trip')
+
     def __init__(self):
-        self.event_id = 'py'+str(uuid.uuid4()).replace('-', '')
-        self.headers = dict()
+        # event ID and headers are created when they are used
+        self.event_id = None
+        self.headers = None
         self.body = None
         self.status = None
         self.to = None
         self.sender = None
         self.reply_to = None
+        # tags are parsed from the "extra" string when they are used
         self.extra = None
+        self.tags = None
         self.correlation_id = None
         self.trace_id = None
         self.trace_path = None
@@ -387,6 +427,8 @@ class EventEnvelope:
         return self
 
     def get_event_id(self):
+        if self.event_id is None:
+            self.event_id = _event_ids.next_id()
         return self.event_id
 
     def set_to(self, to: str):
@@ -426,33 +468,39 @@ class EventEnvelope:
     def set_extra(self, extra: str):
         if isinstance(extra, str):
             self.extra = extra
+            self.tags = None
         else:
             raise ValueError('extra must be str')
         return self
 
+    def _get_tags(self):
+        if self.tags is None:
+            self.tags = extra_to_key_values(self.extra)
+            self.extra = None
+        return self.tags
+
     def add_tag(self, key: str, value: str = ''):
-        if key and isinstance(key, str) and len(key) > 0:
-            m = extra_to_key_values(self.extra)
-            m[key] = value if isinstance(value, str) else ''
-            self.extra = map_to_string(m)
+        if key and isinstance(key, str):
+            self._get_tags()[key] = value if isinstance(value, str) else ''
         return self
 
     def remove_tag(self, key: str):
-        if key and isinstance(key, str) and len(key) > 0:
-            m = extra_to_key_values(self.extra)
-            if key in m:
-                del m[key]
-            self.extra = map_to_string(m)
+        if key and isinstance(key, str) and (self.tags or self.extra):
+            self._get_tags().pop(key, None)
         return self
 
     def get_tag(self, key: str):
-        if key and isinstance(key, str) and len(key) > 0:
-            m = extra_to_key_values(self.extra)
-            return m[key] if key in m else None
+        if key and isinstance(key, str) and (self.tags or self.extra):
+            return self._get_tags().get(key)
         else:
             return None
 
+    def get_tags(self):
+        return self._get_tags()
+
     def get_extra(self):
+        if self.tags is not None:
+            return map_to_string(self.tags)
         return self.extra
 
     def set_correlation_id(self, correlation_id: str):
@@ -479,16 +527,20 @@ class EventEnvelope:
         return self
 
     def set_header(self, key: str, value: any):
+        if self.headers is None:
+            self.headers = dict()
         self.headers[key] = value if isinstance(value, str) else str(value)
         return self
 
     def get_header(self, key: str):
-        if key in self.headers:
+        if self.headers and key in self.headers:
             return self.headers[key]
         else:
             return None
 
     def get_headers(self):
+        if self.headers is None:
+            self.headers = dict()
         return self.headers
 
     def set_body(self, body: any):
@@ -526,13 +578,14 @@ class EventEnvelope:
         if self.sender:
             result['from'] = self.sender
         result['headers'] = dict() if not self.headers else self.headers
-        result['id'] = self.event_id
+        result['id'] = self.get_event_id()
         if self.body is not None:
             result['body'] = self.body
         if self.reply_to:
             result['reply_to'] = self.reply_to
-        if self.extra:
-            result['extra'] = self.extra
+        extra = self.get_extra()
+        if extra:
+            result['extra'] = extra
         if self.correlation_id:
             result['cid'] = self.correlation_id
         if self.trace_id and self.trace_path:
@@ -562,7 +615,7 @@ class EventEnvelope:
         if 'reply_to' in data and isinstance(data['reply_to'], str):
             self.reply_to = data['reply_to']
         if 'extra' in data and isinstance(data['extra'], str):
-            self.extra = data['extra']
+            self.set_extra(data['extra'])
         if 'cid' in data:
             self.correlation_id = data['cid']
         if 'trace_id' in data and 'trace_path' in data:
@@ -579,35 +632,21 @@ class EventEnvelope:
         return self
 
     def to_bytes(self):
-        return msgpack.packb(self.to_map(), use_bin_type=True)
+        return codec.pack(self.to_map())
 
     def from_bytes(self, data):
-        return self.from_map(msgpack.unpackb(data, raw=False))
+        return self.from_map(codec.unpack(data))
 
 
 def extra_to_key_values(extra: str) -> dict:
     result = dict()
-    if extra and isinstance(extra, str) and len(extra) > 0:
-        elements = [x for x in extra.split('|') if x]
-        for kv in elements:
-            if '=' in kv:
-                sep = kv.index('=')
-                k = kv[0:sep]
-                v = kv[sep+1:]
+    if extra and isinstance(extra, str):
+        for kv in extra.split('|'):
+            if kv:
+                k, _, v = kv.partition('=')
                 result[k] = v
-            else:
-                result[kv] = ''
     return result
 
 
 def map_to_string(m: dict) -> str:
-    result = ''
-    if len(m) > 0:
-        for k in m:
-            result = result + k
-            v = m[k]
-            if v and len(v) > 0:
-                result = result + '=' + v
-            result = result + '|'
-        result = result[0: len(result)-1]
-    return result
+    return '|'.join(k + '=' + v if v else k for k, v in m.items())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+
+
+class PayloadAssembler:
+    """
+    Reassemble a segmented payload in a preallocated buffer.
+    Blocks are placed by their index so that they may arrive in any order.
+    The owner calls expire() periodically to release incomplete messages.
+    """
+
+    def __init__(self, log, max_message_bytes: int = 64 * 1024 * 1024, max_total_bytes: int = 256 * 1024 * 1024,
+                 timeout_seconds: float = 30.0):
+        if not isinstance(max_message_bytes, int) or not isinstance(max_total_bytes, int):
+            raise ValueError('memory limits must be int')
+        self.log = log
+        self.max_message_bytes = max_message_bytes
+        self.max_total_bytes = max_total_bytes
+        self.timeout = timeout_seconds
+        self._messages = dict()
+        self._total_bytes = 0
+        # dropped messages are remembered until timeout so that their remaining blocks are ignored quietly
+        self._rejected = dict()
+
+    def get_allocated_bytes(self):
+        return self._total_bytes
+
+    def pending(self):
+        return len(self._messages)
+
+    def rejected(self):
+        return len(self._rejected)
+
+    def add(self, msg_id: str, count: int, total: int, block_size: int, data: bytes):
+        """
+        Place a block into the buffer of its message
+
+        Args:
+            msg_id: message ID
+            count: block number starting from 1
+            total: total number of blocks
+            block_size: size of each block except the last one
+            data: content of the block
+
+        Returns: memoryview of the complete payload or None if more blocks are expected
+
+        """
+        if msg_id in self._rejected:
+            return None
+        if count < 1 or count > total or len(data) > block_size:
+            self._drop(msg_id, f'of invalid block {count} of {total}')
+            return None
+        message = self._messages.get(msg_id)
+        if message is None:
+            capacity = total * block_size
+            if capacity > self.max_message_bytes:
+                self._drop(msg_id, f'{capacity} bytes exceeds per-message limit')
+                return None
+            if self._total_bytes + capacity > self.max_total_bytes:
+                self._drop(msg_id, 'reassembly memory limit is reached')
+                return None
+            message = {'buffer': bytearray(capacity), 'received': set(), 'total': total, 'size': capacity,
+                       'created': time.time()}
+            self._messages[msg_id] = message
+            self._total_bytes += capacity
+        elif message['total'] != total:
+            self._drop(msg_id, 'of inconsistent number of blocks')
+            return None
+        if count in message['received']:
+            return None
+        offset = (count - 1) * block_size
+        end = offset + len(data)
+        if count < total and end != offset + block_size:
+            self._drop(msg_id, f'of incomplete block {count} of {total}')
+            return None
+        message['buffer'][offset: end] = data
+        message['received'].add(count)
+        if count == total:
+            message['size'] = end
+        if len(message['received']) == total:
+            self._messages.pop(msg_id)
+            self._total_bytes -= len(message['buffer'])
+            return memoryview(message['buffer'])[0: message['size']]
+        return None
+
+    def _drop(self, msg_id: str, reason: str):
+        message = self._messages.pop(msg_id, None)
+        if message is not None:
+            self._total_bytes -= len(message['buffer'])
+        self._rejected[msg_id] = time.time()
+        self.log.warn(f'Payload {msg_id} dropped because {reason}')
+
+    def expire(self):
+        """
+        Drop messages that are not complete within the timeout
+
+        Returns: None
+
+        """
+        now = time.time()
+        expired = [k for k, v in self._messages.items() if now - v['created'] > self.timeout]
+        for msg_id in expired:
+            self._drop(msg_id, 'of timeout')
+        self._rejected = {k: v for k, v in self._rejected.items() if now - v <= self.timeout}
+
+    def clear(self):
+        self._messages = dict()
+        self._rejected = dict()
+        self._total_bytes = 0
@@ -18,7 +18,7 @@
 
 import os
 import time
-from threading import Lock
+from threading import Lock, Thread
 
 
 class Throttle:
@@ -31,12 +31,26 @@ class Throttle:
         self.transactions = list()
         self.interval = 1.0 / self.MULTIPLIER
         self.test_file = test_file
-        self.tps = self.test_file_io()
-        self.batch_size = int(self.tps / self.MULTIPLIER)
-        if log:
-            log.debug(f'Throttle evaluation batch size: {self.batch_size}')
         self.log = log
         self.lock = Lock()
+        # the rate is not regulated until the file I/O test in the background is done
+        self.tps = 0
+        self.batch_size = 0
+        self._evaluation = Thread(target=self._evaluate, daemon=True)
+        self._evaluation.start()
+
+    def _evaluate(self):
+        try:
+            tps = self.test_file_io()
+        except OSError as e:
+            if self.log:
+                self.log.error(f'Unable to evaluate file I/O performance - {e}')
+            return
+        self.tps = tps
+        self.batch_size = int(tps / self.MULTIPLIER)
+        if self.log:
+            self.log.debug(f'Throttle evaluation batch size: {self.batch_size}')
+            self.log.info(f'Estimated performance is {format(self.get_tps(), ",d")} events per second')
 
     def get_tps(self):
         # estimated TPS is max file write speed / 2
@@ -59,6 +73,8 @@ class Throttle:
         return n
 
     def regulate_rate(self, seq):
+        if self.batch_size < 1:
+            return
         self.lock.acquire()
         now = time.time()
         self.transactions.append(now)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import asyncio
+import threading
+import zlib
+from collections import deque
+
+import aiohttp
+import msgpack
+from aiohttp import WSMsgType
+
+from mercury.system.reassembly import PayloadAssembler
+
+
+class LanguagePack:
+    """
+    Minimal websocket client speaking the language connector protocol
+    """
+
+    def __init__(self, session, url: str, origin: str):
+        self.session = session
+        self.url = f'{url}/{origin}'
+        self.ws = None
+        self.config = None
+        self.blocks = 0
+        self.route_changes = list()
+        self.timeout = 5
+        self.assembler = PayloadAssembler(None)
+        self._pending = deque()
+
+    async def connect(self, routes: list, features: list = None):
+        self.ws = await self.session.ws_connect(self.url)
+        await self.send({'type': 'login', 'api_key': 'test', 'features': features or []})
+        self.config = await self.receive()
+        for r in routes:
+            await self.send({'type': 'add', 'route': r})
+        await self.send({'type': 'ready'})
+        return await self.receive()
+
+    async def send(self, message: dict):
+        await self.ws.send_bytes(msgpack.packb(message, use_bin_type=True))
+
+    async def send_event(self, event: dict):
+        await self.send({'type': 'event', 'event': msgpack.packb(event, use_bin_type=True)})
+
+    async def receive(self):
+        while True:
+            if self._pending:
+                message = self._pending.popleft()
+            else:
+                msg = await self.ws.receive(timeout=self.timeout)
+                if msg.type != WSMsgType.BINARY:
+                    raise ConnectionError(f'Websocket {msg.type.name}')
+                message = msgpack.unpackb(msg.data, raw=False)
+            if message['type'] == 'batch':
+                self._pending.extendleft(reversed([msgpack.unpackb(b, raw=False) for b in message['batch']]))
+            if message['type'] in ('routes', 'add', 'remove'):
+                self.route_changes.append(message)
+            if message['type'] == 'event':
+                payload = message['event']
+                return msgpack.unpackb(zlib.decompress(payload) if 'zip' in message else payload, raw=False)
+            if message['type'] == 'block':
+                block = message['block']
+                self.blocks += 1
+                headers = block['headers']
+                payload = self.assembler.add(headers['_id_'], int(headers['_blk_']), int(headers['_max_']),
+                                             self.config['body']['max.payload'], block['body'])
+                if payload is not None:
+                    if '_zip_' in headers:
+                        payload = zlib.decompress(payload)
+                    return msgpack.unpackb(payload, raw=False)
+
+
+class RemoteApp:
+    """
+    Language pack application in a background thread. It keeps the events it receives and
+    echoes an event that has a reply address back to the sender.
+    """
+
+    def __init__(self, url: str, origin: str, routes: list, features: list = None):
+        self.url = url
+        self.origin = origin
+        self.routes = routes
+        self.features = features
+        self.events = list()
+        self._pack = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._run())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not self._ready.wait(10.0):
+            raise RuntimeError(f'Unable to connect {self.origin}')
+        return self
+
+    async def _run(self):
+        async with aiohttp.ClientSession() as session:
+            self._pack = LanguagePack(session, self.url, self.origin)
+            await self._pack.connect(self.routes, self.features)
+            self._ready.set()
+            while True:
+                try:
+                    event = await self._pack.receive()
+                except asyncio.TimeoutError:
+                    continue
+                except ConnectionError:
+                    break
+                self.events.append(event)
+                reply_to = event.get('reply_to')
+                if reply_to:
+                    reply = {'to': reply_to[2:] if reply_to.startswith('->') else reply_to, 'status': 200,
+                             'headers': event.get('headers', dict()), 'body': event.get('body'),
+                             'id': 'r' + event['id']}
+                    if 'cid' in event:
+                        reply['cid'] = event['cid']
+                    await self._pack.send_event(reply)
+
+    def send(self, message: dict):
+        asyncio.run_coroutine_threadsafe(self._pack.send(message), self._loop).result(5.0)
+
+    def send_event(self, event: dict):
+        asyncio.run_coroutine_threadsafe(self._pack.send_event(event), self._loop).result(5.0)
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._pack.ws.close(), self._loop).result(5.0)
+            self._thread.join(5.0)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+#
+# Run a test scenario with a platform instance in a subprocess.
+#
+# Platform and NetworkConnector are singletons, so each scenario gets a new process with its own
+# configuration. A test module calls run_scenario() and the subprocess runs the module with main().
+#
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+RESULT = 'scenario result: '
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_scenario(module: str, scenario: str, config: dict = None, timeout: float = 60.0) -> dict:
+    """
+    Run a scenario function of a test module in a subprocess
+
+    Args:
+        module: test module, e.g. test.test_platform
+        scenario: name of a function that takes the platform instance and returns a JSON serializable result
+        config: composite paths and values that override the default application.yml
+        timeout: seconds
+
+    Returns: result of the scenario
+
+    """
+    from mercury.system.config_util import ConfigReader
+    from mercury.system.dict_util import MultiLevelDict
+    with tempfile.TemporaryDirectory() as folder:
+        settings = MultiLevelDict(ConfigReader().get_dict())
+        settings.set_element('work.directory', folder)
+        # a stand-in language connector of the scenario listens on a free port
+        settings.set_element('network.connector', f'ws://127.0.0.1:{get_free_port()}/ws/lang')
+        for k, v in (config or dict()).items():
+            settings.set_element(k, v)
+        filename = os.path.join(folder, 'application.json')
+        with open(filename, 'w') as f:
+            f.write(json.dumps(settings.get_dict()))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+        result = subprocess.run([sys.executable, '-m', module, scenario, filename], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=timeout)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith(RESULT):
+            return json.loads(line[len(RESULT):])
+    raise AssertionError(f'Scenario {scenario} failed with exit code {result.returncode}\n{result.stderr[-10000:]}')
+
+
+def main(scenarios: dict):
+    """
+    Run the scenario given in the command line. The process exits without a graceful shutdown of the platform.
+
+    Args:
+        scenarios: scenario name to function
+
+    Returns: None
+
+    """
+    name, filename = sys.argv[1], sys.argv[2]
+    code = 1
+    try:
+        from mercury.platform import Platform
+        result = scenarios[name](Platform(filename))
+        print(RESULT + json.dumps(result))
+        code = 0
+    except Exception:
+        traceback.print_exc()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_local_connector(platform, **kwargs):
+    """
+    Start a stand-in language connector at the network.connector address of the platform
+
+    Args:
+        platform: the platform instance of the scenario
+        **kwargs: other parameters of the LocalConnector
+
+    Returns: the LocalConnector running in a background thread
+
+    """
+    from urllib.parse import urlparse
+    from mercury.system.local_connector import LocalConnector
+    url = urlparse(platform.config.get_property('network.connector'))
+    local = LocalConnector(url.hostname, url.port, url.path, **kwargs)
+    local.start_in_thread()
+    return local
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    end = time.time() + timeout
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import datetime
+import decimal
+import unittest
+import uuid
+import msgpack
+from mercury.system import codec
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_extension_types(self):
+        data = {'time': datetime.datetime(2026, 10, 18, 12, 30, 15, 123000, tzinfo=datetime.timezone.utc),
+                'local': datetime.datetime(2026, 10, 18, 12, 30), 'amount': decimal.Decimal('12.30'),
+                'id': uuid.uuid4(), 'list': [1, 'a', b'b', None, 1.5]}
+        self.assertEqual(data, codec.unpack(codec.pack(data)))
+        with self.assertRaises(TypeError):
+            codec.pack({'x': object()})
+        # the per-thread packer is usable after an error
+        self.assertEqual({'x': 1}, codec.unpack(codec.pack({'x': 1})))
+
+    def test_portable(self):
+        data = {'time': datetime.datetime(2026, 10, 18, 12, 30, tzinfo=datetime.timezone.utc),
+                'amount': decimal.Decimal('12.30'), 'id': uuid.UUID(int=1), 'list': [1, b'b']}
+        # plain msgpack decoders get strings instead of extension types
+        self.assertEqual({'time': '2026-10-18T12:30:00+00:00', 'amount': '12.30',
+                          'id': '00000000-0000-0000-0000-000000000001', 'list': [1, b'b']},
+                         msgpack.unpackb(codec.pack(data, portable=True), raw=False))
+        with self.assertRaises(TypeError):
+            codec.pack({'x': object()}, portable=True)
+
+    def test_wrap(self):
+        for size in (10, 300, 70000):
+            payload = codec.pack({'body': 'x' * size})
+            expected = msgpack.packb({'type': 'event', 'zip': 'zlib', 'event': payload}, use_bin_type=True)
+            self.assertEqual(expected, codec.wrap({'type': 'event', 'zip': 'zlib'}, 'event', payload))
+        items = [b'a', b'b' * 300]
+        self.assertEqual({'type': 'batch', 'batch': items}, codec.unpack(codec.wrap({'type': 'batch'}, 'batch', items)))
+
+    def test_unpack_all(self):
+        values = [{'a': 1}, decimal.Decimal('1.5'), 'x']
+        self.assertEqual(values, codec.unpack_all(b''.join(codec.pack(v) for v in values)))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_ndarray(self):
+        array = numpy.arange(12, dtype=numpy.float32).reshape(3, 4)
+        restored = codec.unpack(codec.pack({'body': array}))['body']
+        self.assertEqual(array.dtype, restored.dtype)
+        self.assertTrue(numpy.array_equal(array, restored))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_ndarray_layouts(self):
+        arrays = [numpy.arange(12, dtype='>f8').reshape(3, 4).T, numpy.array(5), numpy.zeros((0, 3)),
+                  numpy.array(['2026-10-18'], dtype='datetime64[D]'), numpy.arange(6, dtype=numpy.complex64)]
+        for array in arrays:
+            restored = codec.unpack(codec.pack(array))
+            self.assertEqual((array.dtype, array.shape), (restored.dtype, restored.shape))
+            self.assertTrue(numpy.array_equal(array, restored))
+            # decoded arrays are aligned read-only views of the received buffer
+            self.assertTrue(restored.flags.aligned)
+            self.assertFalse(restored.flags.writeable)
+        with self.assertRaises(TypeError):
+            codec.pack(numpy.array([{}], dtype=object))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_ndarray_portable(self):
+        array = numpy.arange(6, dtype=numpy.int16).reshape(2, 3)
+        self.assertEqual([[0, 1, 2], [3, 4, 5]], codec.unpack(codec.pack(array, portable=True)))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_ndarray_header(self):
+        array = numpy.arange(6, dtype=numpy.float64).reshape(2, 3)
+        data = codec.pack(array)
+        peek = codec.ARRAY_HEADER_PEEK
+        try:
+            # a header beyond the first bytes is still read
+            codec.ARRAY_HEADER_PEEK = 4
+            self.assertTrue(numpy.array_equal(array, codec.unpack(data)))
+        finally:
+            codec.ARRAY_HEADER_PEEK = peek
+        ext = msgpack.unpackb(data, raw=False)
+        for invalid in (ext.data[:-1], ext.data + b'x', msgpack.packb(['<f8', [-1]]), msgpack.packb(['?', [1]]),
+                        msgpack.packb({'a': 1}), msgpack.packb(['<f8', [2]])[:3]):
+            with self.assertRaises(ValueError):
+                codec.unpack(msgpack.packb(msgpack.ExtType(codec.EXT_NDARRAY, invalid)))
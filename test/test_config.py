@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import tempfile
+import threading
+import unittest
+from mercury.system.config_util import ConfigReader
+
+CONFIG = """
+server:
+  port: 8080
+  debug: 'yes'
+rate.limit: 1.5
+hosts: 'a, b,c'
+routes:
+  - name: hello
+"""
+
+
+class TestConfigReader(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, 'application.yml')
+        with open(self.filename, 'w') as f:
+            f.write(CONFIG)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_typed_values(self):
+        config = ConfigReader(self.filename)
+        self.assertEqual({'port': 8080, 'debug': 'yes'}, config.get('server'))
+        self.assertEqual(8080, config.get('server.port'))
+        self.assertEqual('hello', config.get('routes[0].name'))
+        self.assertEqual('8080', config.get_property('server.port'))
+        self.assertEqual('none', config.get_property('server.host', 'none'))
+        self.assertEqual(9, config.get('server.missing', 9))
+        self.assertEqual(1, config.get_int('rate.limit'))
+        self.assertEqual(8080.0, config.get_float('server.port'))
+        self.assertTrue(config.get_bool('server.debug'))
+        self.assertEqual(['a', 'b', 'c'], config.get_list('hosts'))
+        self.assertEqual([{'name': 'hello'}], config.get_list('routes'))
+        self.assertEqual(2, config.get_int('missing', 2))
+        with self.assertRaises(ValueError):
+            config.get_int('hosts')
+
+    def test_environment_override(self):
+        os.environ['TEST_CONFIG_SERVER_PORT'] = '9090'
+        os.environ['TEST_CONFIG_SERVER_DEBUG'] = 'no'
+        try:
+            config = ConfigReader(self.filename, env_prefix='TEST_CONFIG_')
+            self.assertEqual(9090, config.get('server.port'))
+            self.assertEqual('no', config.get('server.debug'))
+            self.assertEqual(8080, ConfigReader(self.filename).get('server.port'))
+        finally:
+            os.environ.pop('TEST_CONFIG_SERVER_PORT')
+            os.environ.pop('TEST_CONFIG_SERVER_DEBUG')
+
+    def test_reload(self):
+        config = ConfigReader(self.filename)
+        self.assertEqual(8080, config.get_int('server.port'))
+        changes = list()
+        reloaded = threading.Event()
+
+        def on_change(keys: list):
+            changes.append(keys)
+            reloaded.set()
+
+        config.subscribe(on_change)
+        self.assertEqual([], config.reload())
+        modified = os.stat(self.filename).st_mtime_ns
+        with open(self.filename, 'w') as f:
+            f.write(CONFIG.replace('8080', '8081'))
+        # the file may be written within the same clock tick and the size is the same
+        os.utime(self.filename, ns=(modified + 10 ** 9, modified + 10 ** 9))
+        config.watch(0.05)
+        self.assertTrue(reloaded.wait(5.0))
+        config.stop_watch()
+        self.assertEqual([['server.port']], changes)
+        self.assertEqual(8081, config.get_int('server.port'))
+        with open(self.filename, 'w') as f:
+            f.write('server: [')
+        with self.assertRaises(Exception):
+            config.reload()
+        self.assertEqual(8081, config.get('server.port'))
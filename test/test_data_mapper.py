@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from mercury.system.data_mapper import DataMapper
+from mercury.system.models import AsyncHttpRequest
+
+
+class TestDataMapper(unittest.TestCase):
+
+    def test_mapping(self):
+        mapper = DataMapper(['body.user.name -> profile.name',
+                             'body.user.address.city -> profile.address.city',
+                             'body.items[1].sku -> order.second',
+                             'headers.x-trace -> trace',
+                             {'source': 'body.user.age', 'target': 'profile.age', 'type': 'int'},
+                             {'source': 'body.user.vip', 'target': 'profile.vip', 'type': 'bool', 'default': 'false'},
+                             {'source': 'body.missing', 'target': 'profile.missing'}])
+        document = {'headers': {'x-trace': 't1'},
+                    'body': {'user': {'name': 'Peter', 'age': '42', 'address': {'city': 'NYC'}},
+                             'items': [{'sku': 'a'}, {'sku': 'b'}]}}
+        expected = {'profile': {'name': 'Peter', 'address': {'city': 'NYC'}, 'age': 42, 'vip': False},
+                    'order': {'second': 'b'}, 'trace': 't1'}
+        self.assertEqual(expected, mapper.apply(document))
+        self.assertEqual([expected, {'profile': {'vip': False}}], mapper.apply_all([document, {}]))
+        with self.assertRaises(ValueError):
+            mapper.apply({'body': {'user': {'age': 'x'}}})
+
+    def test_mapping_objects(self):
+        mapper = DataMapper(['method -> request.method', 'body.id -> request.items[0].id'])
+        request = AsyncHttpRequest().set_method('POST').set_body({'id': 100})
+        self.assertEqual({'request': {'method': 'POST', 'items': [{'id': 100}]}}, mapper.apply(request))
+
+    def test_invalid_rules(self):
+        for rules in ([], ['a.b'], ['a[x] -> b'], [{'source': 'a', 'target': 'b', 'type': 'date'}],
+                      ['a -> x.y', 'b -> x'], ['a -> x', 'b -> x.y'], ['a -> x', 'b -> x']):
+            with self.assertRaises(ValueError):
+                DataMapper(rules)
+
+    def test_target_conflicts(self):
+        # a target node cannot be a list in one rule and a dict or a value in another
+        for rules in (['a -> x[0]', 'b -> x.y'], ['b -> x.y', 'a -> x[0]'], ['a -> x', 'b -> x[0]'],
+                      ['a -> x[0][1]', 'b -> x[0].y'], ['a -> x[0]', 'b -> x[0].y']):
+            with self.assertRaisesRegex(ValueError, 'conflicts with another target'):
+                DataMapper(rules)
+        mapper = DataMapper(['a -> x[1].y', 'b -> x[0][1]', 'c -> x[1].z'])
+        self.assertEqual({'x': [[None, 2], {'y': 1, 'z': 3}]}, mapper.apply({'a': 1, 'b': 2, 'c': 3}))
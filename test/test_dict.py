@@ -91,3 +91,114 @@ class TestDict(unittest.TestCase):
             has_error = True
             self.assertTrue('missing start bracket' in str(e))
         self.assertTrue(has_error)
+
+    def test_compiled_path(self):
+        path = MultiLevelDict.compile('a.b[2].c')
+        self.assertIs(path, MultiLevelDict.compile('a.b[2].c'))
+        self.assertEqual((('a', None, True), ('b', (2,), True), ('c', None, True)), path.segments)
+        mm = MultiLevelDict()
+        mm.set_element(path, 'x')
+        self.assertEqual({'a': {'b': [None, None, {'c': 'x'}]}}, mm.get_dict())
+        self.assertEqual('x', mm.get_element(path))
+        self.assertEqual('x', path.get(mm.get_dict()))
+        self.assertIsNone(mm.get_element('a.b[5].c'))
+        self.assertIsNone(mm.get_element('a.b[x].c'))
+        # a syntax error is reported when the path is used to set an element
+        invalid = MultiLevelDict.compile('a.b[x]')
+        self.assertIsNone(invalid.get(mm.get_dict()))
+        with self.assertRaises(ValueError):
+            mm.set_element(invalid, 1)
+
+    def test_normalize_map(self):
+        mm = MultiLevelDict({'app.name': 'demo', 'app': {'servers[0].port': 8080, 'servers[1]': {'port': 8081}},
+                             'list': [{'a.b': 1}, [2, {'c': 3}]], 'empty': {}})
+        mm.normalize_map()
+        self.assertEqual({'app': {'name': 'demo', 'servers': [{'port': 8080}, {'port': 8081}]},
+                          'list': [{'a': {'b': 1}}, [2, {'c': 3}]]}, mm.get_dict())
+        with self.assertRaises(ValueError):
+            MultiLevelDict({'a': {'b[x]': 1}}).normalize_map()
+
+    def test_deep_nesting(self):
+        # flattening and normalization do not use recursion
+        data = dict()
+        current = data
+        for i in range(5000):
+            current['level'] = {'value': i}
+            current = current['level']
+        mm = MultiLevelDict(data)
+        flat_map = mm.get_flat_map(data)
+        self.assertEqual(5000, len(flat_map))
+        mm.normalize_map()
+        self.assertEqual(flat_map, mm.get_flat_map(mm.get_dict()))
+
+    def test_iter_flat_items(self):
+        data = {'order': {'id': 1, 'items': [{'sku': 'a', 'qty': 2}, {'sku': 'b', 'qty': [1, 2]}]},
+                'a.b': {'c': 3}, 'customer': {'name': 'x'}}
+        mm = MultiLevelDict(data)
+        items = mm.iter_flat_items()
+        self.assertEqual(('order.id', 1), next(items))
+        self.assertEqual(mm.get_flat_map(data), dict(mm.iter_flat_items(data)))
+        self.assertEqual([('order.items[1].sku', 'b'), ('order.items[1].qty[0]', 1), ('order.items[1].qty[1]', 2)],
+                         list(mm.iter_flat_items(prefix='order/items[1]')))
+        self.assertEqual([('order.items[1].qty[1]', 2)], list(mm.iter_flat_items(prefix='order.items[1].qty[1]')))
+        self.assertEqual([('a.b.c', 3)], list(mm.iter_flat_items(prefix='a.b')))
+        self.assertEqual([], list(mm.iter_flat_items(prefix='order.item')))
+        with self.assertRaises(ValueError):
+            mm.iter_flat_items(prefix='order.items[x]')
+
+    def test_query(self):
+        data = {'order': {'items': [{'sku': 'a', 'price': 1.5}, {'sku': 'b', 'price': 2}, {'sku': 'c'}],
+                          'shipping': {'price': 5}},
+                'matrix': [[1, 2], [3, 4]]}
+        mm = MultiLevelDict(data)
+        self.assertEqual([1.5, 2], mm.find('order.items[*].price'))
+        self.assertEqual([('order.items[1].sku', 'b')], mm.find_items('order.items[1].sku'))
+        self.assertEqual([2, 4], mm.find('matrix[*][1]'))
+        self.assertEqual([{'price': 5}], mm.find('*.shipping'))
+        self.assertEqual(['a', 'b', 'c'], [x['sku'] for x in mm.find('order.*[*]')])
+        self.assertEqual([('order.items[0].price', 1.5), ('order.items[1].price', 2), ('order.shipping.price', 5)],
+                         mm.find_items('**.price'))
+        self.assertEqual(['a', 'b', 'c'], mm.find('order.**.sku'))
+        query = MultiLevelDict.compile_query('order/items[*]/sku')
+        self.assertIs(query, MultiLevelDict.compile_query('order/items[*]/sku'))
+        self.assertEqual(['a', 'b', 'c'], query.values(data))
+        self.assertEqual([], mm.find('order.items[9].sku'))
+        with self.assertRaises(ValueError):
+            mm.find('order.items[x]')
+
+    def test_query_descend(self):
+        data = {'order': {'items': [{'price': 1, 'sub': {'price': 2}}], 'price': 3, 'shipping': {'price': 4}}}
+        mm = MultiLevelDict(data)
+        # a match of a node's own key comes after the matches in earlier siblings
+        expected = [('order.items[0].price', 1), ('order.items[0].sub.price', 2), ('order.price', 3),
+                    ('order.shipping.price', 4)]
+        self.assertEqual(expected, mm.find_items('**.price'))
+        # a node that matches in more than one way is found once
+        self.assertEqual(expected, mm.find_items('order.**.**.price'))
+        self.assertEqual(expected, mm.find_items('**.**.**.price'))
+        self.assertEqual([1, 2], mm.find('order.**.items.**.price'))
+        self.assertEqual([{'price': 2}, 2], mm.find('**.sub.**'))
+
+    def test_diff_and_patch(self):
+        old = {'id': 1, 'status': 'new', 'items': [{'sku': 'a', 'qty': 1}, {'sku': 'b', 'qty': 2}, {'sku': 'c'}],
+               'meta': {'tags': ['x'], 'v': 1}, 'removed': True, 'file.name': 'a.txt'}
+        new = {'id': 1, 'status': 'paid', 'items': [{'sku': 'a', 'qty': 3}, {'sku': 'b', 'qty': 2}],
+               'meta': {'tags': ['x', 'y'], 'v': 1.0, 'extra': {'n': 1}}, 'file.name': 'b.txt'}
+        ops = MultiLevelDict.diff(old, new)
+        self.assertIn({'op': 'delete', 'path': 'removed'}, ops)
+        self.assertIn({'op': 'delete', 'path': 'items[2]'}, ops)
+        self.assertIn({'op': 'set', 'path': 'items[0].qty', 'value': 3}, ops)
+        self.assertIn({'op': 'set', 'path': 'meta.extra', 'value': {'n': 1}}, ops)
+        # a type change is a change
+        self.assertIn({'op': 'set', 'path': 'meta.v', 'value': 1.0}, ops)
+        # a key that is not a valid composite path is given separately
+        self.assertIn({'op': 'set', 'path': '', 'key': 'file.name', 'value': 'b.txt'}, ops)
+        self.assertEqual([], MultiLevelDict.diff(new, new))
+        mm = MultiLevelDict(old)
+        mm.apply_patch(ops)
+        self.assertEqual(new, old)
+        self.assertTrue(mm.remove_element('meta.tags[0]'))
+        self.assertFalse(mm.remove_element('meta.tags[5]'))
+        self.assertEqual(['y'], mm.get_element('meta.tags'))
+        with self.assertRaises(ValueError):
+            mm.apply_patch([{'op': 'move', 'path': 'id'}])
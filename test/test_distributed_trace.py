@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import time
+import unittest
+from mercury.system.distributed_trace import DistributedTrace
+from mercury.system.models import EventEnvelope
+
+PROCESSOR = 'distributed.trace.processor'
+
+
+class TracePlatform:
+    """
+    Platform stand-in with a remote trace processor
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger()
+        self.remote = False
+        self.local = False
+        self.lookups = 0
+        self.events = list()
+
+    def is_trace_supported(self):
+        return True
+
+    def has_route(self, route: str):
+        return self.local
+
+    def exists(self, route: str):
+        self.lookups += 1
+        return self.local or self.remote
+
+    def send_event(self, event: EventEnvelope):
+        self.events.append(event)
+
+
+class TestDistributedTrace(unittest.TestCase):
+
+    @staticmethod
+    def trace(n: int) -> EventEnvelope:
+        return EventEnvelope().set_header('id', str(n)).set_body({'n': n})
+
+    def test_lookup_interval(self):
+        platform = TracePlatform()
+        tracer = DistributedTrace(platform, PROCESSOR)
+        tracer.CHECK_INTERVAL = 0.2
+        for i in range(100):
+            tracer.logger(self.trace(i))
+        # a missing trace processor is looked up once in the interval
+        self.assertEqual(1, platform.lookups)
+        self.assertEqual(0, len(platform.events))
+        platform.remote = True
+        tracer.logger(self.trace(100))
+        self.assertEqual(0, len(platform.events))
+        time.sleep(0.25)
+        for i in range(101, 110):
+            tracer.logger(self.trace(i))
+        self.assertEqual(2, platform.lookups)
+        self.assertEqual(9, len(platform.events))
+        self.assertEqual(PROCESSOR, platform.events[0].get_to())
+        self.assertEqual({'annotations': {'n': 101}}, platform.events[0].get_body())
+        self.assertEqual('101', platform.events[0].get_header('id'))
+
+    def test_local_processor(self):
+        platform = TracePlatform()
+        platform.local = True
+        tracer = DistributedTrace(platform, PROCESSOR)
+        for i in range(10):
+            tracer.logger(self.trace(i))
+        self.assertEqual(0, platform.lookups)
+        self.assertEqual(10, len(platform.events))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import asyncio
+import unittest
+import aiohttp
+from mercury.system.local_connector import LocalConnector
+from test.language_pack import LanguagePack
+
+
+class TestLocalConnector(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = LocalConnector(port=18090, max_payload=2048)
+        self.connector.start_in_thread()
+
+    def tearDown(self):
+        self.connector.stop_thread()
+
+    def run_async(self, test):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(test())
+        finally:
+            loop.close()
+
+    def test_handshake_and_relay(self):
+        async def test():
+            async with aiohttp.ClientSession() as session:
+                caller = LanguagePack(session, self.connector.get_url(), 'py-caller')
+                callee = LanguagePack(session, self.connector.get_url(), 'py-callee')
+                ready = await caller.connect([], ['batch', 'unknown'])
+                self.assertEqual('ready', ready['headers']['type'])
+                self.assertEqual(['batch'], caller.config['body']['features'])
+                await callee.connect(['hello.world'])
+                # route query
+                await caller.send_event({'to': 'system.service.query', 'headers': {'type': 'find',
+                                         'route': 'hello.world'}, 'reply_to': '->r.inbox', 'cid': '1', 'id': 'a'})
+                result = await caller.receive()
+                self.assertEqual(('r.inbox', True, '1'), (result['to'], result['body'], result['cid']))
+                # a large event is segmented and the reply goes back to the caller
+                body = 'x' * 10000
+                await caller.send_event({'to': 'hello.world', 'body': body, 'reply_to': '->r.inbox', 'id': 'b'})
+                request = await callee.receive()
+                self.assertEqual(body, request['body'])
+                await callee.send_event({'to': 'r.inbox', 'body': 'done', 'id': 'c'})
+                self.assertEqual('done', (await caller.receive())['body'])
+                self.assertEqual(5, callee.blocks)
+        self.run_async(test)
+
+    def test_route_notifications(self):
+        async def test():
+            async with aiohttp.ClientSession() as session:
+                observer = LanguagePack(session, self.connector.get_url(), 'py-observer')
+                await observer.connect(['my.observer'], ['routes'])
+                provider = LanguagePack(session, self.connector.get_url(), 'py-provider')
+                await provider.connect(['hello.world'])
+                await provider.send({'type': 'remove', 'route': 'hello.world'})
+                # an event after the route changes so that the observer receives all notifications
+                await provider.send({'type': 'add', 'routes': ['hello.ping']})
+                await provider.send_event({'to': 'my.observer', 'body': 'ping', 'id': 'p'})
+                self.assertEqual('ping', (await observer.receive())['body'])
+                self.assertEqual([{'type': 'routes', 'routes': ['my.observer']},
+                                  {'type': 'add', 'route': 'hello.world'},
+                                  {'type': 'remove', 'route': 'hello.world'},
+                                  {'type': 'add', 'route': 'hello.ping'}], observer.route_changes)
+        self.run_async(test)
+
+    def test_credit(self):
+        async def test():
+            async with aiohttp.ClientSession() as session:
+                caller = LanguagePack(session, self.connector.get_url(), 'py-caller')
+                await caller.connect([])
+                callee = LanguagePack(session, self.connector.get_url(), 'py-callee')
+                await callee.connect(['hello.world'], ['credit'])
+                self.assertEqual(1024 * 1024, callee.config['body']['credit'])
+                await callee.send({'type': 'credit', 'credit': 2500})
+                for i in range(5):
+                    await caller.send_event({'to': 'hello.world', 'body': 'x' * 1000, 'id': str(i)})
+                # the third frame overdraws the credit and then the language connector waits for more credit
+                for i in range(3):
+                    await callee.receive()
+                callee.timeout = 0.5
+                with self.assertRaises(asyncio.TimeoutError):
+                    await callee.receive()
+                callee.timeout = 5
+                await callee.send({'type': 'credit', 'credit': 10000})
+                self.assertEqual('x' * 1000, (await callee.receive())['body'])
+                self.assertEqual('x' * 1000, (await callee.receive())['body'])
+        self.run_async(test)
+
+    def test_pub_sub_and_streams(self):
+        async def test():
+            async with aiohttp.ClientSession() as session:
+                app = LanguagePack(session, self.connector.get_url(), 'py-app')
+                await app.connect(['my.listener'])
+
+                async def request(route: str, headers: dict, body: any = None):
+                    await app.send_event({'to': route, 'headers': headers, 'body': body,
+                                          'reply_to': '->r.inbox', 'id': 'x'})
+                    return await app.receive()
+
+                pubsub = 'pub.sub.controller'
+                self.assertTrue((await request(pubsub, {'type': 'create', 'topic': 'demo', 'partition': '-1'}))['body'])
+                self.assertEqual(['demo'], (await request(pubsub, {'type': 'list'}))['body'])
+                await request(pubsub, {'type': 'subscribe', 'topic': 'demo', 'route': 'my.listener'})
+                # the subscriber receives the published event before the publisher receives the acknowledgement
+                event = await request(pubsub, {'type': 'publish', 'topic': 'demo'}, {'headers': {'a': 'b'}, 'body': 'hi'})
+                self.assertEqual(('my.listener', 'hi', {'a': 'b'}), (event['to'], event['body'], event['headers']))
+                self.assertTrue((await app.receive())['body'])
+                # object stream
+                stream = (await request('object.streams.io', {'type': 'create_stream', 'expiry': '60'}))['body']
+                await app.send_event({'to': stream['out'], 'headers': {'type': 'data'}, 'body': 'line 1', 'id': 'y'})
+                await app.send_event({'to': stream['out'], 'headers': {'type': 'eof'}, 'id': 'z'})
+                data = await request(stream['in'], {'type': 'read'})
+                self.assertEqual(('data', 'line 1'), (data['headers']['type'], data['body']))
+                self.assertEqual('eof', (await request(stream['in'], {'type': 'read'}))['headers']['type'])
+                self.assertTrue((await request(stream['in'], {'type': 'close'}))['body'])
+        self.run_async(test)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from mercury.system.models import EventEnvelope, TraceInfo
+
+
+class TestModels(unittest.TestCase):
+
+    def test_lazy_event_id(self):
+        event = EventEnvelope().set_to('hello.world').set_body('hello')
+        self.assertIsNone(event.event_id)
+        event_id = event.get_event_id()
+        self.assertTrue(event_id.startswith('py'))
+        self.assertEqual(event_id, event.to_map()['id'])
+        ids = set(EventEnvelope().get_event_id() for _ in range(1000))
+        self.assertEqual(1000, len(ids))
+        self.assertNotIn(event_id, ids)
+
+    def test_envelope_round_trip(self):
+        event = EventEnvelope().set_to('hello.world').set_header('a', 1).set_body({'x': 'y'})
+        self.assertIsNone(EventEnvelope().get_header('a'))
+        self.assertEqual({}, EventEnvelope().to_map()['headers'])
+        restored = EventEnvelope().from_bytes(event.to_bytes())
+        self.assertEqual(event.get_event_id(), restored.get_event_id())
+        self.assertEqual('1', restored.get_header('a'))
+        self.assertEqual({'x': 'y'}, restored.get_body())
+        # slotted models do not accept undeclared attributes
+        with self.assertRaises(AttributeError):
+            event.unknown = True
+
+    def test_trace_start_time(self):
+        trace = TraceInfo('hello.world', 'id', 'GET /api')
+        start_time = trace.get_start_time()
+        self.assertTrue(start_time.endswith('Z'))
+        self.assertEqual(24, len(start_time))
+        self.assertEqual(start_time, trace.get_start_time())
+
+    def test_tags(self):
+        event = EventEnvelope().add_tag('exception').add_tag('rpc', 'hello.world').add_tag('x', 'y')
+        self.assertEqual('', event.get_tag('exception'))
+        self.assertIsNone(event.get_tag('missing'))
+        event.remove_tag('x')
+        self.assertEqual('exception|rpc=hello.world', event.to_map()['extra'])
+        restored = EventEnvelope().from_bytes(event.to_bytes())
+        self.assertEqual('hello.world', restored.get_tag('rpc'))
+        self.assertEqual({'exception': '', 'rpc': 'hello.world'}, restored.get_tags())
+        restored.set_extra('a=1|b')
+        self.assertEqual('1', restored.get_tag('a'))
+        self.assertEqual('a=1|b', restored.get_extra())
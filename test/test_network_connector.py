@@ -0,0 +1,714 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+import zlib
+from test.language_pack import RemoteApp
+from test.scenario_runner import get_free_port, main, run_scenario, start_local_connector, wait_for
+
+SINK = 'remote.sink'
+ECHO = 'remote.echo'
+LOCAL_SINK = 'local.sink'
+SLOW_ROUTE = 'slow.route'
+
+
+class RecordingSocket:
+    """
+    Websocket stand-in that keeps the frames written by the connector
+    """
+
+    def __init__(self, fail: int = 0):
+        self.frames = list()
+        self.fail = fail
+
+    async def send_bytes(self, data: bytes):
+        if self.fail > 0:
+            self.fail -= 1
+            raise RuntimeError('Simulated write failure')
+        self.frames.append(data)
+
+    async def send_str(self, data: str):
+        self.frames.append(data)
+
+
+def _connect(platform, **kwargs):
+    local = start_local_connector(platform, **kwargs)
+    platform.connect_to_cloud()
+    if not wait_for(lambda: all(c['ready'] for c in _sessions(platform))):
+        raise RuntimeError('Network connector is not ready')
+    return local
+
+
+def _sessions(platform) -> list:
+    return platform.get_network_stats()['connections']
+
+
+def _hashed_routes() -> list:
+    # a route for each session of a pool of two by route hash
+    routes = [None, None]
+    for i in range(100):
+        route = f'{SINK}.{i}'
+        if routes[zlib.crc32(route.encode()) % 2] is None:
+            routes[zlib.crc32(route.encode()) % 2] = route
+    return routes
+
+
+def _send_all(platform, route: str, total: int) -> list:
+    # send events to a route and get the number of frames sent by each session
+    from mercury.system.models import EventEnvelope
+    before = [c['frames'] for c in _sessions(platform)]
+    for i in range(total):
+        platform.send_event(EventEnvelope().set_to(route).set_body(i))
+    time.sleep(0.2)
+    return [c['frames'] - n for c, n in zip(_sessions(platform), before)]
+
+
+def _stall(platform, route: str, total: int, condition) -> dict:
+    # the sink does not grant credit so that the frames of the sender wait in the send queues
+    from mercury.system.models import EventEnvelope
+    local = _connect(platform, credit_window=65536)
+    sink = RemoteApp(local.get_url(), 'sink', [route], ['credit']).start()
+    sink.send({'type': 'credit', 'credit': 1})
+    data = 'x' * 1000
+    sent = list()
+
+    def sender():
+        for i in range(total):
+            platform.send_event(EventEnvelope().set_to(route).set_body({'n': i, 'data': data}))
+            sent.append(i)
+
+    threading.Thread(target=sender, daemon=True).start()
+    wait_for(lambda: condition([c['outstanding'] for c in _sessions(platform)]), 20.0)
+    result = {'outstanding': [c['outstanding'] for c in _sessions(platform)]}
+    sink.send({'type': 'credit', 'credit': 1 << 30})
+    wait_for(lambda: len(sink.events) == total, 30.0)
+    result['received'] = sorted(e['body']['n'] for e in sink.events)
+    return result
+
+
+def _decode(frames: list) -> list:
+    # each frame becomes a list of event IDs or the text of a text frame
+    from mercury.system import codec
+    result = list()
+    for frame in frames:
+        if isinstance(frame, str):
+            result.append(frame)
+        else:
+            message = codec.unpack(frame)
+            items = [codec.unpack(b) for b in message['batch']] if message['type'] == 'batch' else [message]
+            result.append([codec.unpack(item['event'])['id'] for item in items])
+    return result
+
+
+def _write(platform, frames: list, fail: int = 0, body: str = '', max_payload: int = 32768) -> dict:
+    # run the websocket writer of the connector with frames that are already waiting.
+    # A str is a text frame and an int is the ID of an event.
+    from mercury.system import codec
+    from mercury.system.connector import ConnectorSession, NetworkConnector
+    platform.get_network_stats()
+    connector = NetworkConnector()
+    session = ConnectorSession(0, connector.urls)
+    session.batch_enabled = True
+    session.max_ws_payload = max_payload
+    socket = RecordingSocket(fail)
+
+    async def run():
+        queue = asyncio.Queue()
+        for item in frames:
+            if isinstance(item, str):
+                queue.put_nowait(item)
+            else:
+                queue.put_nowait(codec.wrap({'type': 'event'}, 'event', codec.pack({'id': item, 'body': body})))
+        session.outstanding = len(frames)
+        writer = asyncio.get_running_loop().create_task(connector._writer(session, socket, queue))
+        for _ in range(500):
+            if session.outstanding == 0:
+                break
+            await asyncio.sleep(0.01)
+        writer.cancel()
+
+    asyncio.run(run())
+    return {'frames': _decode(socket.frames), 'outstanding': session.outstanding, 'sent': session.frames,
+            'sizes': [len(f) for f in socket.frames]}
+
+
+def writer_batch(platform) -> dict:
+    return _write(platform, [0, 1, 2, 'Keep-Alive', 3, 4, 5])
+
+
+def writer_limit(platform) -> dict:
+    from mercury.system import codec
+    # eight frames fill the payload limit when the batch headers are not counted
+    size = len(codec.wrap({'type': 'event'}, 'event', codec.pack({'id': 0, 'body': 'x' * 100})))
+    result = _write(platform, list(range(16)), body='x' * 100, max_payload=size * 8)
+    result['limit'] = size * 8
+    return result
+
+
+def writer_failure(platform) -> dict:
+    return _write(platform, [0, 1, 2, 'Keep-Alive', 3], fail=1)
+
+
+def batch_order(platform) -> dict:
+    from mercury.system.models import EventEnvelope
+    local = _connect(platform)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK]).start()
+    before = local.get_stats()
+    for i in range(200):
+        platform.send_event(EventEnvelope().set_to(SINK).set_body(i))
+    wait_for(lambda: len(sink.events) == 200)
+    after = local.get_stats()
+    return {'frames': after['frames_in'] - before['frames_in'], 'events': after['events'] - before['events'],
+            'bodies': [e['body'] for e in sink.events]}
+
+
+def send_queue_bound(platform) -> dict:
+    from mercury.system.models import EventEnvelope
+    # the stand-in stops granting credit when the sink does not consume its events
+    local = _connect(platform, credit_window=65536)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK], ['credit']).start()
+    sink.send({'type': 'credit', 'credit': 1})
+    total = 4000
+    data = 'x' * 1000
+    sent = list()
+
+    def sender():
+        for i in range(total):
+            platform.send_event(EventEnvelope().set_to(SINK).set_body({'n': i, 'data': data}))
+            sent.append(i)
+
+    threading.Thread(target=sender, daemon=True).start()
+
+    def outstanding():
+        return platform.get_network_stats()['connections'][0]['outstanding']
+
+    wait_for(lambda: outstanding() == 1000, 20.0)
+    time.sleep(0.5)
+    result = {'outstanding': outstanding(), 'sent': len(sent)}
+    time.sleep(0.5)
+    result['blocked'] = len(sent) == result['sent']
+    sink.send({'type': 'credit', 'credit': 1 << 30})
+    wait_for(lambda: len(sink.events) == total, 30.0)
+    result['bodies'] = [e['body']['n'] for e in sink.events]
+    result['drained'] = outstanding()
+    return result
+
+
+def payload_expiry(platform) -> dict:
+    from mercury.system.connector import NetworkConnector
+    from mercury.system.models import EventEnvelope
+    release = threading.Event()
+
+    def slow(headers: dict, body: any):
+        release.wait(10.0)
+        return body
+
+    platform.register(SLOW_ROUTE, slow, 1)
+    local = _connect(platform, max_payload=1024)
+    assembler = NetworkConnector().assembler
+    assembler.timeout = 0.5
+    # credit is withheld from the stand-in while the local function is backlogged
+    for i in range(20):
+        platform.send_event(EventEnvelope().set_to(SLOW_ROUTE).set_body(i))
+    wait_for(lambda: platform.get_route_stats(SLOW_ROUTE)['memory'] == 10)
+    app = RemoteApp(local.get_url(), 'app', []).start()
+    app.send_event({'to': SLOW_ROUTE, 'id': 'large', 'headers': {}, 'body': os.urandom(20000)})
+    wait_for(lambda: assembler.pending() == 1)
+    result = {'pending': assembler.pending()}
+    # the incomplete payload is released by the expiry timer without more incoming blocks
+    wait_for(lambda: assembler.pending() == 0, 5.0)
+    result['expired'] = assembler.pending()
+    frames = local.get_stats()['frames_out']
+    release.set()
+    wait_for(lambda: platform.get_route_stats(SLOW_ROUTE)['memory'] == 0)
+    time.sleep(0.5)
+    result['frames'] = local.get_stats()['frames_out'] - frames
+    result['late'] = assembler.pending()
+    result['rejected'] = assembler.rejected()
+    return result
+
+
+def _counters(platform) -> dict:
+    stats = platform.get_network_stats()
+    return {k: stats[k] for k in ('out_bytes', 'out_compressed_bytes', 'in_bytes', 'in_compressed_bytes',
+                                  'compressed_events')}
+
+
+def _echo(platform, body: any) -> dict:
+    # RPC to the echo application with the change of the byte counters
+    from mercury.system.models import EventEnvelope
+    before = _counters(platform)
+    response = platform.send_request(EventEnvelope().set_to(ECHO).set_body(body), 5.0)
+    after = _counters(platform)
+    result = {k: after[k] - before[k] for k in after}
+    result['echo'] = response.get_body() == body
+    return result
+
+
+def compression(platform) -> dict:
+    local = _connect(platform)
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    return {'small': _echo(platform, 'x' * 100), 'large': _echo(platform, 'hello world ' * 500)}
+
+
+def compression_off(platform) -> dict:
+    local = _connect(platform, features=('batch', 'routes', 'bulk', 'credit'))
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    return {'large': _echo(platform, 'hello world ' * 500)}
+
+
+def _send_values(platform, features: tuple) -> dict:
+    # values of the codec extension types are sent to an application that decodes plain msgpack
+    import datetime
+    import decimal
+    import uuid
+    from mercury.system.models import EventEnvelope
+    local = _connect(platform, features=features)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK]).start()
+    wait_for(lambda: platform.exists(SINK))
+    body = {'time': datetime.datetime(2026, 10, 18, 12, 30, tzinfo=datetime.timezone.utc),
+            'amount': decimal.Decimal('12.30'), 'id': uuid.UUID(int=1)}
+    try:
+        import numpy
+        body['array'] = numpy.arange(4, dtype=numpy.int32).reshape(2, 2)
+    except ImportError:
+        pass
+    platform.send_event(EventEnvelope().set_to(SINK).set_body(body))
+    wait_for(lambda: len(sink.events) == 1)
+    return sink.events[0]['body']
+
+
+def portable_values(platform) -> dict:
+    return _send_values(platform, ('batch', 'routes', 'bulk', 'credit'))
+
+
+def extension_values(platform) -> dict:
+    from mercury.system.local_connector import LocalConnector
+    return {k: type(v).__name__ for k, v in _send_values(platform, LocalConnector.FEATURES).items()}
+
+
+def segmented_compression(platform) -> dict:
+    local = _connect(platform, max_payload=1024)
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    # hex text compresses to about half of its size that is still segmented
+    result = _echo(platform, os.urandom(20000).hex())
+    result['blocks'] = local.get_stats()['blocks']
+    return result
+
+
+def concurrent_counters(platform) -> dict:
+    from mercury.system import codec
+    from mercury.system.models import EventEnvelope
+    local = _connect(platform)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK]).start()
+    before = _counters(platform)
+    expected = list()
+
+    def sender(n: int):
+        size = 0
+        for i in range(500):
+            event = EventEnvelope().set_to(SINK).set_body({'n': n, 'i': i})
+            size += len(codec.pack(event.to_map()))
+            platform.send_event(event)
+        expected.append(size)
+
+    threads = [threading.Thread(target=sender, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wait_for(lambda: len(sink.events) == 2000)
+    after = _counters(platform)
+    return {'expected': sum(expected), 'out_bytes': after['out_bytes'] - before['out_bytes'],
+            'out_compressed_bytes': after['out_compressed_bytes'] - before['out_compressed_bytes'],
+            'received': len(sink.events)}
+
+
+def concurrent_rpc(platform) -> dict:
+    from mercury.system.models import EventEnvelope
+
+    def idle(headers: dict, body: any):
+        return body
+
+    # the backlog check iterates over all routes while inboxes are registered and released by the callers.
+    # Frequent thread switches make the overlap likely.
+    sys.setswitchinterval(0.00001)
+    for i in range(2000):
+        platform.register(f'idle.route.{i}', idle, 1)
+    local = _connect(platform)
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    wait_for(lambda: platform.exists(ECHO))
+    failures = list()
+
+    def caller(n: int):
+        for i in range(200):
+            body = f'{n}.{i}'
+            try:
+                response = platform.send_request(EventEnvelope().set_to(ECHO).set_body(body), 5.0)
+                if response.get_body() != body:
+                    failures.append(body)
+            except (TimeoutError, ValueError) as e:
+                failures.append(str(e))
+
+    threads = [threading.Thread(target=caller, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {'failures': failures, 'session': _sessions(platform)[0]}
+
+
+def decompression_limit(platform) -> dict:
+    from mercury.system.connector import NetworkConnector
+    received = list()
+
+    def sink(headers: dict, body: any):
+        received.append(len(body))
+
+    platform.register(LOCAL_SINK, sink, 1)
+    local = _connect(platform)
+    NetworkConnector().assembler.max_message_bytes = 100000
+    app = RemoteApp(local.get_url(), 'app', []).start()
+    # the stand-in compresses the event to a few hundred bytes
+    app.send_event({'to': LOCAL_SINK, 'id': 'large', 'headers': {}, 'body': bytes(200000)})
+    app.send_event({'to': LOCAL_SINK, 'id': 'small', 'headers': {}, 'body': bytes(50000)})
+    wait_for(lambda: len(received) > 0)
+    time.sleep(0.2)
+    return {'received': received, 'compressed_bytes': platform.get_network_stats()['in_compressed_bytes']}
+
+
+def pool_hash(platform) -> dict:
+    local = _connect(platform)
+    routes = _hashed_routes()
+    sink = RemoteApp(local.get_url(), 'sink', routes).start()
+    result = {'frames': [_send_all(platform, route, 50) for route in routes]}
+    wait_for(lambda: len(sink.events) == 100)
+    result['bodies'] = [[e['body'] for e in sink.events if e['to'] == route] for route in routes]
+    return result
+
+
+def pool_least(platform) -> dict:
+    return _stall(platform, SINK, 4000, lambda outstanding: sum(outstanding) >= 1000)
+
+
+def pool_saturation(platform) -> dict:
+    return _stall(platform, _hashed_routes()[0], 4000, lambda outstanding: outstanding == [1000, 1000])
+
+
+def pool_failover(platform) -> dict:
+    local = _connect(platform)
+    routes = _hashed_routes()
+    sink = RemoteApp(local.get_url(), 'sink', routes).start()
+    local.disconnect(platform.get_origin(), 1)
+    wait_for(lambda: not all(c['connected'] for c in _sessions(platform)))
+    result = {'connected': [c['connected'] for c in _sessions(platform)]}
+    # events to both routes go to the remaining session
+    result['failover'] = [_send_all(platform, route, 50) for route in routes]
+    wait_for(lambda: all(c['ready'] for c in _sessions(platform)), 10.0)
+    result['connects'] = [c['connects'] for c in _sessions(platform)]
+    result['rebalanced'] = [_send_all(platform, route, 50) for route in routes]
+    wait_for(lambda: len(sink.events) == 200)
+    result['received'] = len(sink.events)
+    return result
+
+
+def _outage(platform, local):
+    local.stop_thread()
+    if not wait_for(lambda: not any(c['connected'] for c in _sessions(platform))):
+        raise RuntimeError('Network connector is still connected')
+
+
+def _send_remote(platform, total: int, interval: float = 0.0) -> int:
+    # send events to the sink and get the number of events that are rejected
+    from mercury.system.models import EventEnvelope
+    rejected = 0
+    for i in range(total):
+        try:
+            platform.send_event(EventEnvelope().set_to(SINK).set_body(i))
+        except ValueError:
+            rejected += 1
+        time.sleep(interval)
+    return rejected
+
+
+def outbox_replay(platform) -> dict:
+    _outage(platform, _connect(platform))
+    result = {'rejected': _send_remote(platform, 200)}
+    wait_for(lambda: platform.get_network_stats()['outbox']['buffered'] == 200)
+    result['buffered'] = platform.get_network_stats()['outbox']
+    local = start_local_connector(platform)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK]).start()
+    wait_for(platform.cloud_ready)
+    start = time.time()
+    wait_for(lambda: len(sink.events) == 200)
+    result['elapsed'] = time.time() - start
+    result['bodies'] = [e['body'] for e in sink.events]
+    result['replayed'] = platform.get_network_stats()['outbox']
+    return result
+
+
+def outbox_expiry(platform) -> dict:
+    _outage(platform, _connect(platform))
+    _send_remote(platform, 50)
+    time.sleep(0.6)
+    local = start_local_connector(platform)
+    sink = RemoteApp(local.get_url(), 'sink', [SINK]).start()
+    wait_for(lambda: platform.get_network_stats()['outbox']['pending'] == 0)
+    # the connection works after the buffered events have expired
+    _send_remote(platform, 1)
+    wait_for(lambda: len(sink.events) > 0)
+    return {'outbox': platform.get_network_stats()['outbox'], 'bodies': [e['body'] for e in sink.events]}
+
+
+def outbox_limit(platform) -> dict:
+    _outage(platform, _connect(platform))
+    return {'rejected': _send_remote(platform, 30), 'outbox': platform.get_network_stats()['outbox']}
+
+
+def handshake_failure(platform) -> dict:
+    from urllib.parse import urlparse
+    from mercury.system.local_connector import LocalConnector
+    # the first URL of network.connector has a wrong path and the second one is the stand-in
+    urls = platform.config.get_property('network.connector').split(', ')
+    address = urlparse(urls[1])
+    LocalConnector(address.hostname, address.port, address.path).start_in_thread()
+    platform.connect_to_cloud()
+    wait_for(platform.cloud_ready)
+    return _sessions(platform)[0]
+
+
+class TestNetworkConnector(unittest.TestCase):
+
+    def test_writer_batch(self):
+        result = run_scenario('test.test_network_connector', 'writer_batch')
+        # a text frame is sent after the pending batch and the batch resumes after it
+        self.assertEqual([[0, 1, 2], 'Keep-Alive', [3, 4, 5]], result['frames'])
+        self.assertEqual((0, 3), (result['outstanding'], result['sent']))
+
+    def test_writer_limit(self):
+        result = run_scenario('test.test_network_connector', 'writer_limit')
+        # a batch frame with its headers stays within the payload limit
+        for size in result['sizes']:
+            self.assertLessEqual(size, result['limit'])
+        self.assertEqual(list(range(16)), [n for frame in result['frames'] for n in frame])
+        self.assertLess(len(result['frames']), 16)
+
+    def test_writer_failure(self):
+        result = run_scenario('test.test_network_connector', 'writer_failure')
+        # the batch that cannot be written is dropped and the writer continues with the next frames
+        self.assertEqual(['Keep-Alive', [3]], result['frames'])
+        self.assertEqual((0, 2), (result['outstanding'], result['sent']))
+
+    def test_send_queue_bound(self):
+        result = run_scenario('test.test_network_connector', 'send_queue_bound', {
+            'network.compression.codec': 'none'})
+        # the sending thread is blocked while 1,000 frames wait for the websocket writer
+        self.assertEqual(1000, result['outstanding'])
+        self.assertTrue(result['blocked'])
+        self.assertLess(result['sent'], 4000)
+        self.assertEqual(list(range(4000)), result['bodies'])
+        self.assertEqual(0, result['drained'])
+
+    def test_payload_expiry(self):
+        result = run_scenario('test.test_network_connector', 'payload_expiry', {'network.credit.window': 4096})
+        self.assertEqual(1, result['pending'])
+        self.assertEqual(0, result['expired'])
+        # blocks that arrive after the payload has expired are ignored
+        self.assertGreater(result['frames'], 10)
+        self.assertEqual((0, 1), (result['late'], result['rejected']))
+
+    def test_compression(self):
+        result = run_scenario('test.test_network_connector', 'compression')
+        small = result['small']
+        self.assertTrue(small['echo'])
+        self.assertEqual(0, small['compressed_events'])
+        self.assertEqual(small['out_bytes'], small['out_compressed_bytes'])
+        self.assertEqual(small['in_bytes'], small['in_compressed_bytes'])
+        # the zip marker tells the receiver to decompress the event in each direction
+        large = result['large']
+        self.assertTrue(large['echo'])
+        self.assertEqual(1, large['compressed_events'])
+        self.assertLess(large['out_compressed_bytes'] * 5, large['out_bytes'])
+        self.assertLess(large['in_compressed_bytes'] * 5, large['in_bytes'])
+
+    def test_compression_threshold(self):
+        result = run_scenario('test.test_network_connector', 'compression', {
+            'network.compression.threshold': 10000})
+        large = result['large']
+        self.assertTrue(large['echo'])
+        self.assertEqual(0, large['compressed_events'])
+        self.assertEqual(large['out_bytes'], large['out_compressed_bytes'])
+
+    def test_compression_not_negotiated(self):
+        for scenario, config in (('compression', {'network.compression.codec': 'none'}),
+                                 ('compression_off', None)):
+            large = run_scenario('test.test_network_connector', scenario, config)['large']
+            self.assertTrue(large['echo'])
+            self.assertEqual(0, large['compressed_events'])
+            self.assertEqual(large['out_bytes'], large['out_compressed_bytes'])
+            self.assertEqual(large['in_bytes'], large['in_compressed_bytes'])
+
+    def test_segmented_compression(self):
+        result = run_scenario('test.test_network_connector', 'segmented_compression')
+        # compressed blocks carry the _zip_ tag in each direction
+        self.assertTrue(result['echo'])
+        self.assertEqual(1, result['compressed_events'])
+        self.assertGreater(result['out_compressed_bytes'], 10000)
+        self.assertLess(result['out_compressed_bytes'], result['out_bytes'])
+        self.assertGreater(result['blocks'], 10)
+
+    def test_portable_values(self):
+        result = run_scenario('test.test_network_connector', 'portable_values')
+        # a language connector without the ext feature receives strings and lists
+        expected = {'time': '2026-10-18T12:30:00+00:00', 'amount': '12.30', 'id': '00000000-0000-0000-0000-000000000001'}
+        if 'array' in result:
+            expected['array'] = [[0, 1], [2, 3]]
+        self.assertEqual(expected, result)
+
+    def test_extension_values(self):
+        result = run_scenario('test.test_network_connector', 'extension_values')
+        # the stand-in accepts the ext feature and relays extension types as they are
+        self.assertEqual({'ExtType'}, set(result.values()))
+
+    def test_concurrent_counters(self):
+        result = run_scenario('test.test_network_connector', 'concurrent_counters')
+        # byte counters do not lose updates when threads send at the same time
+        self.assertEqual(2000, result['received'])
+        self.assertEqual(result['expected'], result['out_bytes'])
+        self.assertEqual(result['expected'], result['out_compressed_bytes'])
+
+    def test_concurrent_rpc(self):
+        result = run_scenario('test.test_network_connector', 'concurrent_rpc', {'network.credit.window': 1024})
+        # credits are granted while other threads register and release their inboxes
+        self.assertEqual([], result['failures'])
+        self.assertEqual(1, result['session']['connects'])
+        self.assertTrue(result['session']['ready'])
+
+    def test_decompression_limit(self):
+        result = run_scenario('test.test_network_connector', 'decompression_limit')
+        # the event that expands beyond the limit is dropped and the next one is delivered
+        self.assertEqual([50000], result['received'])
+        self.assertLess(result['compressed_bytes'], 1000)
+
+    def test_pool_hash(self):
+        result = run_scenario('test.test_network_connector', 'pool_hash', {'network.pool.size': 2})
+        # events to a route share one session and keep their order
+        first, second = result['frames']
+        self.assertEqual(0, first[1])
+        self.assertGreater(first[0], 0)
+        self.assertEqual(0, second[0])
+        self.assertGreater(second[1], 0)
+        self.assertEqual([list(range(50)), list(range(50))], result['bodies'])
+
+    def test_pool_least(self):
+        result = run_scenario('test.test_network_connector', 'pool_least', {
+            'network.pool.size': 2, 'network.pool.balance': 'least', 'network.compression.codec': 'none'})
+        # frames waiting for credit are spread over the sessions
+        for outstanding in result['outstanding']:
+            self.assertGreater(outstanding, 300)
+        self.assertEqual(list(range(4000)), result['received'])
+
+    def test_pool_saturation(self):
+        result = run_scenario('test.test_network_connector', 'pool_saturation', {
+            'network.pool.size': 2, 'network.compression.codec': 'none'})
+        # events to the route fail over to the other session when its own session is saturated
+        self.assertEqual([1000, 1000], result['outstanding'])
+        self.assertEqual(list(range(4000)), result['received'])
+
+    def test_pool_failover(self):
+        result = run_scenario('test.test_network_connector', 'pool_failover', {
+            'network.pool.size': 2, 'network.reconnect.initial': 1.0})
+        closed = result['connected'].index(False)
+        remaining = 1 - closed
+        for frames in result['failover']:
+            self.assertEqual(0, frames[closed])
+            self.assertGreater(frames[remaining], 0)
+        self.assertEqual(2, result['connects'][closed])
+        self.assertEqual(1, result['connects'][remaining])
+        # the routes are spread over both sessions again after reconnection
+        first, second = result['rebalanced']
+        self.assertEqual(0, first[1])
+        self.assertEqual(0, second[0])
+        self.assertEqual(200, result['received'])
+
+    def test_outbox_replay(self):
+        result = run_scenario('test.test_network_connector', 'outbox_replay', {
+            'network.outbox.max.bytes': 1048576, 'network.outbox.drain.rate': 500})
+        self.assertEqual(0, result['rejected'])
+        self.assertEqual((200, 200), (result['buffered']['buffered'], result['buffered']['pending']))
+        # buffered events are replayed in order at the drain rate
+        self.assertEqual(list(range(200)), result['bodies'])
+        self.assertGreater(result['elapsed'], 0.3)
+        outbox = result['replayed']
+        self.assertEqual((200, 0, 0), (outbox['replayed'], outbox['expired'], outbox['pending']))
+
+    def test_outbox_expiry(self):
+        result = run_scenario('test.test_network_connector', 'outbox_expiry', {
+            'network.outbox.max.bytes': 1048576, 'network.outbox.max.age': 0.5})
+        outbox = result['outbox']
+        self.assertEqual((50, 0, 50, 0), (outbox['buffered'], outbox['replayed'], outbox['expired'],
+                                          outbox['pending']))
+        self.assertEqual([0], result['bodies'])
+
+    def test_outbox_limit(self):
+        result = run_scenario('test.test_network_connector', 'outbox_limit', {'network.outbox.max.bytes': 1000})
+        outbox = result['outbox']
+        buffered = outbox['pending']
+        self.assertTrue(0 < buffered < 30)
+        self.assertEqual((30 - buffered, 30 - buffered), (result['rejected'], outbox['rejected']))
+        # events held in memory count toward the limit, so the outbox is full after the event that reaches it
+        size = outbox['bytes'] / buffered
+        self.assertTrue(outbox['bytes'] >= 1000 > outbox['bytes'] - size)
+
+    def test_outbox_disabled(self):
+        result = run_scenario('test.test_network_connector', 'outbox_limit')
+        # events to remote routes are rejected while the connection is down
+        self.assertEqual(30, result['rejected'])
+        self.assertEqual((0, 0), (result['outbox']['buffered'], result['outbox']['rejected']))
+
+    def test_handshake_failure(self):
+        url = f'ws://127.0.0.1:{get_free_port()}/ws'
+        result = run_scenario('test.test_network_connector', 'handshake_failure', {
+            'network.connector': f'{url}/wrong, {url}/lang', 'network.reconnect.initial': 0.1})
+        # the session keeps reconnecting after a rejected websocket handshake
+        self.assertTrue(result['ready'])
+        self.assertEqual(f'{url}/lang', result['url'])
+        self.assertGreaterEqual(result['failures'], 1)
+
+    def test_batch_order(self):
+        result = run_scenario('test.test_network_connector', 'batch_order')
+        self.assertEqual(list(range(200)), result['bodies'])
+        self.assertEqual(200, result['events'])
+        # events sent together are coalesced into batch frames
+        self.assertLess(result['frames'], 200)
+
+
+if __name__ == '__main__':
+    main({'writer_batch': writer_batch, 'writer_limit': writer_limit, 'writer_failure': writer_failure, 'batch_order': batch_order,
+          'send_queue_bound': send_queue_bound, 'payload_expiry': payload_expiry, 'compression': compression,
+          'compression_off': compression_off, 'segmented_compression': segmented_compression,
+          'portable_values': portable_values, 'extension_values': extension_values,
+          'decompression_limit': decompression_limit, 'concurrent_counters': concurrent_counters,
+          'concurrent_rpc': concurrent_rpc, 'pool_hash': pool_hash, 'pool_least': pool_least,
+          'pool_saturation': pool_saturation, 'handshake_failure': handshake_failure, 'pool_failover': pool_failover, 'outbox_replay': outbox_replay,
+          'outbox_expiry': outbox_expiry, 'outbox_limit': outbox_limit})
@@ -20,6 +20,11 @@ import unittest
 import asyncio
 from mercury.system.diskqueue import ElasticQueue
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class TestDiskQueue(unittest.TestCase):
 
@@ -47,3 +52,113 @@ class TestDiskQueue(unittest.TestCase):
         queue.close()
         queue.destroy()
         self.assertTrue(queue.is_closed())
+
+    def test_compressed_blocks(self):
+        total = 1000
+        for codec in ElasticQueue.COMPRESSION:
+            queue = ElasticQueue(queue_dir='/tmp', queue_id='test-'+codec, compression=codec, block_records=50)
+
+            async def test_write():
+                for n in range(total):
+                    await queue.write({'v': 'hello world', 'n': n})
+
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(test_write())
+            loop.close()
+            # interleave reads and writes to read from an incomplete block
+            for i in range(total - 5):
+                self.assertEqual(queue.read()['n'], i)
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(queue.write({'n': total}))
+            loop.close()
+            for i in range(total - 5, total + 1):
+                self.assertEqual(queue.read()['n'], i)
+            self.assertIsNone(queue.read())
+            metrics = queue.get_spill_metrics()
+            self.assertEqual(codec, metrics['compression'])
+            self.assertEqual(total + 1 - ElasticQueue.MEMORY_BUFFER, metrics['records'])
+            self.assertTrue(metrics['ratio'] > 1.0)
+            queue.destroy()
+            self.assertTrue(queue.is_closed())
+
+    def test_skip(self):
+        total = 500
+        for codec in [None, 'zlib']:
+            queue = ElasticQueue(queue_dir='/tmp', queue_id='test-skip', compression=codec, block_records=50)
+
+            async def test_write():
+                for n in range(total):
+                    await queue.write({'n': n})
+
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(test_write())
+            loop.close()
+            self.assertEqual(5, queue.skip(5))
+            self.assertEqual(5, queue.read()['n'])
+            # skip across whole blocks and into the middle of one
+            self.assertEqual(120, queue.skip(120))
+            self.assertEqual(126, queue.read()['n'])
+            self.assertEqual(total - 127, queue.skip(total))
+            self.assertIsNone(queue.read())
+            queue.destroy()
+
+    def test_segment_recycling(self):
+
+        class SmallSegmentQueue(ElasticQueue):
+            MAX_FILE_SIZE = 4096
+
+        total = 1000
+        queue = SmallSegmentQueue(queue_dir='/tmp', queue_id='test-pool',
+                                  pool_segments=2, pool_bytes=16384, preallocate=True)
+
+        async def test_write(start: int):
+            for n in range(start, start + total):
+                await queue.write({'v': 'hello world', 'n': n})
+
+        loop = asyncio.new_event_loop()
+        for batch in range(3):
+            loop.run_until_complete(test_write(batch * total))
+            for i in range(batch * total, (batch + 1) * total):
+                self.assertEqual(queue.read()['n'], i)
+            self.assertIsNone(queue.read())
+            stats = queue.get_pool_stats()
+            self.assertTrue(stats['pooled'] <= 2)
+            self.assertTrue(stats['pooled_bytes'] <= 16384)
+        loop.close()
+        self.assertTrue(queue.get_pool_stats()['recycled'] > 0)
+        queue.destroy()
+        self.assertTrue(queue.is_closed())
+
+    def test_interleaved_preallocated(self):
+        queue = ElasticQueue(queue_dir='/tmp', queue_id='test-interleaved',
+                             pool_segments=1, pool_bytes=ElasticQueue.MAX_FILE_SIZE * 2, preallocate=True)
+        loop = asyncio.new_event_loop()
+        n = 0
+        # the reader must not read ahead into the preallocated part of a segment
+        for batch in range(50):
+            for i in range(batch % 7 + 1):
+                loop.run_until_complete(queue.write({'n': n + i}))
+            for i in range(batch % 7 + 1):
+                self.assertEqual(queue.read()['n'], n + i)
+            n += batch % 7 + 1
+            if batch % 5 == 0:
+                self.assertIsNone(queue.read())
+        loop.close()
+        queue.destroy()
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_ndarray_body(self):
+        queue = ElasticQueue(queue_dir='/tmp', queue_id='test-ndarray')
+        array = numpy.arange(1000, dtype=numpy.float32).reshape(10, 100)
+
+        async def test_write():
+            for n in range(20):
+                await queue.write({'n': n, 'body': array * n})
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(test_write())
+        for n in range(20):
+            data = queue.read()
+            self.assertTrue(numpy.array_equal(array * n, data['body']))
+        queue.close()
+        queue.destroy()
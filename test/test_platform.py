@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import threading
+import time
+import unittest
+from test.language_pack import RemoteApp
+from test.scenario_runner import main, run_scenario, start_local_connector, wait_for
+
+SLOW_ROUTE = 'slow.route'
+ECHO = 'remote.echo'
+
+
+def route_stats(platform) -> dict:
+    from mercury.system.models import EventEnvelope
+    release = threading.Event()
+
+    def slow(headers: dict, body: any):
+        release.wait(10.0)
+        return body
+
+    platform.register(SLOW_ROUTE, slow, 1)
+    # the backlog statistics service is registered when the application connects to the network
+    platform.connect_to_cloud()
+    for i in range(30):
+        platform.send_event(EventEnvelope().set_to(SLOW_ROUTE).set_body(i))
+    wait_for(lambda: platform.get_route_stats(SLOW_ROUTE)['spilled'] == 19)
+    time.sleep(0.2)
+    result = {'route': platform.get_route_stats(SLOW_ROUTE), 'all': platform.get_route_stats()}
+    stats_route = 'system.route.stats.' + platform.get_origin()
+    request = EventEnvelope().set_to(stats_route).set_header('route', SLOW_ROUTE)
+    result['service'] = platform.send_request(request, 5.0).get_body()
+    result['service_all'] = platform.send_request(EventEnvelope().set_to(stats_route), 5.0).get_body()
+    result['stats_route'] = stats_route
+    release.set()
+    wait_for(lambda: platform.get_route_stats(SLOW_ROUTE)['memory'] == 0)
+    result['drained'] = platform.get_route_stats(SLOW_ROUTE)
+    return result
+
+
+def _echo(platform, body: any) -> dict:
+    from mercury.system.models import EventEnvelope
+    response = platform.send_request(EventEnvelope().set_to(ECHO).set_header('a', 'b').set_body(body), 5.0)
+    return {'status': response.get_status(), 'headers': response.get_headers(), 'echo': response.get_body() == body}
+
+
+def cloud_rpc(platform) -> dict:
+    local = start_local_connector(platform, max_payload=4096)
+    platform.connect_to_cloud()
+    wait_for(platform.cloud_ready)
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    # the route directory is updated when the language connector notifies the new route
+    result = {'exists': wait_for(lambda: platform.exists(ECHO)), 'rpc': _echo(platform, {'hello': 'world'})}
+    # random bytes are not compressible so the request and the response are segmented
+    result['segmented'] = _echo(platform, os.urandom(20000))
+    result['blocks'] = local.get_stats()['blocks']
+    result['stats'] = platform.get_network_stats()
+    # a monitoring tool queries the backlog statistics of this application instance
+    monitor = RemoteApp(local.get_url(), 'monitor', []).start()
+    stats_route = 'system.route.stats.' + platform.get_origin()
+    monitor.send_event({'to': stats_route, 'reply_to': '->monitor.inbox', 'id': 'stats',
+                        'headers': {'route': stats_route}})
+    wait_for(lambda: len(monitor.events) > 0)
+    result['remote_stats'] = [e['body']['route'] for e in monitor.events]
+    result['stats_route'] = stats_route
+    return result
+
+
+def cloud_reconnect(platform) -> dict:
+    local = start_local_connector(platform)
+    platform.connect_to_cloud()
+    wait_for(platform.cloud_ready)
+    app = RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    result = {'before': _echo(platform, 'hello')}
+    local.stop_thread()
+    app.stop()
+    wait_for(lambda: not platform.cloud_ready())
+    result['disconnected'] = platform.get_network_stats()['connections'][0]
+    # a new language connector at the same address
+    local = start_local_connector(platform)
+    RemoteApp(local.get_url(), 'echo', [ECHO]).start()
+    wait_for(platform.cloud_ready)
+    result['after'] = _echo(platform, 'world')
+    result['connection'] = platform.get_network_stats()['connections'][0]
+    return result
+
+
+class TestPlatform(unittest.TestCase):
+
+    def test_route_stats(self):
+        result = run_scenario('test.test_platform', 'route_stats')
+        stats = result['route']
+        # one event is being processed, ten are held in memory and the rest are spilled to disk
+        self.assertEqual((1, 1, 0, False), (stats['workers'], stats['busy'], stats['idle'], stats['private']))
+        self.assertEqual((10, 19), (stats['memory'], stats['spilled']))
+        self.assertTrue(stats['buffering'])
+        self.assertGreater(stats['spilled_bytes'], 0)
+        self.assertEqual(1, stats['segments'])
+        self.assertGreaterEqual(stats['oldest_age'], 0.2)
+        for all_routes in (result['all'], result['service_all']):
+            self.assertEqual(stats['spilled'], all_routes[SLOW_ROUTE]['spilled'])
+            self.assertIn(result['stats_route'], all_routes)
+        self.assertEqual((10, 19, 1), (result['service']['memory'], result['service']['spilled'],
+                                       result['service']['busy']))
+        drained = result['drained']
+        self.assertEqual((0, 0, 0, 0.0), (drained['memory'], drained['spilled'], drained['segments'],
+                                          drained['oldest_age']))
+
+    def test_cloud_rpc(self):
+        result = run_scenario('test.test_platform', 'cloud_rpc')
+        self.assertTrue(result['exists'])
+        self.assertEqual({'status': 200, 'headers': {'a': 'b'}, 'echo': True}, result['rpc'])
+        self.assertEqual({'status': 200, 'headers': {'a': 'b'}, 'echo': True}, result['segmented'])
+        self.assertGreater(result['blocks'], 4)
+        stats = result['stats']
+        self.assertGreater(stats['out_bytes'], 20000)
+        self.assertGreater(stats['in_bytes'], 20000)
+        self.assertIn('outbox', stats)
+        self.assertIn('directory', stats)
+        connection = stats['connections'][0]
+        self.assertEqual((0, True, True, 1, 0), (connection['session'], connection['connected'],
+                                                 connection['ready'], connection['connects'],
+                                                 connection['outstanding']))
+        self.assertGreater(connection['frames'], 0)
+        self.assertEqual([result['stats_route']], result['remote_stats'])
+
+    def test_cloud_reconnect(self):
+        result = run_scenario('test.test_platform', 'cloud_reconnect', {'network.reconnect.max': 1})
+        self.assertEqual(200, result['before']['status'])
+        self.assertEqual((False, False), (result['disconnected']['connected'], result['disconnected']['ready']))
+        self.assertEqual({'status': 200, 'headers': {'a': 'b'}, 'echo': True}, result['after'])
+        self.assertEqual((True, 2), (result['connection']['ready'], result['connection']['connects']))
+
+
+if __name__ == '__main__':
+    main({'route_stats': route_stats, 'cloud_rpc': cloud_rpc, 'cloud_reconnect': cloud_reconnect})
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import logging
+import random
+import time
+import unittest
+import msgpack
+from mercury.system.reassembly import PayloadAssembler
+
+log = logging.getLogger()
+
+
+class TestReassembly(unittest.TestCase):
+
+    def test_out_of_order_blocks(self):
+        block_size = 1000
+        payload = msgpack.packb({'body': bytes(random.getrandbits(8) for _ in range(5500)), 'n': 1})
+        blocks = [payload[i: i + block_size] for i in range(0, len(payload), block_size)]
+        total = len(blocks)
+        order = list(range(total))
+        order.reverse()
+        assembler = PayloadAssembler(log)
+        for i in order[:-1]:
+            self.assertIsNone(assembler.add('m1', i + 1, total, block_size, blocks[i]))
+        # duplicated block is ignored
+        self.assertIsNone(assembler.add('m1', total, total, block_size, blocks[-1]))
+        result = assembler.add('m1', 1, total, block_size, blocks[0])
+        self.assertIsInstance(result, memoryview)
+        self.assertEqual(payload, bytes(result))
+        self.assertEqual(msgpack.unpackb(payload), msgpack.unpackb(result))
+        self.assertEqual(0, assembler.get_allocated_bytes())
+        self.assertEqual(0, assembler.pending())
+
+    def test_memory_limits(self):
+        assembler = PayloadAssembler(log, max_message_bytes=5000, max_total_bytes=8000, timeout_seconds=0.1)
+        # per-message limit
+        self.assertIsNone(assembler.add('m1', 1, 6, 1000, b'x' * 1000))
+        self.assertEqual(0, assembler.pending())
+        self.assertIsNone(assembler.add('m2', 1, 5, 1000, b'x' * 1000))
+        # global limit
+        self.assertIsNone(assembler.add('m3', 1, 4, 1000, b'x' * 1000))
+        self.assertEqual(1, assembler.pending())
+        self.assertEqual(5000, assembler.get_allocated_bytes())
+        # incomplete middle block
+        self.assertIsNone(assembler.add('m2', 2, 5, 1000, b'x' * 10))
+        self.assertEqual(0, assembler.get_allocated_bytes())
+        # expired message is released
+        self.assertIsNone(assembler.add('m4', 1, 2, 1000, b'x' * 1000))
+        assembler.expire()
+        self.assertEqual(1, assembler.pending())
+        time.sleep(0.15)
+        assembler.expire()
+        self.assertEqual(0, assembler.pending())
+        self.assertEqual(0, assembler.get_allocated_bytes())
+
+    def test_rejected_message(self):
+        assembler = PayloadAssembler(log, max_message_bytes=5000, timeout_seconds=0.1)
+        # the warning is logged once for a message and its other blocks are ignored
+        with self.assertLogs(log, 'WARNING') as logs:
+            for i in range(6):
+                self.assertIsNone(assembler.add('m1', i + 1, 6, 1000, b'x' * 1000))
+        self.assertEqual(1, len(logs.output))
+        self.assertIn('m1', logs.output[0])
+        self.assertEqual((0, 1), (assembler.pending(), assembler.rejected()))
+        # the message ID is forgotten after timeout
+        time.sleep(0.15)
+        assembler.expire()
+        self.assertEqual(0, assembler.rejected())
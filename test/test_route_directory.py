@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import unittest
+from mercury.system.directory import RouteDirectory
+
+
+class TestRouteDirectory(unittest.TestCase):
+
+    def test_authoritative_directory(self):
+        directory = RouteDirectory()
+        self.assertIsNone(directory.lookup('hello.world'))
+        directory.load(['hello.world'])
+        self.assertTrue(directory.lookup('hello.world'))
+        self.assertFalse(directory.lookup('hello.missing'))
+        directory.add('hello.missing')
+        directory.remove('hello.world')
+        self.assertTrue(directory.lookup('hello.missing'))
+        self.assertFalse(directory.lookup('hello.world'))
+        directory.reset()
+        self.assertIsNone(directory.lookup('hello.missing'))
+
+    def test_negative_cache(self):
+        directory = RouteDirectory(ttl=0.2)
+        directory.update('hello.missing', False)
+        self.assertFalse(directory.lookup('hello.missing'))
+        # a route notification invalidates the cached result
+        directory.add('hello.missing')
+        self.assertIsNone(directory.lookup('hello.missing'))
+        directory.update('hello.missing', False)
+        time.sleep(0.3)
+        self.assertIsNone(directory.lookup('hello.missing'))
+        stats = directory.get_stats()
+        self.assertEqual((1, 2), (stats['hits'], stats['misses']))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2018-2022 Accenture Technology
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+STARTUP = """
+import json, os, sys, time
+start = time.perf_counter()
+from mercury.platform import Platform
+imported = time.perf_counter()
+platform = Platform()
+ready = time.perf_counter()
+modules = [m for m in ('aiohttp', 'msgpack', 'numpy', 'mercury.system.connector') if m in sys.modules]
+print(json.dumps({'import': imported - start, 'init': ready - imported, 'modules': modules}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_startup_time(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = root + os.pathsep + env.get('PYTHONPATH', '')
+        result = subprocess.run([sys.executable, '-c', STARTUP], cwd=root, env=env,
+                                capture_output=True, text=True, timeout=30)
+        self.assertEqual(0, result.returncode, result.stderr)
+        timing = json.loads(result.stdout.strip().splitlines()[-1])
+        # the network connector, msgpack and the file I/O test are not loaded by a standalone application.
+        # PyYAML is loaded because the platform reads the default application.yml when it starts.
+        self.assertEqual([], timing['modules'])
+        # it was more than a second when the platform tested disk speed at startup
+        self.assertLess(timing['import'] + timing['init'], 0.5, timing)